@@ -0,0 +1,206 @@
+"""Treemap Visualiser: Ancestry Index
+=== Module Description ===
+This module indexes the ancestry of every node of a tree, so that the
+visualiser can answer path, depth and is-ancestor queries without walking
+and concatenating up the tree on every selection.
+
+An AncestryIndex is built by one walk over the tree, numbering the nodes in
+preorder. For every node it stores the number of its parent, its depth, the
+number one past its last descendant, and the number of its name in a table
+of interned names, each in a compact array. Since the descendants of a node
+are numbered consecutively, one node is an ancestor of another exactly when
+the other's number lies in its range. Path strings are joined from the name
+table once and then remembered.
+
+The index follows changes to the tree without being rebuilt: a removed
+subtree's entries are dropped (see forget), and a node added after the
+index was built is handled by walking up to its nearest indexed ancestor.
+Only the nodes that exist when the index is built are indexed, so building
+it never loads the subtrees of a lazily loaded tree (see
+snapshot.SnapshotTree); nodes loaded later are handled like added ones.
+"""
+import sys
+from array import array
+
+
+class AncestryIndex:
+    """The ancestry of the nodes of a tree.
+    === Private Attributes ===
+    @type _nodes: list[AbstractTree | None]
+        The indexed nodes, in preorder; None for nodes removed since.
+    @type _parents: array
+        The number of each node's parent, or -1 for the root.
+    @type _depths: array
+        The depth of each node; the root has depth 0.
+    @type _ends: array
+        One past the number of each node's last descendant.
+    @type _name_ids: array
+        The number of each node's name in _names.
+    @type _names: list[str]
+        The distinct node names, interned.
+    @type _paths: dict[(str, int), str]
+        The paths computed so far, by separator and node number.
+    """
+    def __init__(self, tree):
+        """Index the nodes of <tree>.
+        @type self: AncestryIndex
+        @type tree: AbstractTree
+        @rtype: None
+        """
+        self._nodes = []
+        self._parents = array('l')
+        self._depths = array('l')
+        self._name_ids = array('l')
+        self._names = []
+        self._paths = {}
+        name_ids = {}
+        stack = [(tree, -1, 0)]
+        while stack:
+            node, parent, depth = stack.pop()
+            number = len(self._nodes)
+            node._ancestry_id = number
+            self._nodes.append(node)
+            self._parents.append(parent)
+            self._depths.append(depth)
+            name = sys.intern(str(node.get_root()))
+            if name not in name_ids:
+                name_ids[name] = len(self._names)
+                self._names.append(name)
+            self._name_ids.append(name_ids[name])
+            stack.extend((subtree, number, depth + 1)
+                         for subtree in reversed(node._loaded_subtrees()))
+        # A node's descendants follow it, so its range ends after as many
+        # nodes as its subtree has.
+        sizes = array('l', [1]) * len(self._nodes)
+        for number in range(len(self._nodes) - 1, 0, -1):
+            sizes[self._parents[number]] += sizes[number]
+        self._ends = array('l', (number + sizes[number]
+                                 for number in range(len(self._nodes))))
+
+    def __len__(self):
+        """Return the number of nodes indexed, including removed ones.
+        @type self: AncestryIndex
+        @rtype: int
+        """
+        return len(self._nodes)
+
+    def path(self, node, separator):
+        """Return the names of the nodes from the root of <node>'s tree down
+        to <node>, joined by <separator>.
+        @type self: AncestryIndex
+        @type node: AbstractTree
+        @type separator: str
+        @rtype: str
+        """
+        if self._is_indexed(node):
+            return self._path_of(node._ancestry_id, separator)
+        number, unindexed = self._locate(node)
+        names = [str(curr.get_root()) for curr in reversed(unindexed)]
+        if number >= 0:
+            names.insert(0, self._path_of(number, separator))
+        return separator.join(names)
+
+    def depth(self, node):
+        """Return the depth of <node> in its tree; the root has depth 0.
+        @type self: AncestryIndex
+        @type node: AbstractTree
+        @rtype: int
+        """
+        number, unindexed = self._locate(node)
+        if number < 0:
+            return len(unindexed) - 1
+        return self._depths[number] + len(unindexed)
+
+    def is_ancestor(self, ancestor, node):
+        """Return whether <ancestor> is <node> or one of its ancestors.
+        @type self: AncestryIndex
+        @type ancestor: AbstractTree
+        @type node: AbstractTree
+        @rtype: bool
+        """
+        number, unindexed = self._locate(node)
+        for curr in unindexed:
+            if curr is ancestor:
+                return True
+        if number < 0:
+            return False
+        if self._is_indexed(ancestor):
+            start = ancestor._ancestry_id
+            return start <= number < self._ends[start]
+        # <ancestor> was added or loaded after the index was built, so
+        # <node>, which was not, cannot be below it.
+        return False
+
+    def forget(self, node):
+        """Drop the entries of <node> and its descendants, after <node> was
+        removed from the tree.
+        @type self: AncestryIndex
+        @type node: AbstractTree
+        @rtype: None
+        """
+        if self._is_indexed(node):
+            start = node._ancestry_id
+            end = self._ends[start]
+            self._nodes[start:end] = [None] * (end - start)
+
+    def _is_indexed(self, node):
+        """Return whether <node> has an entry in this index.
+        @type self: AncestryIndex
+        @type node: AbstractTree
+        @rtype: bool
+        """
+        number = node._ancestry_id
+        return 0 <= number < len(self._nodes) and self._nodes[number] is node
+
+    def _locate(self, node):
+        """Return the number of the nearest of <node> and its ancestors
+        that has an entry in this index, or -1 if none has, together with
+        the nodes below it, starting with <node>.
+        @type self: AncestryIndex
+        @type node: AbstractTree
+        @rtype: (int, list[AbstractTree])
+        """
+        unindexed = []
+        curr = node
+        while curr is not None:
+            if self._is_indexed(curr):
+                return curr._ancestry_id, unindexed
+            unindexed.append(curr)
+            curr = curr.get_parent()
+        return -1, unindexed
+
+    def _path_of(self, number, separator):
+        """Return the path of node <number>, joined by <separator>.
+        The paths of the node and its parent are remembered, so that later
+        queries for the node or its siblings take constant time.
+        @type self: AncestryIndex
+        @type number: int
+        @type separator: str
+        @rtype: str
+        """
+        path = self._paths.get((separator, number))
+        if path is not None:
+            return path
+        name = self._names[self._name_ids[number]]
+        parent = self._parents[number]
+        if parent < 0:
+            path = name
+        else:
+            parent_path = self._paths.get((separator, parent))
+            if parent_path is None:
+                names = []
+                curr = parent
+                while curr >= 0:
+                    names.append(self._names[self._name_ids[curr]])
+                    curr = self._parents[curr]
+                names.reverse()
+                parent_path = separator.join(names)
+                self._paths[(separator, parent)] = parent_path
+            path = parent_path + separator + name
+        self._paths[(separator, number)] = path
+        return path
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
@@ -0,0 +1,226 @@
+"""Treemap Visualiser: Headless Batch Export
+=== Module Description ===
+This module writes treemaps of folders to PNG or SVG image files without
+opening a window, e.g. from cron on a server with no display:
+    python batch_export.py /home /srv --width 3840 --output-dir out
+
+Each folder is scanned (see fs_scanner), laid out with
+AbstractTree.generate_treemap at the requested resolution, and encoded,
+either by drawing onto an offscreen pygame surface for PNG or by writing
+the rectangles as SVG text. Folders are exported concurrently by a pool of
+processes, and the time each one spent scanning, laying out and encoding
+is reported.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from colours import COLOUR_POLICIES
+from fs_scanner import scan_tree, DEFAULT_WORKERS
+from layouts import LAYOUTS
+from scan_policy import ScanPolicy
+from tree_data import AbstractTree
+
+
+FORMATS = ('png', 'svg')
+# The default number of folders exported at the same time.
+DEFAULT_PROCESSES = os.cpu_count() or 1
+
+
+def export_treemap(path, filename, size, layout='slice-and-dice',
+                   min_area=0, workers=DEFAULT_WORKERS, colours='path',
+                   policy=None, top=None, min_size=None):
+    """Write the treemap of the file or folder <path> to the image file
+    <filename>, whose format is given by its extension (see FORMATS).
+    The treemap is <size> pixels, as (width, height). <layout> names one
+    of layouts.LAYOUTS, and <min_area> is as for
+    AbstractTree.generate_treemap. The folder is scanned by <workers>
+    threads. <colours> names the colour policy, one of
+    colours.COLOUR_POLICIES; the default gives the same image for the same
+    folder every time. Files are sized by <policy>, or by a new ScanPolicy
+    if it is None; see scan_policy. <top> and <min_size> prune the tree as
+    for fs_scanner.scan_tree.
+    Return the time taken by each stage, in seconds, keyed by 'scan',
+    'layout' and 'encode', together with the number of rectangles drawn
+    under 'rectangles'.
+    Raise ValueError if the format of <filename> is not supported.
+    @type path: str
+    @type filename: str
+    @type size: (int, int)
+    @type layout: str
+    @type min_area: int
+    @type workers: int
+    @type colours: str
+    @type policy: ScanPolicy | None
+    @type top: int | None
+    @type min_size: int | None
+    @rtype: dict[str, float]
+    """
+    AbstractTree.set_colour_policy(COLOUR_POLICIES[colours])
+    image_format = os.path.splitext(filename)[1][1:].lower()
+    if image_format not in FORMATS:
+        raise ValueError('unsupported image format: {}'.format(filename))
+    times = {}
+    start = time.perf_counter()
+    tree = scan_tree(path, workers, policy=policy, top=top,
+                     min_size=min_size)
+    times['scan'] = time.perf_counter() - start
+    start = time.perf_counter()
+    items = [item for item in tree.generate_treemap(
+        (0, 0, size[0], size[1]), LAYOUTS[layout], min_area)
+             if item[0][2] >= 1 and item[0][3] >= 1]
+    times['layout'] = time.perf_counter() - start
+    start = time.perf_counter()
+    if image_format == 'png':
+        write_png(items, size, filename)
+    else:
+        write_svg(items, size, filename)
+    times['encode'] = time.perf_counter() - start
+    times['rectangles'] = len(items)
+    return times
+
+
+def write_png(items, size, filename):
+    """Draw the rectangles <items> onto a black offscreen surface of <size>
+    pixels and save it as a PNG file <filename>.
+    No display is needed.
+    @type items: list[((int, int, int, int), (int, int, int))]
+    @type size: (int, int)
+    @type filename: str
+    @rtype: None
+    """
+    # Imported here so that SVG export does not need pygame.
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    surface = pygame.Surface(size)
+    surface.fill((0, 0, 0))
+    for rect, colour in items:
+        surface.fill(colour, rect)
+    pygame.image.save(surface, filename)
+
+
+def write_svg(items, size, filename):
+    """Write the rectangles <items>, on a black background of <size>
+    pixels, to the SVG file <filename>.
+    @type items: list[((int, int, int, int), (int, int, int))]
+    @type size: (int, int)
+    @type filename: str
+    @rtype: None
+    """
+    with open(filename, 'w', encoding='utf-8') as file:
+        file.write('<svg xmlns="http://www.w3.org/2000/svg" width="{0}" '
+                   'height="{1}" viewBox="0 0 {0} {1}" '
+                   'shape-rendering="crispEdges">\n'.format(*size))
+        file.write('<rect width="{}" height="{}" fill="#000000"/>\n'.format(
+            *size))
+        file.writelines(
+            '<rect x="{}" y="{}" width="{}" height="{}" '
+            'fill="#{:02x}{:02x}{:02x}"/>\n'.format(*(rect + colour))
+            for rect, colour in items)
+        file.write('</svg>\n')
+
+
+def output_names(paths, directory, image_format):
+    """Return the image file to write for each of <paths>, in <directory>.
+    Each file is named after the last component of its path; later paths
+    with the same name get a numbered suffix.
+    @type paths: list[str]
+    @type directory: str
+    @type image_format: str
+    @rtype: list[str]
+    """
+    names = []
+    used = set()
+    for path in paths:
+        base = os.path.basename(os.path.normpath(os.path.abspath(path)))
+        name = base or 'root'
+        number = 1
+        while name in used:
+            number += 1
+            name = '{}-{}'.format(base or 'root', number)
+        used.add(name)
+        names.append(os.path.join(directory,
+                                  '{}.{}'.format(name, image_format)))
+    return names
+
+
+def main(argv=None):
+    """Parse the command line, export the treemaps and report the time
+    taken by each. Return the exit status: 0 if every export succeeded,
+    1 otherwise.
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Write treemaps of folders to image files without a '
+                    'display.')
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help='a file or folder to export')
+    parser.add_argument('--format', choices=FORMATS, default='png')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--output-dir', default=os.curdir,
+                        help='the folder the images are written to')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS),
+                        default='slice-and-dice',
+                        help='the treemap layout algorithm')
+    parser.add_argument('--colours', choices=sorted(COLOUR_POLICIES),
+                        default='path',
+                        help='how rectangles are coloured')
+    parser.add_argument('--min-area', type=int, default=0,
+                        help='draw subtrees covering fewer pixels than this '
+                             'as a single rectangle')
+    parser.add_argument('--disk-usage', action='store_true',
+                        help='size files by the disk blocks they use rather '
+                             'than their apparent size')
+    parser.add_argument('--count-links', action='store_true',
+                        help='count a file with several hard links at every '
+                             'link, not just the first')
+    parser.add_argument('--one-file-system', action='store_true',
+                        help='do not enter folders on other file systems')
+    parser.add_argument('--top', type=int, metavar='N',
+                        help='keep only the N largest entries of each folder, '
+                             'folding the rest into one "other" rectangle')
+    parser.add_argument('--min-size', type=int, metavar='BYTES',
+                        help='keep entries of at least BYTES even if they are '
+                             'not among the --top largest')
+    parser.add_argument('--processes', type=int, default=DEFAULT_PROCESSES,
+                        help='folders exported at the same time')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='threads used to scan each folder')
+    args = parser.parse_args(argv)
+    filenames = output_names(args.paths, args.output_dir, args.format)
+    failed = 0
+    start = time.perf_counter()
+    print('{:>9} {:>9} {:>9} {:>8}  {}'.format('scan', 'layout', 'encode',
+                                               'rects', 'image'))
+    with ProcessPoolExecutor(max_workers=max(1, args.processes)) as pool:
+        futures = [pool.submit(export_treemap, path, filename,
+                               (args.width, args.height), args.layout,
+                               args.min_area, args.workers, args.colours,
+                               ScanPolicy(args.disk_usage,
+                                          not args.count_links,
+                                          args.one_file_system),
+                               args.top, args.min_size)
+                   for path, filename in zip(args.paths, filenames)]
+        for path, filename, future in zip(args.paths, filenames, futures):
+            try:
+                times = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                # One folder failing must not stop the others.
+                print('{}: {}'.format(path, error), file=sys.stderr)
+                failed += 1
+                continue
+            print('{:7.1f}ms {:7.1f}ms {:7.1f}ms {:8}  {}'.format(
+                times['scan'] * 1000, times['layout'] * 1000,
+                times['encode'] * 1000, times['rectangles'], filename))
+    print('{} of {} exported in {:.2f}s'.format(
+        len(args.paths) - failed, len(args.paths),
+        time.perf_counter() - start))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
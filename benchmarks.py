@@ -0,0 +1,1284 @@
+"""Treemap Visualiser: Benchmarks
+=== Module Description ===
+This module contains benchmarks for the treemap program, together with the
+helpers that generate the synthetic data they run on.
+Each benchmark is a subcommand, e.g.:
+    python benchmarks.py scan --depth 4 --fanout 6 --files 20
+Run python benchmarks.py --help for the full list.
+
+The suite subcommand times the main tree operations on trees of several
+shapes, built with fixed random seeds so that every run measures the same
+work, and saves the results as JSON. compare then flags the benchmarks
+that became slower between two saved runs:
+    python benchmarks.py suite --output before.json
+    python benchmarks.py suite --output after.json
+    python benchmarks.py compare before.json after.json
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tree_data import AbstractTree, FileSystemTree
+from fs_scanner import scan_tree, scan_tree_sharded, DEFAULT_WORKERS, \
+    DEFAULT_PROCESSES
+from snapshot import save_snapshot, load_snapshot
+from rescan import refresh_snapshot
+from layouts import LAYOUTS, aspect_ratio
+from tabular import load_table
+
+
+# The format version of the results saved by the suite benchmark.
+SUITE_VERSION = 1
+# The size of the rectangle the suite lays trees out in.
+SUITE_WIDTH = 768
+SUITE_HEIGHT = 668
+# The size of the largest leaf of make_zipf_tree.
+ZIPF_LARGEST = 10 ** 9
+# The folder names and the kinds of file of make_source_paths, each kind
+# as its extension and its typical size in bytes; the chance that each
+# file starts a new folder; how deep folders are nested at most; and the
+# largest file size.
+SOURCE_FOLDERS = ('src', 'lib', 'include', 'tests', 'docs', 'tools',
+                  'core', 'util', 'net', 'ui', 'io', 'assets')
+SOURCE_FILES = (('.py', 6000), ('.c', 12000), ('.h', 3000), ('.md', 4000),
+                ('.json', 1500), ('.png', 40000))
+SOURCE_FOLDER_RATE = 0.1
+SOURCE_DEPTH = 8
+SOURCE_MAX_SIZE = 2 ** 20
+
+
+def make_directory_fixture(root, depth, fanout, files_per_dir, max_size=4096):
+    """Create a synthetic directory tree inside the folder <root>.
+    Every directory down to <depth> levels below <root> has <fanout>
+    subdirectories and <files_per_dir> files of between 1 and <max_size>
+    bytes. Return the number of files created.
+    @type root: str
+    @type depth: int
+    @type fanout: int
+    @type files_per_dir: int
+    @type max_size: int
+    @rtype: int
+    """
+    count = 0
+    stack = [(root, depth)]
+    while stack:
+        dir_path, level = stack.pop()
+        for i in range(files_per_dir):
+            size = (count * 37) % max_size + 1
+            with open(os.path.join(dir_path, 'file{}.dat'.format(i)),
+                      'wb') as file:
+                file.write(b'x' * size)
+            count += 1
+        if level > 0:
+            for i in range(fanout):
+                sub_path = os.path.join(dir_path, 'dir{}'.format(i))
+                os.mkdir(sub_path)
+                stack.append((sub_path, level - 1))
+    return count
+
+
+def remove_directory(root):
+    """Delete the folder <root> and everything inside it.
+    Unlike shutil.rmtree, this does not recurse, so it can remove the
+    very deep fixtures made by make_chain_directory.
+    @type root: str
+    @rtype: None
+    """
+    folders = []
+    stack = [root]
+    while stack:
+        dir_path = stack.pop()
+        folders.append(dir_path)
+        with os.scandir(dir_path) as iterator:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    os.unlink(entry.path)
+    for dir_path in reversed(folders):
+        os.rmdir(dir_path)
+
+
+def _traced(function, *args):
+    """Call <function> with <args>, returning the elapsed time in seconds
+    and the peak memory allocated during the call, in bytes.
+    @type function: callable
+    @rtype: (float, int)
+    """
+    tracemalloc.start()
+    try:
+        elapsed, _ = _timed(function, *args)
+        return elapsed, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _timed(function, *args):
+    """Call <function> with <args>, returning the elapsed time in seconds
+    and the function's return value.
+    @type function: callable
+    @rtype: (float, object)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_scan(args):
+    """Compare FileSystemTree with fs_scanner.scan_tree on a synthetic
+    directory tree.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    try:
+        count = make_directory_fixture(root, args.depth, args.fanout,
+                                       args.files)
+        print('{} files under {}'.format(count, root))
+        recursive_time, expected = _timed(FileSystemTree, root)
+        print('FileSystemTree:        {:.3f}s'.format(recursive_time))
+        for workers in args.workers:
+            scan_time, tree = _timed(scan_tree, root, workers)
+            assert tree.data_size == expected.data_size
+            print('scan_tree ({:2} workers): {:.3f}s  ({:.2f}x)'.format(
+                workers, scan_time, recursive_time / scan_time))
+    finally:
+        remove_directory(root)
+
+
+def make_chain_tree(levels):
+    """Return an AbstractTree that is a single chain <levels> nodes deep,
+    ending in one leaf of size 1.
+    @type levels: int
+    @rtype: AbstractTree
+    """
+    tree = AbstractTree(levels, [], 1)
+    for level in range(levels - 1, 0, -1):
+        tree = AbstractTree(level, [tree])
+    return tree
+
+
+def make_comb_tree(levels):
+    """Return an AbstractTree that is a chain <levels> nodes deep, like
+    make_chain_tree, but with a leaf of size 1 beside the chain at every
+    level, so that the tree has <levels> leaves at every depth.
+    @type levels: int
+    @rtype: AbstractTree
+    """
+    tree = AbstractTree(levels, [], 1)
+    for level in range(levels - 1, 0, -1):
+        tree = AbstractTree(level, [AbstractTree(-level, [], 1), tree])
+    return tree
+
+
+def make_balanced_tree(depth, fanout):
+    """Return a balanced AbstractTree <depth> levels below the root, in
+    which every internal node has <fanout> subtrees. Leaf sizes vary
+    deterministically between 1 and 1000.
+    @type depth: int
+    @type fanout: int
+    @rtype: AbstractTree
+    """
+    level = [AbstractTree(i, [], (i * 37) % 1000 + 1)
+             for i in range(fanout ** depth)]
+    while len(level) > 1:
+        level = [AbstractTree(i, level[i * fanout:(i + 1) * fanout])
+                 for i in range(len(level) // fanout)]
+    return level[0]
+
+
+def make_chain_directory(root, levels):
+    """Create a chain of <levels> nested folders inside <root>, with one
+    small file at the bottom. Return the path of the innermost folder.
+    @type root: str
+    @type levels: int
+    @rtype: str
+    """
+    dir_path = root
+    for _ in range(levels):
+        dir_path = os.path.join(dir_path, 'd')
+        os.mkdir(dir_path)
+    with open(os.path.join(dir_path, 'leaf.dat'), 'wb') as file:
+        file.write(b'x')
+    return dir_path
+
+
+def bench_deep(args):
+    """Build, lay out and list the leaves of very deep trees, well past
+    Python's recursion limit.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    build_time, tree = _timed(make_chain_tree, args.levels)
+    print('{}-level chain built:  {:.3f}s'.format(args.levels, build_time))
+    layout_time, rects = _timed(tree.generate_treemap, (0, 0, 768, 668))
+    assert [rect for rect, _ in rects] == [(0, 0, 768, 668)]
+    print('generate_treemap:        {:.3f}s'.format(layout_time))
+    leaf_time, leaves = _timed(tree.get_leaf)
+    assert [leaf.get_root() for leaf in leaves] == [args.levels]
+    print('get_leaf:                {:.3f}s'.format(leaf_time))
+    # Every node of a comb has a leaf to colour and a rectangle to cache,
+    # so work that grows with the depth of each node shows up here.
+    build_time, tree = _timed(make_comb_tree, args.comb_levels)
+    print('{}-level comb built:   {:.3f}s'.format(args.comb_levels,
+                                                  build_time))
+    layout_time, rects = _timed(tree.generate_treemap, (0, 0, 768, 668))
+    assert len(rects) == args.comb_levels
+    print('generate_treemap:        {:.3f}s'.format(layout_time))
+    leaf_time, leaves = _timed(tree.get_leaf)
+    assert len(leaves) == args.comb_levels
+    print('get_leaf:                {:.3f}s'.format(leaf_time))
+
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    try:
+        # Bounded by the operating system's maximum path length.
+        make_chain_directory(root, args.disk_levels)
+        scan_time, tree = _timed(FileSystemTree, root)
+        assert tree.data_size == 1 and len(tree.get_leaf()) == 1
+        print('FileSystemTree ({} folders deep): {:.3f}s'.format(
+            args.disk_levels, scan_time))
+        scan_time, tree = _timed(scan_tree, root)
+        assert tree.data_size == 1 and len(tree.get_leaf()) == 1
+        print('scan_tree ({} folders deep):      {:.3f}s'.format(
+            args.disk_levels, scan_time))
+    finally:
+        remove_directory(root)
+
+
+def bench_relayout(args):
+    """Time a full layout of a large balanced tree against relayouts after
+    size_up, size_down and remove_node on single leaves.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    tree = make_balanced_tree(args.depth, args.fanout)
+    leaves = tree.get_leaf()
+    rect = (0, 0, 768, 668)
+    print('{} leaves'.format(len(leaves)))
+    layout_time, _ = _timed(tree.generate_treemap, rect)
+    print('first layout:     {:8.2f}ms'.format(layout_time * 1000))
+    cached_time, _ = _timed(tree.generate_treemap, rect)
+    print('unchanged layout: {:8.2f}ms'.format(cached_time * 1000))
+    for name in ('size_up', 'size_down', 'remove_node'):
+        total = 0
+        for i in range(args.repeat):
+            leaf = leaves.pop((i * 7919) % len(leaves))
+            if name == 'remove_node':
+                tree.remove_node(leaf)
+            else:
+                getattr(tree, name)(leaf, tree.ceiling_(leaf))
+            total += _timed(tree.generate_treemap, rect)[0]
+        print('after {:11} {:8.2f}ms'.format(
+            name + ':', total / args.repeat * 1000))
+
+
+def bench_hittest(args):
+    """Time AbstractTree.cordinate against a linear scan of the treemap.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    tree = make_balanced_tree(args.depth, args.fanout)
+    rects = tree.generate_treemap((0, 0, 768, 668))
+    points = [((i * 7919) % 768, (i * 104729) % 668)
+              for i in range(args.clicks)]
+    index_time, _ = _timed(
+        lambda: [tree.cordinate(x, y, rects) for x, y in points])
+    leaves = tree.get_leaf()
+
+    def linear(x, y):
+        for leaf, (rect, _) in zip(leaves, rects):
+            if (rect[0] <= x < rect[0] + rect[2] and
+                    rect[1] <= y < rect[1] + rect[3]):
+                return leaf
+        return None
+
+    linear_time, _ = _timed(lambda: [linear(x, y) for x, y in points])
+    print('{} leaves, {} clicks'.format(len(leaves), args.clicks))
+    print('linear scan: {:8.3f}ms per click'.format(
+        linear_time / args.clicks * 1000))
+    print('cordinate:   {:8.3f}ms per click'.format(
+        index_time / args.clicks * 1000))
+
+
+def bench_stream(args):
+    """Compare the memory use and throughput of generate_treemap with the
+    streaming iter_treemap.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    rect = (0, 0, 768, 668)
+
+    def consume(rectangles):
+        count = 0
+        for _ in rectangles:
+            count += 1
+        return count
+
+    # Fresh trees for each run, so no run benefits from cached layouts.
+    runs = [
+        ('generate_treemap',
+         lambda tree: consume(tree.generate_treemap(rect))),
+        ('iter_treemap',
+         lambda tree: consume(tree.iter_treemap(rect))),
+        ('iter_treemap (skip_subpixel)',
+         lambda tree: consume(tree.iter_treemap(rect, True))),
+    ]
+    for name, run in runs:
+        tree = make_balanced_tree(args.depth, args.fanout)
+        elapsed, peak = _traced(run, tree)
+        print('{:30} {:8.1f}ms  peak {:8.1f}MiB'.format(
+            name, elapsed * 1000, peak / 2 ** 20))
+
+
+def bench_flat(args):
+    """Compare generate_treemap with the vectorized flat_layout engine.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    # Imported here so that the other benchmarks do not need NumPy.
+    from flat_layout import FlatTree
+    rect = (0, 0, 768, 668)
+    tree = make_balanced_tree(args.depth, args.fanout)
+    layout_time, expected = _timed(tree.generate_treemap, rect)
+    flatten_time, flat = _timed(FlatTree, tree)
+    flat_time, rects = _timed(flat.layout, rect)
+    assert flat.generate_treemap(rect) == expected
+    print('{} nodes, {} rectangles'.format(len(flat), len(rects)))
+    print('generate_treemap:  {:8.1f}ms'.format(layout_time * 1000))
+    print('FlatTree build:    {:8.1f}ms'.format(flatten_time * 1000))
+    print('FlatTree.layout:   {:8.1f}ms'.format(flat_time * 1000))
+
+
+def make_wide_tree(width):
+    """Return an AbstractTree whose root has <width> leaves, like a folder
+    holding many files. Leaf sizes vary deterministically between 1 and
+    1000.
+    @type width: int
+    @rtype: AbstractTree
+    """
+    return AbstractTree('root', [AbstractTree(i, [], (i * 37) % 1000 + 1)
+                                 for i in range(width)])
+
+
+def bench_layouts(args):
+    """Compare the layout algorithms on a wide and a balanced tree: layout
+    time, number of visible rectangles and their mean aspect ratio.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    rect = (0, 0, 768, 668)
+    trees = [('wide', make_wide_tree(args.width)),
+             ('balanced', make_balanced_tree(args.depth, args.fanout))]
+    print('{:9} {:15} {:>10} {:>8} {:>8} {:>12}'.format(
+        'tree', 'layout', 'time', 'rects', 'visible', 'mean aspect'))
+    for tree_name, tree in trees:
+        for name in sorted(LAYOUTS):
+            layout_time, rects = _timed(AbstractTree.generate_treemap, tree,
+                                        rect, LAYOUTS[name])
+            ratios = [ratio for ratio in (aspect_ratio(item[0])
+                                          for item in rects)
+                      if ratio is not None]
+            mean = sum(ratios) / len(ratios) if ratios else float('nan')
+            print('{:9} {:15} {:8.1f}ms {:8} {:8} {:12.2f}'.format(
+                tree_name, name, layout_time * 1000, len(rects),
+                len(ratios), mean))
+
+
+def bench_detail(args):
+    """Measure how min_area cuts the rectangles of a large balanced tree
+    and the time to produce them.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    rect = (0, 0, 768, 668)
+    tree = make_balanced_tree(args.depth, args.fanout)
+    print('{:>8} {:>10} {:>8} {:>8}'.format('min_area', 'time', 'rects',
+                                           'visible'))
+    for min_area in args.min_areas:
+        # A fresh walk each time, not the previous cached layout.
+        tree._invalidate_layout(tree)
+        layout_time, rects = _timed(tree.generate_treemap, rect, None,
+                                    min_area)
+        visible = sum(1 for item in rects
+                      if item[0][2] >= 1 and item[0][3] >= 1)
+        print('{:8} {:8.1f}ms {:8} {:8}'.format(
+            min_area, layout_time * 1000, len(rects), visible))
+
+
+def bench_render(args):
+    """Compare redrawing everything with render_display against the
+    retained-mode renderer, over clicks that select leaves and delete them,
+    and print a frame-time histogram for each.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    # Imported here so that the other benchmarks do not need pygame, and
+    # run without a window unless a video driver is chosen.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import treemap_visualiser
+    from renderer import FrameTimes
+    pygame.init()
+    screen = pygame.display.set_mode((treemap_visualiser.WIDTH,
+                                      treemap_visualiser.HEIGHT))
+    full_times = FrameTimes()
+    renderer = treemap_visualiser.make_renderer(screen)
+    for frame_times in (full_times, renderer.frame_times):
+        tree = make_balanced_tree(args.depth, args.fanout)
+        leaves = list(tree.get_leaf())
+        for i in range(args.frames):
+            leaf = leaves[(i * 7919) % len(leaves)]
+            if i % 2 == 0:
+                text = tree.get_path('/', leaf)
+            else:
+                text = ''
+                if leaf.get_parent() is not None:
+                    tree.remove_node(leaf)
+            if frame_times is full_times:
+                start = time.perf_counter()
+                treemap_visualiser.render_display(screen, tree, text)
+                full_times.add(time.perf_counter() - start)
+            else:
+                renderer.render(tree, text)
+    pygame.quit()
+    print('render_display:\n{}\n'.format(full_times))
+    print('TreemapRenderer:\n{}'.format(renderer.frame_times))
+
+
+def bench_zoom(args):
+    """Time laying out each view while zooming in on a large tree, level
+    by level, and back out again.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    from zoom import ZoomView
+    rect = (0, 0, 768, 668)
+    tree = make_balanced_tree(args.depth, args.fanout)
+    zoom = ZoomView(tree, rect, None, args.min_area)
+    print('{:>5} {:>10} {:>8}'.format('level', 'time', 'rects'))
+    for level in range(args.depth):
+        layout_time, items = _timed(zoom.treemap)
+        print('{:5} {:8.1f}ms {:8}  in'.format(level, layout_time * 1000,
+                                              len(items)))
+        zoom.zoom_in(0, 0)
+    while zoom.zoom_out():
+        layout_time, items = _timed(zoom.treemap)
+        level = sum(1 for _ in _ancestors(zoom.view))
+        print('{:5} {:8.1f}ms {:8}  out'.format(level, layout_time * 1000,
+                                               len(items)))
+
+
+def _ancestors(tree):
+    """Yield the ancestors of <tree>, parent first.
+    @type tree: AbstractTree
+    @rtype: iterator[AbstractTree]
+    """
+    while tree.get_parent() is not None:
+        tree = tree.get_parent()
+        yield tree
+
+
+def bench_ancestry(args):
+    """Compare building path strings by walking up and prepending with
+    the ancestry index, on a deep chain and on every leaf of a balanced
+    tree.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    chain = make_chain_tree(args.levels)
+    leaf = chain.get_leaf()[0]
+    walk_time, expected = _timed(_prepend_path, '/', leaf)
+    build_time, _ = _timed(chain.get_ancestry)
+    first_time, path = _timed(chain.get_path, '/', leaf)
+    again_time, _ = _timed(chain.get_path, '/', leaf)
+    assert path == expected
+    print('chain of {} nodes:'.format(args.levels))
+    print('  walk and prepend: {:8.1f}ms'.format(walk_time * 1000))
+    print('  index build:      {:8.1f}ms'.format(build_time * 1000))
+    print('  first query:      {:8.1f}ms'.format(first_time * 1000))
+    print('  repeated query:   {:8.3f}ms'.format(again_time * 1000))
+    tree = make_balanced_tree(args.depth, args.fanout)
+    leaves = tree.get_leaf()
+    walk_time, _ = _timed(lambda: [_prepend_path('/', node)
+                                   for node in leaves])
+    tree.get_ancestry()
+    index_time, _ = _timed(lambda: [tree.get_path('/', node)
+                                    for node in leaves])
+    print('{} leaves of a balanced tree:'.format(len(leaves)))
+    print('  walk and prepend: {:8.1f}ms'.format(walk_time * 1000))
+    print('  ancestry index:   {:8.1f}ms'.format(index_time * 1000))
+
+
+def _prepend_path(separator, node):
+    """Return the path of <node> the way get_path used to build it, by
+    walking up and prepending each name.
+    @type separator: str
+    @type node: AbstractTree
+    @rtype: str
+    """
+    result_str = ""
+    curr = node
+    while curr.get_parent() is not None:
+        result_str = separator + str(curr.get_root()) + result_str
+        curr = curr.get_parent()
+    return str(curr.get_root()) + result_str
+
+
+def make_table_fixture(filename, rows, regions, countries, cities):
+    """Write a synthetic CSV file <filename> of <rows> rows with the
+    columns region, country, city and cost, spread over <regions> regions
+    of <countries> countries of <cities> cities each.
+    @type filename: str
+    @type rows: int
+    @type regions: int
+    @type countries: int
+    @type cities: int
+    @rtype: None
+    """
+    with open(filename, 'w', encoding='utf-8') as file:
+        file.write('region,country,city,cost\n')
+        for i in range(rows):
+            region = i % regions
+            country = (i // regions) % countries
+            city = (i // (regions * countries)) % cities
+            file.write('r{0},r{0}c{1},r{0}c{1}t{2},{3}\n'.format(
+                region, country, city, (i * 37) % 1000 + 1))
+
+
+def bench_table(args):
+    """Measure the time and peak memory taken by tabular.load_table to
+    build a tree from a synthetic CSV file, for growing numbers of rows
+    with the same distinct nodes.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    filename = os.path.join(root, 'table.csv')
+    try:
+        for rows in args.rows:
+            make_table_fixture(filename, rows, args.regions, args.countries,
+                               args.cities)
+            elapsed, peak = _traced(load_table, filename,
+                                    'region/country/city', 'cost')
+            print('{:9} rows: {:8.1f}ms, {:8.0f} rows/s, peak {:6.1f}MB'
+                  .format(rows, elapsed * 1000, rows / elapsed,
+                          peak / 2 ** 20))
+    finally:
+        remove_directory(root)
+
+
+def bench_prune(args):
+    """Compare the time and peak memory of scan_tree with and without
+    pruning to the largest entries of each directory, on a synthetic
+    directory tree.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    try:
+        count = make_directory_fixture(root, args.depth, args.fanout,
+                                       args.files)
+        print('{} files'.format(count))
+        full_time, full_peak = _traced(scan_tree, root, DEFAULT_WORKERS)
+        print('full scan:       {:7.3f}s, peak {:6.1f}MB'.format(
+            full_time, full_peak / 2 ** 20))
+        pruned_time, pruned_peak = _traced(
+            lambda: scan_tree(root, DEFAULT_WORKERS, top=args.top))
+        print('top {:<4} scan:   {:7.3f}s, peak {:6.1f}MB'.format(
+            args.top, pruned_time, pruned_peak / 2 ** 20))
+    finally:
+        remove_directory(root)
+
+
+def bench_shard(args):
+    """Compare the time of scan_tree and scan_tree_sharded on a synthetic
+    directory tree.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    try:
+        count = make_directory_fixture(root, args.depth, args.fanout,
+                                       args.files)
+        print('{} files'.format(count))
+        single, _ = _timed(scan_tree, root, DEFAULT_WORKERS)
+        print('scan_tree:               {:7.3f}s'.format(single))
+        sharded, _ = _timed(scan_tree_sharded, root, args.processes,
+                         DEFAULT_WORKERS)
+        print('scan_tree_sharded ({:2}):  {:7.3f}s ({:.1f}x)'.format(
+            args.processes, sharded, single / sharded))
+    finally:
+        remove_directory(root)
+
+
+def _traced_result(function, *args):
+    """Call <function> with <args>, returning its result and the memory
+    still allocated by the call when it returns, in bytes.
+    @type function: callable
+    @rtype: (object, int)
+    """
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args):
+    """Measure the memory held per node by a synthetic AbstractTree and by
+    a FileSystemTree of a synthetic directory tree.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    tree, size = _traced_result(make_balanced_tree, args.depth, args.fanout)
+    nodes = _count_nodes(tree)
+    print('AbstractTree:   {:7} nodes, {:6.1f} bytes/node'.format(
+        nodes, size / nodes))
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    try:
+        make_directory_fixture(root, 3, args.fanout, args.fanout, 16)
+        tree, size = _traced_result(FileSystemTree, root)
+        nodes = _count_nodes(tree)
+        print('FileSystemTree: {:7} nodes, {:6.1f} bytes/node'.format(
+            nodes, size / nodes))
+    finally:
+        remove_directory(root)
+
+
+def bench_snapshot(args):
+    """Compare rescanning a synthetic directory tree with saving it to a
+    snapshot and loading it back.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    try:
+        make_directory_fixture(root, args.depth, args.fanout, args.files)
+        scan_time, tree = _timed(scan_tree, root)
+        filename = os.path.join(tempfile.gettempdir(), 'treemap_bench.snap')
+        save_time, _ = _timed(save_snapshot, tree, filename)
+        load_time, loaded = _timed(load_snapshot, filename)
+        # Selecting a leaf must only load the nodes that were laid out.
+        rects = loaded.generate_treemap((0, 0, 768, 668), None, 16384)
+        leaf = loaded.cordinate(300, 300, rects)
+        laid_out = _count_loaded(loaded)
+        path = loaded.get_path('/', leaf)
+        assert loaded.is_ancestor(loaded, leaf)
+        assert _count_loaded(loaded) == laid_out
+        assert path.endswith('/' + str(leaf.get_root()))
+        walk_time, nodes = _timed(_count_nodes, loaded)
+        assert loaded.data_size == tree.data_size
+        print('{} nodes, snapshot of {} bytes'.format(
+            nodes, os.path.getsize(filename)))
+        print('loaded to select a leaf: {} nodes'.format(laid_out))
+        print('scan_tree:          {:8.1f}ms'.format(scan_time * 1000))
+        print('save_snapshot:      {:8.1f}ms'.format(save_time * 1000))
+        print('load_snapshot:      {:8.1f}ms'.format(load_time * 1000))
+        print('load every node:    {:8.1f}ms'.format(walk_time * 1000))
+        os.unlink(filename)
+    finally:
+        remove_directory(root)
+
+
+def bench_rescan(args):
+    """Compare a full rescan of a synthetic directory tree with refreshing
+    a snapshot of it after a few changes.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    filename = os.path.join(tempfile.gettempdir(), 'treemap_bench.snap')
+    try:
+        make_directory_fixture(root, args.depth, args.fanout, args.files)
+        stamps = {}
+        save_snapshot(scan_tree(root, DEFAULT_WORKERS, stamps), filename,
+                      stamps)
+        # Add, grow and delete a file in a few directories.
+        changed = root
+        for level in range(args.depth):
+            changed = os.path.join(changed, 'dir{}'.format(level))
+            with open(os.path.join(changed, 'new.dat'), 'wb') as file:
+                file.write(b'x' * 100)
+            with open(os.path.join(changed, 'file0.dat'), 'ab') as file:
+                file.write(b'x' * 100)
+            os.unlink(os.path.join(changed, 'file1.dat'))
+        scan_time, expected = _timed(scan_tree, root)
+        refresh_time, tree = _timed(refresh_snapshot, filename)
+        assert tree.data_size == expected.data_size
+        assert load_snapshot(filename).data_size == expected.data_size
+        print('{} directories changed'.format(args.depth))
+        print('scan_tree:          {:8.1f}ms'.format(scan_time * 1000))
+        print('refresh_snapshot:   {:8.1f}ms'.format(refresh_time * 1000))
+        os.unlink(filename)
+    finally:
+        remove_directory(root)
+
+
+def _count_nodes(tree):
+    """Return the number of nodes in <tree>.
+    @type tree: AbstractTree
+    @rtype: int
+    """
+    count = 0
+    stack = [tree]
+    while stack:
+        count += 1
+        stack.extend(stack.pop().get_subtrees())
+    return count
+
+
+def make_zipf_tree(leaves, fanout, exponent=1.0, seed=0):
+    """Return an AbstractTree with <leaves> leaves whose sizes follow
+    Zipf's law with <exponent>, as file sizes on real disks roughly do:
+    the k-th largest leaf has size ZIPF_LARGEST / k ** <exponent>. The
+    sizes are shuffled with the random seed <seed>, and every internal
+    node has up to <fanout> subtrees.
+    @type leaves: int
+    @type fanout: int
+    @type exponent: float
+    @type seed: int
+    @rtype: AbstractTree
+    """
+    sizes = [max(1, int(ZIPF_LARGEST / rank ** exponent))
+             for rank in range(1, leaves + 1)]
+    random.Random(seed).shuffle(sizes)
+    level = [AbstractTree(i, [], size) for i, size in enumerate(sizes)]
+    while len(level) > 1:
+        level = [AbstractTree(i, level[start:start + fanout])
+                 for i, start in enumerate(range(0, len(level), fanout))]
+    return level[0]
+
+
+def make_source_paths(files, seed=0):
+    """Return the relative paths and sizes of <files> files laid out like
+    a source code repository: folders with names such as src and tests,
+    nested up to SOURCE_DEPTH levels, holding files of a few kinds whose
+    sizes are spread around a typical size for their kind. The layout is
+    chosen with the random seed <seed>.
+    @type files: int
+    @type seed: int
+    @rtype: list[(str, int)]
+    """
+    rng = random.Random(seed)
+    folders = ['']
+    taken = set(folders)
+    paths = []
+    for number in range(files):
+        if rng.random() < SOURCE_FOLDER_RATE:
+            parent = rng.choice([folder for folder in folders
+                                 if folder.count(os.sep) < SOURCE_DEPTH - 1
+                                 or not folder])
+            folder = os.path.join(parent, rng.choice(SOURCE_FOLDERS))
+            if folder in taken:
+                folder += str(len(folders))
+            folders.append(folder)
+            taken.add(folder)
+        folder = rng.choice(folders)
+        extension, typical = rng.choice(SOURCE_FILES)
+        size = int(rng.lognormvariate(math.log(typical), 1.0))
+        paths.append((os.path.join(folder, 'file{}{}'.format(
+            number, extension)), min(max(size, 1), SOURCE_MAX_SIZE)))
+    return paths
+
+
+def make_path_tree(paths):
+    """Return an AbstractTree named 'root' of the files at the relative
+    <paths>, given with their sizes, such as those of make_source_paths.
+    @type paths: list[(str, int)]
+    @rtype: AbstractTree
+    """
+    # Each folder is a dict of its entries by name: a dict for a
+    # subfolder, or the size of a file.
+    top = {}
+    for path, size in paths:
+        names = path.split(os.sep)
+        folder = top
+        for name in names[:-1]:
+            folder = folder.setdefault(name, {})
+        folder[names[-1]] = size
+    return _folder_tree('root', top)
+
+
+def _folder_tree(name, folder):
+    """Return the AbstractTree named <name> of the nested dict <folder>;
+    see make_path_tree.
+    @type name: str
+    @type folder: dict[str, dict | int]
+    @rtype: AbstractTree
+    """
+    return AbstractTree(name, [
+        _folder_tree(sub_name, entry) if isinstance(entry, dict)
+        else AbstractTree(sub_name, [], entry)
+        for sub_name, entry in folder.items()])
+
+
+def make_source_directory(root, files, seed=0):
+    """Create the files of make_source_paths(<files>, <seed>) inside the
+    folder <root>. Return the number of files created.
+    @type root: str
+    @type files: int
+    @type seed: int
+    @rtype: int
+    """
+    paths = make_source_paths(files, seed)
+    for path, size in paths:
+        filename = os.path.join(root, path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'wb') as file:
+            file.write(b'x' * size)
+    return len(paths)
+
+
+def _suite_shapes(size):
+    """Return the tree shapes of the benchmark suite, each as a function
+    returning a new tree of about <size> leaves, by name.
+    The chain and the comb are only a tenth of <size> deep, since every
+    click on them walks down the whole chain. The source tree's paths are
+    chosen once, so that only building the tree is timed.
+    @type size: int
+    @rtype: dict[str, callable]
+    """
+    depth = max(1, int(round(math.log10(max(size, 10)))))
+    paths = make_source_paths(size)
+    return {
+        'wide': lambda: make_wide_tree(size),
+        'chain': lambda: make_chain_tree(max(1, size // 10)),
+        'comb': lambda: make_comb_tree(max(1, size // 10)),
+        'balanced': lambda: make_balanced_tree(depth, 10),
+        'zipf': lambda: make_zipf_tree(size, 10),
+        'source': lambda: make_path_tree(paths),
+    }
+
+
+def _measure(function, repeat):
+    """Call <function> <repeat> times, with the garbage collector off
+    during each call as timeit does, and return the times taken: their
+    minimum, median and every run, in seconds.
+    @type function: callable
+    @type repeat: int
+    @rtype: dict
+    """
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            elapsed, _ = _timed(function)
+        finally:
+            gc.enable()
+        runs.append(elapsed)
+    return {'min': min(runs), 'median': statistics.median(runs),
+            'runs': runs}
+
+
+def _suite_tree(make_tree, repeat, clicks, sample):
+    """Return the measurements of the suite's tree operations on trees
+    made by <make_tree>, each repeated <repeat> times. cordinate is timed
+    over <clicks> points, and get_path, size_up and remove_node over
+    <sample> leaves, spread through the tree.
+    Each measurement also records the calls it made, as 'calls'.
+    @type make_tree: callable
+    @type repeat: int
+    @type clicks: int
+    @type sample: int
+    @rtype: dict[str, dict]
+    """
+    results = {'build': _measure(make_tree, repeat)}
+    results['build']['calls'] = 1
+    tree = make_tree()
+    # Alternating between two rectangles makes every node be laid out
+    # again, rather than reused from the layout cache.
+    rects = [(0, 0, SUITE_WIDTH, SUITE_HEIGHT),
+             (0, 0, SUITE_WIDTH - 1, SUITE_HEIGHT)]
+    results['generate_treemap'] = _measure(
+        lambda: tree.generate_treemap(rects.append(rects.pop(0)) or
+                                      rects[0]), repeat)
+    results['generate_treemap']['calls'] = 1
+    results['get_leaf'] = _measure(tree.get_leaf, repeat)
+    results['get_leaf']['calls'] = 1
+    items = tree.generate_treemap(rects[0])
+    points = [((i * 7919) % SUITE_WIDTH, (i * 104729) % SUITE_HEIGHT)
+              for i in range(clicks)]
+    results['cordinate'] = _measure(
+        lambda: [tree.cordinate(x, y, items) for x, y in points], repeat)
+    results['cordinate']['calls'] = clicks
+    leaves = tree.get_leaf()
+    chosen = leaves[::max(1, len(leaves) // sample)][:sample]
+    tree.get_ancestry()
+    results['get_path'] = _measure(
+        lambda: [tree.get_path('/', leaf) for leaf in chosen], repeat)
+
+    def resize():
+        """Grow each chosen leaf, then shrink it back."""
+        for leaf in chosen:
+            tree.size_up(leaf, 1)
+            tree.size_up(leaf, -1)
+
+    results['size_up'] = _measure(resize, repeat)
+    parents = [leaf.get_parent() for leaf in chosen]
+
+    def remove():
+        """Remove each chosen leaf, then add it back."""
+        for leaf, parent in zip(chosen, parents):
+            if parent is not None:
+                tree.remove_node(leaf)
+                tree.add_node(parent, leaf)
+
+    results['remove_node'] = _measure(remove, repeat)
+    for name in ('get_path', 'size_up', 'remove_node'):
+        results[name]['calls'] = len(chosen)
+    return results
+
+
+def _suite_disk(make_fixture, repeat):
+    """Return the measurements of scanning a directory fixture, made
+    inside a temporary folder by <make_fixture>, with scan_tree and the
+    FileSystemTree constructor, each repeated <repeat> times.
+    @type make_fixture: callable
+    @type repeat: int
+    @rtype: dict[str, dict]
+    """
+    root = tempfile.mkdtemp(prefix='treemap_bench_')
+    try:
+        make_fixture(root)
+        results = {'scan_tree': _measure(lambda: scan_tree(root), repeat),
+                   'FileSystemTree': _measure(lambda: FileSystemTree(root),
+                                              repeat)}
+    finally:
+        remove_directory(root)
+    for measurement in results.values():
+        measurement['calls'] = 1
+    return results
+
+
+def run_suite(size, repeat, clicks=1000, sample=100, disk_files=None):
+    """Run the benchmark suite and return its results, as saved by the
+    suite subcommand.
+    Every tree operation is timed on every shape of _suite_shapes with
+    about <size> leaves. If <disk_files> is not None, scanning is also
+    timed on a balanced and a source-like directory fixture of about
+    <disk_files> files.
+    @type size: int
+    @type repeat: int
+    @type clicks: int
+    @type sample: int
+    @type disk_files: int | None
+    @rtype: dict
+    """
+    results = {}
+    for shape, make_tree in _suite_shapes(size).items():
+        results[shape] = _suite_tree(make_tree, repeat, clicks, sample)
+    if disk_files is not None:
+        fanout = 6
+        depth = max(1, int(round(math.log(max(disk_files, fanout) / 10,
+                                          fanout))))
+        results['balanced_disk'] = _suite_disk(
+            lambda root: make_directory_fixture(root, depth, fanout, 10),
+            repeat)
+        results['source_disk'] = _suite_disk(
+            lambda root: make_source_directory(root, disk_files), repeat)
+    return {'version': SUITE_VERSION,
+            'settings': {'size': size, 'repeat': repeat, 'clicks': clicks,
+                         'sample': sample, 'disk_files': disk_files},
+            'machine': {'python': platform.python_version(),
+                        'implementation': platform.python_implementation(),
+                        'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'results': results}
+
+
+def compare_results(old, new, threshold=0.1, floor=5e-4):
+    """Compare two results of run_suite, <old> and <new>, benchmark by
+    benchmark, on the minimum time of their runs, which is the least
+    disturbed by noise.
+    Return a row for every benchmark: its name, its old and new minimum
+    times (None if it is missing from that result), their ratio and a
+    status. A benchmark is a 'regression' if its new minimum is more than
+    <threshold> slower than its old one, by at least <floor> seconds, and
+    also slower than the median of its old runs, so that a single lucky
+    old run is not enough; an 'improvement' is the same the other way
+    round. Others are 'same', 'added' or 'removed'.
+    @type old: dict
+    @type new: dict
+    @type threshold: float
+    @type floor: float
+    @rtype: list[(str, float | None, float | None, float | None, str)]
+    """
+    rows = []
+    names = set()
+    for result in (old, new):
+        for shape, measurements in result['results'].items():
+            names.update('{}/{}'.format(shape, name)
+                         for name in measurements)
+    for name in sorted(names):
+        shape, operation = name.split('/')
+        before = old['results'].get(shape, {}).get(operation)
+        after = new['results'].get(shape, {}).get(operation)
+        if before is None or after is None:
+            rows.append((name, before and before['min'],
+                         after and after['min'], None,
+                         'added' if before is None else 'removed'))
+            continue
+        ratio = after['min'] / before['min'] if before['min'] else None
+        if _is_slower(after, before, threshold, floor):
+            status = 'regression'
+        elif _is_slower(before, after, threshold, floor):
+            status = 'improvement'
+        else:
+            status = 'same'
+        rows.append((name, before['min'], after['min'], ratio, status))
+    return rows
+
+
+def _is_slower(slow, fast, threshold, floor):
+    """Return whether the measurement <slow> is clearly slower than the
+    measurement <fast>; see compare_results.
+    @type slow: dict
+    @type fast: dict
+    @type threshold: float
+    @type floor: float
+    @rtype: bool
+    """
+    return (slow['min'] > fast['min'] * (1 + threshold) and
+            slow['min'] - fast['min'] >= floor and
+            slow['min'] > fast['median'])
+
+
+def bench_suite(args):
+    """Run the benchmark suite on synthetic trees of several shapes and
+    directory fixtures, and save the results as JSON.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    results = run_suite(args.size, args.repeat, args.clicks, args.sample,
+                        None if args.no_disk else args.disk_files)
+    for shape, measurements in results['results'].items():
+        for name, measurement in measurements.items():
+            print('{:<14} {:<17} {:10.3f}ms  (median {:.3f}ms, {} calls)'
+                  .format(shape, name, measurement['min'] * 1000,
+                          measurement['median'] * 1000,
+                          measurement['calls']))
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print('results saved to {}'.format(args.output))
+
+
+def bench_compare(args):
+    """Compare two results saved by the suite benchmark, and exit with
+    status 1 if any benchmark regressed.
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    with open(args.old, encoding='utf-8') as file:
+        old = json.load(file)
+    with open(args.new, encoding='utf-8') as file:
+        new = json.load(file)
+    if old.get('settings') != new.get('settings'):
+        print('warning: the results were run with different settings')
+    if old.get('machine') != new.get('machine'):
+        print('warning: the results were run on different machines')
+    regressions = 0
+    for name, before, after, ratio, status in compare_results(
+            old, new, args.threshold, args.floor):
+        if status in ('added', 'removed'):
+            print('{:<32} {}'.format(name, status))
+            continue
+        print('{:<32} {:10.3f}ms -> {:10.3f}ms  {:6.2f}x  {}'.format(
+            name, before * 1000, after * 1000, ratio or 0.0,
+            status.upper() if status == 'regression' else status))
+        regressions += status == 'regression'
+    if regressions:
+        print('{} regressions'.format(regressions))
+        sys.exit(1)
+
+
+def _count_loaded(tree):
+    """Return the number of nodes of <tree> that exist in memory, without
+    loading any more of a lazily loaded tree.
+    @type tree: AbstractTree
+    @rtype: int
+    """
+    count = 0
+    stack = [tree]
+    while stack:
+        count += 1
+        stack.extend(stack.pop()._loaded_subtrees())
+    return count
+
+
+def main(argv=None):
+    """Parse the command line and run the chosen benchmark.
+    @type argv: list[str] | None
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    scan = subparsers.add_parser(
+        'scan', help='compare FileSystemTree with scan_tree')
+    scan.add_argument('--depth', type=int, default=4)
+    scan.add_argument('--fanout', type=int, default=6)
+    scan.add_argument('--files', type=int, default=20)
+    scan.add_argument('--workers', type=int, nargs='+',
+                      default=[1, 4, DEFAULT_WORKERS])
+    scan.set_defaults(run=bench_scan)
+
+    deep = subparsers.add_parser(
+        'deep', help='build, lay out and list the leaves of very deep trees')
+    deep.add_argument('--levels', type=int, default=50000)
+    deep.add_argument('--comb-levels', type=int, default=20000)
+    deep.add_argument('--disk-levels', type=int, default=1500)
+    deep.set_defaults(run=bench_deep)
+
+    relayout = subparsers.add_parser(
+        'relayout', help='time full layouts against cached relayouts')
+    relayout.add_argument('--depth', type=int, default=6)
+    relayout.add_argument('--fanout', type=int, default=10)
+    relayout.add_argument('--repeat', type=int, default=10)
+    relayout.set_defaults(run=bench_relayout)
+
+    hittest = subparsers.add_parser(
+        'hittest', help='time cordinate against a linear scan of the treemap')
+    hittest.add_argument('--depth', type=int, default=5)
+    hittest.add_argument('--fanout', type=int, default=10)
+    hittest.add_argument('--clicks', type=int, default=100)
+    hittest.set_defaults(run=bench_hittest)
+
+    stream = subparsers.add_parser(
+        'stream', help='compare generate_treemap with iter_treemap')
+    stream.add_argument('--depth', type=int, default=5)
+    stream.add_argument('--fanout', type=int, default=10)
+    stream.set_defaults(run=bench_stream)
+
+    flat = subparsers.add_parser(
+        'flat', help='compare generate_treemap with the flat_layout engine')
+    flat.add_argument('--depth', type=int, default=6)
+    flat.add_argument('--fanout', type=int, default=10)
+    flat.set_defaults(run=bench_flat)
+
+    layouts = subparsers.add_parser(
+        'layouts', help='compare the layout algorithms on two tree shapes')
+    layouts.add_argument('--width', type=int, default=10000)
+    layouts.add_argument('--depth', type=int, default=4)
+    layouts.add_argument('--fanout', type=int, default=10)
+    layouts.set_defaults(run=bench_layouts)
+
+    detail = subparsers.add_parser(
+        'detail', help='measure how min_area cuts the rectangles drawn')
+    detail.add_argument('--depth', type=int, default=5)
+    detail.add_argument('--fanout', type=int, default=10)
+    detail.add_argument('--min-areas', type=int, nargs='+',
+                        default=[0, 4, 16, 64])
+    detail.set_defaults(run=bench_detail)
+
+    render = subparsers.add_parser(
+        'render', help='compare full redraws with incremental rendering')
+    render.add_argument('--depth', type=int, default=4)
+    render.add_argument('--fanout', type=int, default=10)
+    render.add_argument('--frames', type=int, default=100)
+    render.set_defaults(run=bench_render)
+
+    zoom = subparsers.add_parser(
+        'zoom', help='time laying out each view while zooming in')
+    zoom.add_argument('--depth', type=int, default=5)
+    zoom.add_argument('--fanout', type=int, default=10)
+    zoom.add_argument('--min-area', type=int, default=4)
+    zoom.set_defaults(run=bench_zoom)
+
+    ancestry = subparsers.add_parser(
+        'ancestry', help='compare path walks with the ancestry index')
+    ancestry.add_argument('--levels', type=int, default=50000)
+    ancestry.add_argument('--depth', type=int, default=5)
+    ancestry.add_argument('--fanout', type=int, default=10)
+    ancestry.set_defaults(run=bench_ancestry)
+
+    table = subparsers.add_parser(
+        'table', help='measure the time and peak memory of load_table')
+    table.add_argument('--rows', type=int, nargs='+',
+                       default=[10000, 100000, 1000000])
+    table.add_argument('--regions', type=int, default=10)
+    table.add_argument('--countries', type=int, default=20)
+    table.add_argument('--cities', type=int, default=50)
+    table.set_defaults(run=bench_table)
+
+    prune = subparsers.add_parser(
+        'prune', help='compare scan_tree with and without pruning')
+    prune.add_argument('--depth', type=int, default=2)
+    prune.add_argument('--fanout', type=int, default=6)
+    prune.add_argument('--files', type=int, default=1000)
+    prune.add_argument('--top', type=int, default=50)
+    prune.set_defaults(run=bench_prune)
+
+    shard = subparsers.add_parser(
+        'shard', help='compare scan_tree with scan_tree_sharded')
+    shard.add_argument('--depth', type=int, default=3)
+    shard.add_argument('--fanout', type=int, default=8)
+    shard.add_argument('--files', type=int, default=40)
+    shard.add_argument('--processes', type=int, default=DEFAULT_PROCESSES)
+    shard.set_defaults(run=bench_shard)
+
+    suite = subparsers.add_parser(
+        'suite', help='run the benchmark suite and save the results as JSON')
+    suite.add_argument('--size', type=int, default=20000,
+                       help='about how many leaves each tree has')
+    suite.add_argument('--repeat', type=int, default=5)
+    suite.add_argument('--clicks', type=int, default=1000)
+    suite.add_argument('--sample', type=int, default=100)
+    suite.add_argument('--disk-files', type=int, default=2000)
+    suite.add_argument('--no-disk', action='store_true',
+                       help='do not create directory fixtures')
+    suite.add_argument('--output', metavar='FILE',
+                       help='save the results to FILE as JSON')
+    suite.set_defaults(run=bench_suite)
+
+    compare = subparsers.add_parser(
+        'compare', help='compare two suite results and fail on a regression')
+    compare.add_argument('old', help='results of the earlier run')
+    compare.add_argument('new', help='results of the later run')
+    compare.add_argument('--threshold', type=float, default=0.1,
+                         help='how much slower, as a fraction, counts as a '
+                              'regression')
+    compare.add_argument('--floor', type=float, default=5e-4,
+                         help='ignore differences of fewer seconds than '
+                              'this')
+    compare.set_defaults(run=bench_compare)
+
+    memory = subparsers.add_parser(
+        'memory', help='measure the memory held per node')
+    memory.add_argument('--depth', type=int, default=5)
+    memory.add_argument('--fanout', type=int, default=10)
+    memory.set_defaults(run=bench_memory)
+
+    snap = subparsers.add_parser(
+        'snapshot', help='compare a rescan with loading its snapshot')
+    snap.add_argument('--depth', type=int, default=4)
+    snap.add_argument('--fanout', type=int, default=6)
+    snap.add_argument('--files', type=int, default=20)
+    snap.set_defaults(run=bench_snapshot)
+
+    rescan = subparsers.add_parser(
+        'rescan', help='compare a full rescan with refreshing a snapshot')
+    rescan.add_argument('--depth', type=int, default=4)
+    rescan.add_argument('--fanout', type=int, default=6)
+    rescan.add_argument('--files', type=int, default=20)
+    rescan.set_defaults(run=bench_rescan)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
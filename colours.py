@@ -0,0 +1,127 @@
+"""Treemap Visualiser: Colour Policies
+=== Module Description ===
+This module contains the policies that choose the colour of each rectangle
+of a treemap.
+
+A colour policy is a function that takes a node of a tree and returns its
+colour, as (r, g, b). A node's colour is only chosen, by the policy set with
+AbstractTree.set_colour_policy, the first time it is asked for, which is
+when the node is drawn: folders that are divided into their files are not
+coloured, except by path_colour, which colours each one once.
+
+path_colour, the default, derives the colour from a hash of the names of the
+node and its ancestors, chained through its parent's colour, so that every
+file keeps its colour from one run to the next and images of the same tree
+can be compared. extension_colour gives files with the same extension the
+same colour, size_colour shades files from blue to red by size, choosing
+again when a size changes, and random_colour picks a random colour for
+every node, as the visualiser always used to.
+"""
+import hashlib
+import math
+import os
+import zlib
+from random import randint
+
+
+# The colours extension_colour chooses from, and its colour for names
+# without an extension.
+EXTENSION_PALETTE = (
+    (31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40),
+    (148, 103, 189), (140, 86, 75), (227, 119, 194), (188, 189, 34),
+    (23, 190, 207), (174, 199, 232), (255, 187, 120), (152, 223, 138),
+)
+NO_EXTENSION_COLOUR = (127, 127, 127)
+# The colours of size_colour, from size 0 up to sizes of 2 ** SIZE_BITS and
+# more, evenly spaced on a logarithmic scale.
+SIZE_GRADIENT = ((49, 54, 149), (116, 173, 209), (255, 255, 191),
+                 (244, 109, 67), (165, 0, 38))
+SIZE_BITS = 40
+
+
+def path_colour(node):
+    """Return a colour for <node> that depends only on the names of <node>
+    and its ancestors.
+    The colour is a CRC-32 of <node>'s name, started from its parent's
+    colour, so it takes constant time once the parent is coloured.
+    Ancestors without a colour yet are coloured first, from the top down.
+    @type node: AbstractTree
+    @rtype: (int, int, int)
+    """
+    uncoloured = []
+    parent = node.get_parent()
+    while parent is not None and not parent.has_colour():
+        uncoloured.append(parent)
+        parent = parent.get_parent()
+    value = 0
+    if parent is not None:
+        red, green, blue = parent.colour
+        value = (red << 16) | (green << 8) | blue
+    for ancestor in reversed(uncoloured):
+        value = _name_hash(ancestor, value)
+        ancestor.colour = value >> 16, (value >> 8) & 255, value & 255
+    value = _name_hash(node, value)
+    return value >> 16, (value >> 8) & 255, value & 255
+
+
+def _name_hash(node, parent_value):
+    """Return the colour of <node>, packed as 0xRRGGBB, given the colour
+    of its parent packed the same way, or 0 if it has no parent.
+    @type node: AbstractTree
+    @type parent_value: int
+    @rtype: int
+    """
+    return zlib.crc32(str(node.get_root()).encode(), parent_value) & 0xFFFFFF
+
+
+def extension_colour(node):
+    """Return the colour from EXTENSION_PALETTE for the extension of
+    <node>'s name, or NO_EXTENSION_COLOUR if it has none.
+    @type node: AbstractTree
+    @rtype: (int, int, int)
+    """
+    extension = os.path.splitext(str(node.get_root()))[1].lower()
+    if not extension:
+        return NO_EXTENSION_COLOUR
+    digest = hashlib.blake2b(extension.encode(), digest_size=1).digest()
+    return EXTENSION_PALETTE[digest[0] % len(EXTENSION_PALETTE)]
+
+
+def size_colour(node):
+    """Return the colour of SIZE_GRADIENT for <node>'s data_size.
+    @type node: AbstractTree
+    @rtype: (int, int, int)
+    """
+    position = min(math.log2(node.data_size + 1) / SIZE_BITS, 1.0) * \
+        (len(SIZE_GRADIENT) - 1)
+    index = min(int(position), len(SIZE_GRADIENT) - 2)
+    fraction = position - index
+    start, end = SIZE_GRADIENT[index], SIZE_GRADIENT[index + 1]
+    return tuple(int(round(start[i] + (end[i] - start[i]) * fraction))
+                 for i in range(3))
+
+
+def random_colour(node):
+    """Return a random colour, whatever <node> is.
+    @type node: AbstractTree
+    @rtype: (int, int, int)
+    """
+    return randint(0, 255), randint(0, 255), randint(0, 255)
+
+
+# The colour policies that colour a node by its data_size, whose colours
+# are chosen again when the size changes; see AbstractTree.size_up.
+SIZE_POLICIES = (size_colour,)
+
+# The colour policies, by the names the command lines use for them.
+COLOUR_POLICIES = {
+    'path': path_colour,
+    'extension': extension_colour,
+    'size': size_colour,
+    'random': random_colour,
+}
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
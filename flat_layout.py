@@ -0,0 +1,197 @@
+"""Treemap Visualiser: Vectorized Layout
+=== Module Description ===
+This module contains an alternative treemap layout engine for very large
+trees. AbstractTree.generate_treemap runs Python code for every node;
+FlatTree instead flattens the tree once into contiguous NumPy arrays, in
+breadth-first order so that the subtrees of every node are next to each
+other, and then lays out a whole level of the tree at a time with
+vectorized array operations.
+
+The arithmetic mirrors AbstractTree._split_rect exactly, so FlatTree
+produces the same rectangles, in the same order, as generate_treemap.
+"""
+import numpy as np
+
+
+# The dtype of the structured arrays returned by FlatTree.layout.
+RECT_DTYPE = np.dtype([('x', np.int64), ('y', np.int64),
+                       ('width', np.int64), ('height', np.int64),
+                       ('colour', np.uint8, (3,))])
+
+
+class FlatTree:
+    """An AbstractTree flattened into arrays.
+    Nodes are numbered in breadth-first order, with the root as node 0.
+    === Public Attributes ===
+    @type parent: numpy.ndarray
+        The index of each node's parent; -1 for the root.
+    @type first_child: numpy.ndarray
+        The index of each node's first subtree. Its subtrees are the
+        nodes first_child to first_child + child_count - 1.
+    @type child_count: numpy.ndarray
+        The number of subtrees of each node.
+    @type data_size: numpy.ndarray
+        The data_size of each node.
+    @type colour: numpy.ndarray
+        The colour of each node, as an (n, 3) array.
+    @type empty: numpy.ndarray
+        Whether each node is an empty tree.
+    @type level_starts: numpy.ndarray
+        The index of the first node of each level, followed by the total
+        number of nodes.
+    @type preorder: numpy.ndarray
+        The position of each node in a depth-first, preorder walk of the
+        tree; generate_treemap returns rectangles in this order.
+    """
+    def __init__(self, tree):
+        """Flatten <tree> into arrays.
+        This is the only part of the engine that runs Python code per node,
+        so a FlatTree should be built once and laid out many times.
+        @type self: FlatTree
+        @type tree: AbstractTree
+        @rtype: None
+        """
+        parent = [-1]
+        depth = [0]
+        first_child = []
+        child_count = []
+        data_size = []
+        colour = []
+        empty = []
+        nodes = [tree]
+        for index, node in enumerate(nodes):
+            subtrees = node.get_subtrees()
+            first_child.append(len(nodes))
+            child_count.append(len(subtrees))
+            data_size.append(node.data_size)
+            # Only leaves are drawn, so only they need a colour.
+            colour.append((0, 0, 0) if subtrees else node.colour)
+            empty.append(node.is_empty())
+            nodes.extend(subtrees)
+            parent.extend([index] * len(subtrees))
+            depth.extend([depth[index] + 1] * len(subtrees))
+        self.parent = np.array(parent, dtype=np.int64)
+        self.first_child = np.array(first_child, dtype=np.int64)
+        self.child_count = np.array(child_count, dtype=np.int64)
+        self.data_size = np.array(data_size, dtype=np.int64)
+        self.colour = np.array(colour, dtype=np.uint8).reshape(-1, 3)
+        self.empty = np.array(empty, dtype=bool)
+        self.level_starts = np.concatenate((
+            [0], np.flatnonzero(np.diff(depth)) + 1, [len(nodes)]))
+        self.preorder = self._compute_preorder()
+
+    def __len__(self):
+        """Return the number of nodes in this tree.
+        @type self: FlatTree
+        @rtype: int
+        """
+        return len(self.parent)
+
+    def _levels(self):
+        """Return the (start, stop) index range of each level below the
+        root, from the top of the tree down.
+        @type self: FlatTree
+        @rtype: list[(int, int)]
+        """
+        return list(zip(self.level_starts[1:-1].tolist(),
+                        self.level_starts[2:].tolist()))
+
+    def _sibling_offsets(self, start, stop, values):
+        """Return, for each node in the level <start> to <stop>, the sum of
+        <values> over the siblings that come before it.
+        @type self: FlatTree
+        @type start: int
+        @type stop: int
+        @type values: numpy.ndarray
+            One value for each node of the level.
+        @rtype: numpy.ndarray
+        """
+        before = np.cumsum(values) - values
+        group_start = self.first_child[self.parent[start:stop]] - start
+        return before - before[group_start]
+
+    def _compute_preorder(self):
+        """Return each node's position in a preorder walk of the tree.
+        A node comes right after its parent and after all the nodes in the
+        subtrees of its earlier siblings.
+        @type self: FlatTree
+        @rtype: numpy.ndarray
+        """
+        levels = self._levels()
+        size = np.ones(len(self), dtype=np.int64)
+        for start, stop in reversed(levels):
+            np.add.at(size, self.parent[start:stop], size[start:stop])
+        preorder = np.zeros(len(self), dtype=np.int64)
+        for start, stop in levels:
+            preorder[start:stop] = (
+                preorder[self.parent[start:stop]] + 1 +
+                self._sibling_offsets(start, stop, size[start:stop]))
+        return preorder
+
+    def layout(self, rect):
+        """Run the treemap algorithm and return the rectangles of the
+        non-empty leaves, in the order generate_treemap returns them.
+        @type self: FlatTree
+        @type rect: (int, int, int, int)
+            Input is in the pygame format: (x, y, width, height)
+        @rtype: numpy.ndarray
+            A structured array of RECT_DTYPE.
+        """
+        x = np.zeros(len(self), dtype=np.int64)
+        y = np.zeros(len(self), dtype=np.int64)
+        width = np.zeros(len(self), dtype=np.int64)
+        height = np.zeros(len(self), dtype=np.int64)
+        x[0], y[0], width[0], height[0] = rect
+        for start, stop in self._levels():
+            parent = self.parent[start:stop]
+            wide = width[parent] > height[parent]
+            span = np.where(wide, width[parent], height[parent])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio_prop = (self.data_size[start:stop] /
+                              self.data_size[parent]) * 100
+                extent = np.nan_to_num((ratio_prop * span) // 100)
+            extent = extent.astype(np.int64)
+            position = (np.where(wide, x[parent], y[parent]) +
+                        self._sibling_offsets(start, stop, extent))
+            # The last subtree takes whatever is left. As in _split_rect,
+            # a vertical split measures the rest from the parent's height.
+            last = (np.arange(start, stop) ==
+                    self.first_child[parent] + self.child_count[parent] - 1)
+            extent = np.where(
+                last,
+                np.where(wide, x[parent] + width[parent], height[parent]) -
+                position,
+                extent)
+            x[start:stop] = np.where(wide, position, x[parent])
+            y[start:stop] = np.where(wide, y[parent], position)
+            width[start:stop] = np.where(wide, extent, width[parent])
+            height[start:stop] = np.where(wide, height[parent], extent)
+        leaves = np.flatnonzero((self.child_count == 0) & ~self.empty &
+                                (self.data_size != 0))
+        leaves = leaves[np.argsort(self.preorder[leaves])]
+        result = np.empty(len(leaves), dtype=RECT_DTYPE)
+        result['x'] = x[leaves]
+        result['y'] = y[leaves]
+        result['width'] = width[leaves]
+        result['height'] = height[leaves]
+        result['colour'] = self.colour[leaves]
+        return result
+
+    def generate_treemap(self, rect):
+        """Run the treemap algorithm and return the rectangles in the same
+        format as AbstractTree.generate_treemap.
+        @type self: FlatTree
+        @type rect: (int, int, int, int)
+            Input is in the pygame format: (x, y, width, height)
+        @rtype: list[((int, int, int, int), (int, int, int))]
+        """
+        rects = self.layout(rect)
+        return list(zip(
+            zip(rects['x'].tolist(), rects['y'].tolist(),
+                rects['width'].tolist(), rects['height'].tolist()),
+            map(tuple, rects['colour'].tolist())))
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
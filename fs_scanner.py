@@ -0,0 +1,507 @@
+"""Treemap Visualiser: Parallel File System Scanner
+=== Module Description ===
+This module contains a faster way of building a FileSystemTree.
+The FileSystemTree constructor recurses through the folder, calling
+os.listdir, os.path.isfile and os.path.getsize for every entry, all on a
+single thread.
+
+scan_tree instead lists directories with os.scandir, whose DirEntry objects
+cache the file type and stat results, and hands the listing of each
+directory to a pool of worker threads. Once every directory has been listed,
+the FileSystemTree is assembled bottom-up from the listings. The resulting
+tree has the same shape, subtree order and data_size values as
+FileSystemTree(path).
+
+Symbolic links are never followed, and files are sized according to a
+ScanPolicy; see scan_policy.
+
+A treemap can only show a few thousand rectangles, so for huge volumes
+scan_tree can prune the tree as it goes: only the <top> largest entries of
+each directory, and any entry of at least <min_size> bytes, are kept in
+full, and the rest are folded into one "other (k files)" leaf holding
+their total size. Files are pruned as each directory is listed, keeping
+the largest in a heap, and subdirectories once their sizes are known, so
+memory depends on the number of directories and the display budget rather
+than on the number of files. Every data_size is still exact.
+
+On very large volumes a single process spends most of its time in the
+interpreter rather than waiting on the disk, so scan_tree_sharded splits
+the scan across a pool of processes. The top levels of the folder, and
+every folder down to a mount point, are listed in the main process; each
+folder below them, a shard, is scanned with scan_tree by a worker
+process, which sends it back as a snapshot (see snapshot). The shards are
+grafted into the tree as they are, and their nodes are only created when
+they are first accessed. Hard links seen by several shards are counted
+once afterwards, at the shard that comes first.
+"""
+import heapq
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    wait, FIRST_COMPLETED
+
+from tree_data import FileSystemTree
+from scan_policy import ScanPolicy
+from snapshot import dump_snapshot, read_snapshot
+
+
+# The default number of threads used to list directories. Listing is
+# dominated by waiting on the disk, so more threads than cores pays off.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# The name of the leaf that pruned entries are folded into.
+OTHER_NAME = 'other ({} files)'
+# The default number of processes of scan_tree_sharded, how many shards
+# per process it tries to split a scan into, so that one large shard does
+# not leave the other processes idle, and how many levels below the
+# scanned folder it lists itself at most to find them.
+DEFAULT_PROCESSES = os.cpu_count() or 1
+SHARDS_PER_PROCESS = 4
+MAX_SHARD_DEPTH = 3
+# The file listing the mount points of this computer, on Linux.
+MOUNTS_FILE = '/proc/self/mounts'
+
+
+def scan_tree(path, workers=DEFAULT_WORKERS, stamps=None, listings=None,
+              policy=None, top=None, min_size=None):
+    """Return a FileSystemTree for the given file or folder.
+    Directories are listed concurrently by <workers> threads.
+    If <stamps> is given, the stamp of every directory scanned (see
+    get_stamp) is stored in it, keyed by the directory's path. Stamps are
+    taken just before each directory is listed, so a later change is never
+    hidden by them.
+    If <listings> is given, the entries of every directory scanned are
+    stored in it, keyed by the directory's path; each entry is a tuple
+    (full path, is_directory, size), where directories have size 0.
+    Entries are sized by <policy>, or by a new ScanPolicy if it is None.
+    If <top> or <min_size> is not None, the tree is pruned: in each
+    directory, only the <top> largest entries and the entries of at least
+    <min_size> bytes are kept, and the others are folded into a leaf named
+    after OTHER_NAME. The listings then include the pruned files' leaf,
+    but not the files themselves.
+    Precondition: <path> is a valid path for this computer.
+    @type path: str
+    @type workers: int
+    @type stamps: dict[str, (int, int)] | None
+    @type listings: dict[str, list[(str, bool, int)]] | None
+    @type policy: ScanPolicy | None
+    @type top: int | None
+    @type min_size: int | None
+    @rtype: FileSystemTree
+    """
+    if policy is None:
+        policy = ScanPolicy()
+    if os.path.isfile(path):
+        return FileSystemTree(path, policy=policy)
+    policy.start(path)
+    pruning = None
+    if top is not None or min_size is not None:
+        pruning = (top, min_size, {})
+    found = _list_all(path, max(1, workers), stamps, policy, pruning)
+    if listings is not None:
+        listings.update(found)
+    return _build_tree(path, found, pruning)
+
+
+def scan_tree_sharded(path, processes=DEFAULT_PROCESSES,
+                      workers=DEFAULT_WORKERS, stamps=None, policy=None):
+    """Return a FileSystemTree for the given file or folder, as scan_tree
+    does, splitting the scan across <processes> processes, each listing
+    directories with <workers> threads.
+    The folders the scan is split at are those at the first level below
+    <path> with at least SHARDS_PER_PROCESS folders per process, or at
+    MAX_SHARD_DEPTH levels below it, and the mount points below <path>,
+    so that each file system is scanned on its own.
+    <stamps> and <policy> are as for scan_tree. The subtrees of the shards
+    are SnapshotTrees; see snapshot.
+    Precondition: <path> is a valid path for this computer.
+    @type path: str
+    @type processes: int
+    @type workers: int
+    @type stamps: dict[str, (int, int)] | None
+    @type policy: ScanPolicy | None
+    @rtype: FileSystemTree
+    """
+    if policy is None:
+        policy = ScanPolicy()
+    if processes <= 1 or os.path.isfile(path):
+        return scan_tree(path, workers, stamps, policy=policy)
+    policy.start(path)
+    workers = max(1, workers)
+    # Folders on the way to a mount point are always split, unless other
+    # file systems are not entered at all.
+    split = set()
+    if not policy.one_file_system:
+        for mount_point in _mount_points(path):
+            parts = os.path.relpath(mount_point, path).split(os.sep)
+            split.update(os.path.join(path, *parts[:end])
+                         for end in range(1, len(parts)))
+    listings = {}
+    shards = []
+    level = [path]
+    depth = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+            expand_all = depth == 0 or (
+                depth < MAX_SHARD_DEPTH and
+                len(level) < processes * SHARDS_PER_PROCESS)
+            listed = []
+            for dir_path in level:
+                if expand_all or dir_path in split:
+                    listed.append(dir_path)
+                else:
+                    shards.append(dir_path)
+            level = []
+            for dir_path, entries in zip(listed, pool.map(
+                    lambda dir_path: _list_directory(dir_path, policy,
+                                                     stamps), listed)):
+                listings[dir_path] = entries
+                level.extend(sub_path for sub_path, is_dir, _ in entries
+                             if is_dir)
+            depth += 1
+    grafts = {}
+    counted = []
+    if shards:
+        # Each shard counts its hard links with a policy of its own; links
+        # to files another shard already counted are zeroed below.
+        shard_policy = _ShardPolicy(policy.disk_usage,
+                                    policy.count_links_once,
+                                    policy.one_file_system)
+        shard_policy.start(path)
+        with ProcessPoolExecutor(
+                max_workers=min(processes, len(shards))) as pool:
+            futures = [pool.submit(_scan_shard, shard, workers,
+                                   stamps is not None, shard_policy)
+                       for shard in shards]
+            for shard, future in zip(shards, futures):
+                data, shard_stamps, link_paths = future.result()
+                grafts[shard] = read_snapshot(data, shard)
+                if stamps is not None:
+                    stamps.update(shard_stamps)
+                counted.extend(link_paths[key] for key in
+                               policy.merge_hard_links(set(link_paths)))
+    tree = _build_tree(path, listings, grafts=grafts)
+    for link_path in counted:
+        node = _find_node(tree, path, link_path)
+        # Skip a link the tree has no node for, rather than zeroing the
+        # folder above it.
+        if node is not None:
+            tree.size_up(node, -node.data_size)
+    return tree
+
+
+def get_stamp(path):
+    """Return the modification time, in nanoseconds, and inode number of
+    the directory at <path>.
+    A directory's modification time changes whenever an entry is added to,
+    removed from or renamed in it, so an unchanged stamp means its list of
+    entries is unchanged. It does not change when a file in it is
+    rewritten in place.
+    @type path: str
+    @rtype: (int, int)
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def _scan_shard(path, workers, with_stamps, policy):
+    """Scan the folder <path> in a worker process of scan_tree_sharded.
+    Return the snapshot of its tree, the stamps of its directories if
+    <with_stamps> is True, and the paths the hard links <policy> counted
+    are counted at (see _ShardPolicy.link_paths).
+    @type path: str
+    @type workers: int
+    @type with_stamps: bool
+    @type policy: _ShardPolicy
+    @rtype: (bytes, dict[str, (int, int)], dict[int, str])
+    """
+    stamps = {}
+    tree = scan_tree(path, workers, stamps if with_stamps else None,
+                     policy=policy)
+    return dump_snapshot(tree, stamps), stamps, policy.link_paths
+
+
+class _ShardPolicy(ScanPolicy):
+    """The ScanPolicy of a shard of scan_tree_sharded, which also records
+    where each hard link it counts is counted, so that the link can be
+    zeroed if another shard counted the same file.
+    === Public Attributes ===
+    @type link_paths: dict[int, str]
+        The path each file with several hard links is counted at, by its
+        ScanPolicy.hard_link_key; files of size 0 are left out.
+    """
+    def __init__(self, disk_usage=False, count_links_once=True,
+                 one_file_system=False):
+        """Initialize a new _ShardPolicy, as ScanPolicy.__init__ does.
+        @type self: _ShardPolicy
+        @type disk_usage: bool
+        @type count_links_once: bool
+        @type one_file_system: bool
+        @rtype: None
+        """
+        ScanPolicy.__init__(self, disk_usage, count_links_once,
+                            one_file_system)
+        self.link_paths = {}
+
+    def size(self, info, path, counted=False):
+        """Return the size of the entry <path>, as ScanPolicy.size does,
+        recording <path> if a file with several hard links is counted at
+        it.
+        @type self: _ShardPolicy
+        @type info: os.stat_result
+        @type path: str
+        @type counted: bool
+        @rtype: int
+        """
+        size = ScanPolicy.size(self, info, path, counted)
+        if size:
+            key = self.hard_link_key(info)
+            if key is not None:
+                self.link_paths[key] = path
+        return size
+
+
+def _mount_points(path):
+    """Return the mount points strictly below the folder <path>, as paths
+    starting with <path>, or an empty list if they cannot be found.
+    @type path: str
+    @rtype: list[str]
+    """
+    try:
+        with open(MOUNTS_FILE, encoding='utf-8',
+                  errors='surrogateescape') as file:
+            lines = file.readlines()
+    except OSError:
+        return []
+    root = os.path.join(os.path.realpath(path), '')
+    result = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        # Spaces and other special characters are escaped in octal.
+        mount_point = re.sub(r'\\([0-7]{3})',
+                             lambda match: chr(int(match.group(1), 8)),
+                             fields[1])
+        if mount_point.startswith(root) and mount_point != root:
+            result.append(os.path.join(path, mount_point[len(root):]))
+    return result
+
+
+def _find_node(tree, path, node_path):
+    """Return the node of <tree>, which is rooted at <path>, at the path
+    <node_path>, or None if <tree> has no node at that path.
+    @type tree: FileSystemTree
+    @type path: str
+    @type node_path: str
+    @rtype: FileSystemTree | None
+    """
+    node = tree
+    for name in os.path.relpath(node_path, path).split(os.sep):
+        for subtree in node.get_subtrees():
+            if subtree.get_root() == name:
+                node = subtree
+                break
+        else:
+            return None
+    return node
+
+
+def _list_directory(path, policy, stamps=None, pruning=None):
+    """Return the entries of the directory at <path>.
+    Each entry is a tuple (full path, is_directory, size). The size of a
+    directory entry is 0; it is computed later from its own entries.
+    Other entries, including links and directories that <policy> does not
+    enter, are sized by <policy>.
+    If <stamps> is given, the directory's stamp is stored in it first.
+    If <pruning> is given, the files are pruned as they are listed; see
+    _prune_files.
+    @type path: str
+    @type policy: ScanPolicy
+    @type stamps: dict[str, (int, int)] | None
+    @type pruning: (int | None, int | None, dict[str, int]) | None
+    @rtype: list[(str, bool, int)]
+    """
+    if stamps is not None:
+        stamps[path] = get_stamp(path)
+    if pruning is not None:
+        return _prune_files(path, policy, pruning)
+    entries = []
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            # On most platforms is_dir needs no system call, so folders
+            # are only stat'ed if their file system matters.
+            if entry.is_dir(follow_symlinks=False) and (
+                    not policy.one_file_system or
+                    policy.enters(entry.stat(follow_symlinks=False))):
+                entries.append((entry.path, True, 0))
+            else:
+                entries.append((entry.path, False, policy.size(
+                    entry.stat(follow_symlinks=False), entry.path)))
+    return entries
+
+
+def _prune_files(path, policy, pruning):
+    """Return the entries of the directory at <path>, as _list_directory
+    does, keeping only the files that may be kept by _prune.
+    <pruning> is (top, min_size, folded). The files that are neither
+    among the <top> largest nor of at least <min_size> bytes are replaced
+    by one entry named after OTHER_NAME, holding their total size; the
+    number of files it stands for is stored in <folded> under its path.
+    Only <top> files are held in memory at a time, besides the large ones.
+    @type path: str
+    @type policy: ScanPolicy
+    @type pruning: (int | None, int | None, dict[str, int])
+    @rtype: list[(str, bool, int)]
+    """
+    top, min_size, folded = pruning
+    entries = []
+    largest = []
+    count = 0
+    total = 0
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            if entry.is_dir(follow_symlinks=False) and (
+                    not policy.one_file_system or
+                    policy.enters(entry.stat(follow_symlinks=False))):
+                entries.append((entry.path, True, 0))
+                continue
+            size = policy.size(entry.stat(follow_symlinks=False), entry.path)
+            if min_size is not None and size >= min_size:
+                entries.append((entry.path, False, size))
+                continue
+            if top:
+                if len(largest) < top:
+                    heapq.heappush(largest, (size, entry.path))
+                    continue
+                size, _ = heapq.heappushpop(largest, (size, entry.path))
+            count += 1
+            total += size
+    entries.extend((sub_path, False, size) for size, sub_path in largest)
+    if count:
+        other = os.path.join(path, OTHER_NAME.format(count))
+        folded[other] = count
+        entries.append((other, False, total))
+    return entries
+
+
+def _prune(dir_path, subtrees, counts, pruning):
+    """Return the subtrees of the directory <dir_path> that are kept by
+    <pruning>, followed by a leaf standing for the others, if there are
+    any.
+    <pruning> is as for _prune_files; entries folded while listing are
+    always folded again. <counts> maps the path of every subtree to the
+    number of files it stands for, and is updated with the new leaf.
+    @type dir_path: str
+    @type subtrees: list[FileSystemTree]
+    @type counts: dict[str, int]
+    @type pruning: (int | None, int | None, dict[str, int])
+    @rtype: list[FileSystemTree]
+    """
+    top, min_size, folded = pruning
+    candidates = []
+    count = 0
+    total = 0
+    for index, subtree in enumerate(subtrees):
+        sub_path = os.path.join(dir_path, subtree.get_root())
+        if sub_path in folded:
+            count += counts.pop(sub_path)
+            total += subtree.data_size
+        else:
+            candidates.append((index, subtree, sub_path))
+    ranked = sorted(candidates, key=lambda item: -item[1].data_size)
+    kept = set()
+    for rank, (index, subtree, _) in enumerate(ranked):
+        if (top is not None and rank < top) or \
+                (min_size is not None and subtree.data_size >= min_size):
+            kept.add(index)
+    result = []
+    for index, subtree, sub_path in candidates:
+        if index in kept:
+            result.append(subtree)
+        else:
+            count += counts.pop(sub_path)
+            total += subtree.data_size
+    if count or len(result) < len(candidates):
+        other = os.path.join(dir_path, OTHER_NAME.format(count))
+        folded[other] = count
+        counts[other] = count
+        result.append(FileSystemTree(other, [], total))
+    return result
+
+
+def _list_all(path, workers, stamps=None, policy=None, pruning=None):
+    """Return the listings of <path> and every directory below it.
+    The returned dictionary maps each directory path to its entries, as
+    returned by _list_directory with <policy>, or a new ScanPolicy if it
+    is None, and <pruning>.
+    @type path: str
+    @type workers: int
+    @type stamps: dict[str, (int, int)] | None
+    @type policy: ScanPolicy | None
+    @type pruning: (int | None, int | None, dict[str, int]) | None
+    @rtype: dict[str, list[(str, bool, int)]]
+    """
+    if policy is None:
+        policy = ScanPolicy()
+    listings = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_list_directory, path, policy, stamps,
+                               pruning): path}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entries = future.result()
+                listings[pending.pop(future)] = entries
+                for sub_path, is_dir, _ in entries:
+                    if is_dir:
+                        pending[pool.submit(_list_directory, sub_path,
+                                            policy, stamps,
+                                            pruning)] = sub_path
+    return listings
+
+
+def _build_tree(path, listings, pruning=None, grafts=None):
+    """Assemble the FileSystemTree rooted at <path> from <listings>.
+    The tree is built bottom-up with an explicit stack, so that a directory
+    node is only created once all of its subtrees exist. If <pruning> is
+    given, each directory's subtrees are pruned before it is created; see
+    _prune. <grafts> maps the paths of directories that are not in
+    <listings> to their already built trees.
+    @type path: str
+    @type listings: dict[str, list[(str, bool, int)]]
+    @type pruning: (int | None, int | None, dict[str, int]) | None
+    @type grafts: dict[str, FileSystemTree] | None
+    @rtype: FileSystemTree
+    """
+    # The number of files each built node stands for, if pruning.
+    counts = {}
+    built = {} if grafts is None else dict(grafts)
+    stack = [(path, False)]
+    while stack:
+        dir_path, expanded = stack.pop()
+        if not expanded:
+            stack.append((dir_path, True))
+            for sub_path, is_dir, _ in listings[dir_path]:
+                if is_dir and sub_path not in built:
+                    stack.append((sub_path, False))
+        else:
+            subtrees = []
+            for sub_path, is_dir, size in listings[dir_path]:
+                if is_dir:
+                    subtrees.append(built.pop(sub_path))
+                else:
+                    subtrees.append(FileSystemTree(sub_path, [], size))
+                    if pruning is not None:
+                        counts[sub_path] = pruning[2].get(sub_path, 1)
+            if pruning is not None:
+                subtrees = _prune(dir_path, subtrees, counts, pruning)
+                counts[dir_path] = sum(
+                    counts.pop(os.path.join(dir_path, subtree.get_root()))
+                    for subtree in subtrees)
+            built[dir_path] = FileSystemTree(dir_path, subtrees)
+    return built[path]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
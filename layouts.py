@@ -0,0 +1,199 @@
+"""Treemap Visualiser: Layout Algorithms
+=== Module Description ===
+This module contains treemap layout algorithms that can be passed to
+AbstractTree.generate_treemap and AbstractTree.iter_treemap instead of the
+default slice-and-dice algorithm.
+
+Slice-and-dice splits a rectangle along its longer side only, so a folder
+with many files becomes a row of thin slivers. The algorithms here keep
+rectangles closer to squares:
+  - squarified (Bruls, Huizing and van Wijk) sorts the subtrees by size
+    and fills the rectangle with rows whose worst aspect ratio is as small
+    as possible;
+  - strip (Bederson, Shneiderman and Wattenberg) keeps the subtrees in
+    order and fills the rectangle with horizontal strips, closing a strip
+    when adding a subtree would worsen its average aspect ratio.
+
+Each algorithm is a function taking a node with subtrees and its rectangle,
+and returning the node's subtrees paired with their rectangles. Rectangle
+edges are rounded to whole pixels so that the rectangles tile without gaps.
+"""
+
+
+def squarified(tree, rect):
+    """Divide <rect> between the subtrees of <tree>, largest first, in rows
+    chosen to keep the rectangles as close to squares as possible.
+    @type tree: AbstractTree
+    @type rect: (int, int, int, int)
+    @rtype: list[(AbstractTree, (int, int, int, int))]
+    """
+    subtrees = [subtree for subtree in tree.get_subtrees()
+                if subtree.data_size > 0]
+    subtrees.sort(key=lambda subtree: subtree.data_size, reverse=True)
+    result = _empty_subtrees(tree, rect)
+    x, y, width, height = (float(value) for value in rect)
+    areas = _scaled_areas(subtrees, width * height)
+    start = 0
+    while start < len(subtrees):
+        side = min(width, height)
+        stop = start + 1
+        row_area = areas[start]
+        while stop < len(subtrees) and _worst_ratio(
+                areas[start], areas[stop], row_area + areas[stop],
+                side) <= _worst_ratio(areas[start], areas[stop - 1],
+                                      row_area, side):
+            row_area += areas[stop]
+            stop += 1
+        if width >= height:
+            # A column on the left of the remaining rectangle.
+            thickness = row_area / height if height else 0.0
+            offset = y
+            for index in range(start, stop):
+                length = areas[index] / thickness if thickness else 0.0
+                result.append((subtrees[index], _round_rect(
+                    x, offset, thickness, length)))
+                offset += length
+            x += thickness
+            width -= thickness
+        else:
+            # A row along the top of the remaining rectangle.
+            thickness = row_area / width if width else 0.0
+            offset = x
+            for index in range(start, stop):
+                length = areas[index] / thickness if thickness else 0.0
+                result.append((subtrees[index], _round_rect(
+                    offset, y, length, thickness)))
+                offset += length
+            y += thickness
+            height -= thickness
+        start = stop
+    return result
+
+
+def strip(tree, rect):
+    """Divide <rect> between the subtrees of <tree>, in order, in
+    horizontal strips chosen to keep the average aspect ratio low.
+    @type tree: AbstractTree
+    @type rect: (int, int, int, int)
+    @rtype: list[(AbstractTree, (int, int, int, int))]
+    """
+    subtrees = [subtree for subtree in tree.get_subtrees()
+                if subtree.data_size > 0]
+    result = _empty_subtrees(tree, rect)
+    x, y, width, height = (float(value) for value in rect)
+    areas = _scaled_areas(subtrees, width * height)
+    start = 0
+    while start < len(subtrees):
+        stop = start + 1
+        while stop < len(subtrees) and _mean_ratio(
+                areas[start:stop + 1], width) <= _mean_ratio(
+                    areas[start:stop], width):
+            stop += 1
+        thickness = sum(areas[start:stop]) / width if width else 0.0
+        offset = x
+        for index in range(start, stop):
+            length = areas[index] / thickness if thickness else 0.0
+            result.append((subtrees[index], _round_rect(
+                offset, y, length, thickness)))
+            offset += length
+        y += thickness
+        start = stop
+    return result
+
+
+# Layout algorithms by name, for command line options. None selects the
+# slice-and-dice algorithm built into AbstractTree.
+LAYOUTS = {
+    'slice-and-dice': None,
+    'squarified': squarified,
+    'strip': strip,
+}
+
+
+def aspect_ratio(rect):
+    """Return the aspect ratio of <rect>: its longer side divided by its
+    shorter side, so 1 for a square. Return None for an empty rectangle.
+    @type rect: (int, int, int, int)
+    @rtype: float | None
+    """
+    if rect[2] <= 0 or rect[3] <= 0:
+        return None
+    return max(rect[2], rect[3]) / min(rect[2], rect[3])
+
+
+def _empty_subtrees(tree, rect):
+    """Return the subtrees of <tree> that have nothing to show, each paired
+    with an empty rectangle at the corner of <rect>.
+    @type tree: AbstractTree
+    @type rect: (int, int, int, int)
+    @rtype: list[(AbstractTree, (int, int, int, int))]
+    """
+    return [(subtree, (rect[0], rect[1], 0, 0))
+            for subtree in tree.get_subtrees() if subtree.data_size <= 0]
+
+
+def _scaled_areas(subtrees, area):
+    """Return the share of <area> of each of <subtrees>, in proportion to
+    their data_size.
+    @type subtrees: list[AbstractTree]
+    @type area: float
+    @rtype: list[float]
+    """
+    total = sum(subtree.data_size for subtree in subtrees)
+    return [subtree.data_size * area / total for subtree in subtrees]
+
+
+def _worst_ratio(largest, smallest, total, side):
+    """Return the worst aspect ratio in a row of rectangles laid along a
+    side of length <side>, whose areas add up to <total> and range from
+    <smallest> to <largest>.
+    @type largest: float
+    @type smallest: float
+    @type total: float
+    @type side: float
+    @rtype: float
+    """
+    if smallest <= 0 or side <= 0:
+        return float('inf')
+    return max(side * side * largest / (total * total),
+               total * total / (side * side * smallest))
+
+
+def _mean_ratio(areas, width):
+    """Return the mean aspect ratio of a strip of rectangles of the given
+    <areas> spanning <width>.
+    @type areas: list[float]
+    @type width: float
+    @rtype: float
+    """
+    thickness = sum(areas) / width if width > 0 else 0.0
+    if thickness <= 0:
+        return float('inf')
+    total = 0.0
+    for area in areas:
+        length = area / thickness
+        if length <= 0:
+            return float('inf')
+        total += max(length / thickness, thickness / length)
+    return total / len(areas)
+
+
+def _round_rect(x, y, width, height):
+    """Return the rectangle with corners at (<x>, <y>) and
+    (<x> + <width>, <y> + <height>), with each edge rounded to the nearest
+    pixel. Neighbouring rectangles share their rounded edges.
+    @type x: float
+    @type y: float
+    @type width: float
+    @type height: float
+    @rtype: (int, int, int, int)
+    """
+    left = int(round(x))
+    top = int(round(y))
+    return (left, top, int(round(x + width)) - left,
+            int(round(y + height)) - top)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
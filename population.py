@@ -33,21 +33,19 @@ Recommended steps:
    create the region and country nodes directly, without trying to access
    the World Bank API again).
 """
-import json
-import urllib.request as request
+from concurrent.futures import ThreadPoolExecutor
 
 from tree_data import AbstractTree
+from worldbank import WorldBankClient
 
 
-# Constants for the World Bank API urls.
-WORLD_BANK_BASE = 'http://api.worldbank.org/countries'
-WORLD_BANK_POPULATIONS = (
-    WORLD_BANK_BASE +
-    '/all/indicators/SP.POP.TOTL?format=json&date=2014:2014&per_page=270'
-)
-WORLD_BANK_REGIONS = (
-    WORLD_BANK_BASE + '?format=json&date=2014:2014&per_page=310'
-)
+# Constants for the World Bank API requests, relative to the client's base
+# URL; see worldbank. Both responses are paginated.
+WORLD_BANK_INDICATOR = '/v2/country/all/indicator/{}?format=json&date={}'
+WORLD_BANK_COUNTRIES = '/v2/country?format=json'
+# The indicator and year shown by default.
+POPULATION_INDICATOR = 'SP.POP.TOTL'
+DEFAULT_YEAR = '2014'
 
 
 class PopulationTree(AbstractTree):
@@ -58,17 +56,25 @@ class PopulationTree(AbstractTree):
       - Each node in the second level is a region (defined by the World Bank).
       - Each node in the third level is a country.
 
-    The data_size attribute corresponds to the 2014 population of the country,
-    as reported by the World Bank.
+    The data_size attribute corresponds to the value of a World Bank indicator
+    for the country in a given year: by default, its 2014 population.
 
     See https://datahelpdesk.worldbank.org/ for details about this API.
     """
-    def __init__(self, world, root=None, subtrees=None, data_size=0):
+    __slots__ = ()
+
+    def __init__(self, world, root=None, subtrees=None, data_size=0,
+                 client=None, indicator=POPULATION_INDICATOR,
+                 year=DEFAULT_YEAR):
         """Initialize a new PopulationTree.
 
         If <world> is True, then this tree is the root of the population tree,
-        and it should load data from the World Bank API.
-        In this case, none of the other parameters are used.
+        and it should load data from the World Bank API through <client>, or
+        a WorldBankClient with the default cache if <client> is None.
+        The sizes are the values of the indicator <indicator> in <year>,
+        which may also be a range of years such as '2010:2014', in which
+        case each country's most recent value is used.
+        In this case, none of root, subtrees and data_size are used.
 
         If <world> is False, pass the other arguments directly to the superclass
         constructor. Do NOT load new data from the World Bank API.
@@ -78,9 +84,13 @@ class PopulationTree(AbstractTree):
         @type root: object
         @type subtrees: list[PopulationTree] | None
         @type data_size: int
+        @type client: WorldBankClient | None
+        @type indicator: str
+        @type year: str | int
         """
         if world:
-            region_trees = _load_data()
+            region_trees = _load_data(client or WorldBankClient(), indicator,
+                                      year)
             AbstractTree.__init__(self, 'World', region_trees)
         else:
             if subtrees is None:
@@ -99,110 +109,98 @@ class PopulationTree(AbstractTree):
         """
         return "-->"
 
-    def get_path(self, separator, node):
-        """Returns path from root to the node
-        @type self: PopulationTree
-        @type separator: str
-        @type node: PopulationTree
-        @rtype: str
-        """
-        result_str = ""
-        curr = node
-        while curr.get_parent() is not None:
-            result_str = separator + str(curr.get_root) + result_str
-            curr = curr.get_parent()
-        result_str = str(curr.get_root) + result_str
-        return result_str
-
 
-def _load_data():
+def _load_data(client, indicator, year):
     """Create a list of trees corresponding to different world regions.
 
     Each tree consists of a root node -- the region -- attached to one or
     more leaves -- the countries in that region.
+    The countries and the values of <indicator> in <year> are fetched
+    concurrently by <client>, page by page, and joined by country code.
 
+    @type client: WorldBankClient
+    @type indicator: str
+    @type year: str | int
     @rtype: list[PopulationTree]
     """
     lst = []
     lst2 = []
     # Get data from World Bank API.
-    country_populations = _get_population_data()
-    regions = _get_region_data()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        region_future = pool.submit(
+            lambda: _get_region_data(
+                client.iter_records(WORLD_BANK_COUNTRIES)))
+        country_values = _get_population_data(client.iter_records(
+            WORLD_BANK_INDICATOR.format(indicator, year)))
+        regions = region_future.result()
     for i in regions.keys():   # i --> REGION
-        for h in regions[i]:  # h --> COUNTRY
-            if h in country_populations.keys():
-                lst.append(PopulationTree(False, h, None, country_populations[h]))
-
-        lst2.append(PopulationTree(False, i, lst))
+        for code, code2, name in regions[i]:  # a COUNTRY
+            value = country_values.get(code) or country_values.get(code2)
+            if value:
+                lst.append(PopulationTree(False, name, None, value))
+        if lst:
+            lst2.append(PopulationTree(False, i, lst))
         lst = []
     return lst2
 
 
-def _get_population_data():
-    """Return country population data from the World Bank.
+def _get_population_data(records):
+    """Return country indicator data from the World Bank records <records>
+    of a WORLD_BANK_INDICATOR response.
 
-    The return value is a dictionary, where the keys are country names,
-    and the values are the corresponding populations of those countries.
+    The return value is a dictionary, where the keys are country codes
+    (ISO 3166 alpha-3, or alpha-2 for records without one), and the values
+    are the corresponding values of the indicator for those countries,
+    rounded to ints. If a country has several records, for a range of
+    years, the first with a value is used: the API lists the most recent
+    year first.
 
-    Ignore all countries that do not have any population data,
-    or population data that cannot be read as an int.
+    Ignore all countries that do not have any data, or data that cannot be
+    read as a positive number.
 
+    @type records: iterable[dict]
     @rtype: dict[str, int]
     """
-    # The first element returned is ignored because it's just metadata.
-    # The second element's first 47 elements are ignored because they aren't
-    # countries.
-    _, population_data = _get_json_data(WORLD_BANK_POPULATIONS)
-    population_data = population_data[47:]
     countries = {}
-    for i in range(len(population_data)):
-        if population_data[i]['country']['value']:
-            if population_data[i]['value']:
-                if int(population_data[i]['value']):
-                    countries[population_data[i]['country']['value']] = int(population_data[i]['value'])
+    for record in records:
+        code = record.get('countryiso3code') or \
+            (record.get('country') or {}).get('id')
+        if not code or code in countries or record.get('value') is None:
+            continue
+        try:
+            value = int(round(float(record['value'])))
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            countries[code] = value
     return countries
 
 
-def _get_region_data():
-    """Return country region data from the World Bank.
+def _get_region_data(records):
+    """Return country region data from the World Bank records <records> of
+    a WORLD_BANK_COUNTRIES response.
 
     The return value is a dictionary, where the keys are region names,
-    and the values a list of country names contained in that region.
+    and the values a list of the countries contained in that region, each
+    as its ISO 3166 alpha-3 code, alpha-2 code and name.
 
-    Ignore all regions that do not contain any countries.
+    Ignore all regions that do not contain any countries, and aggregates
+    such as "World" or "High income", which are not countries.
 
-    @rtype: dict[str, list[str]]
+    @type records: iterable[dict]
+    @rtype: dict[str, list[(str, str, str)]]
     """
-    # We ignore the first component of the returned JSON, which is metadata.
-    _, country_data = _get_json_data(WORLD_BANK_REGIONS)
-    # The following line is a good place to put a breakpoint to help inspect
-    # the contents of country_data.
     regions = {}
-    for i in country_data:
-        if "region" in i.keys():
-            if "value" in i["region"].keys():
-                if i["region"]["value"] != "Aggregates":
-                    if "name" in i.keys():
-                        if i["name"] != "":
-                            if not i["region"]["value"] in regions.keys():
-                                regions[i["region"]["value"]] = [i["name"]]
-                            else:
-                                regions[i["region"]["value"]].append(i["name"])
+    for record in records:
+        region = ((record.get('region') or {}).get('value') or '').strip()
+        name = record.get('name')
+        if not region or region == 'Aggregates' or not name:
+            continue
+        regions.setdefault(region, []).append(
+            (record.get('id', ''), record.get('iso2Code', ''), name))
     return regions
 
 
-def _get_json_data(url):
-    """Return a dictionary representing the JSON response from the given url.
-
-    You should not modify this function.
-
-    @type url: str
-    @rtype: Dict
-    """
-    response = request.urlopen(url)
-    return json.loads(response.read().decode())
-
-
 if __name__ == '__main__':
     import python_ta
     # Remember to change this to check_all when cleaning up your code.
@@ -0,0 +1,368 @@
+"""Treemap Visualiser: Profiling
+=== Module Description ===
+This module measures where the treemap program spends its time: scanning,
+laying out, hit-testing and rendering.
+
+A Profiler keeps counters, such as the number of directory entries
+scanned, system calls made, rectangles laid out and draw calls issued,
+and a latency histogram for every stage. Nothing is measured until
+Profiler.install is called: it replaces the functions and methods listed
+in INSTRUMENTED with wrappers that time each call and count what it did,
+and Profiler.uninstall puts the originals back. The program itself
+contains no profiling code, so profiling costs nothing while it is off.
+
+The visualiser's --profile option writes a profiler's data as JSON when
+the program exits, and --overlay shows a summary on top of the treemap;
+see TreemapRenderer.overlay.
+
+Directories scanned by the worker processes of
+fs_scanner.scan_tree_sharded are not counted.
+"""
+import functools
+import json
+import threading
+import time
+
+import fs_scanner
+from renderer import TreemapRenderer
+from tree_data import AbstractTree, FileSystemTree
+
+
+# The number of buckets of a Histogram: bucket i holds durations of less
+# than 2 ** i microseconds (and at least 2 ** (i - 1)), and the last bucket
+# holds every longer one.
+BUCKET_COUNT = 32
+# The percentiles reported by Histogram.to_dict.
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """A histogram of durations, in buckets growing by powers of two.
+    === Public Attributes ===
+    @type counts: list[int]
+        The number of durations in each bucket; see BUCKET_COUNT.
+    @type total: float
+        The sum of all durations, in seconds.
+    @type longest: float
+        The longest duration, in seconds.
+    """
+    def __init__(self):
+        """Initialize a new, empty Histogram.
+        @type self: Histogram
+        @rtype: None
+        """
+        self.counts = [0] * BUCKET_COUNT
+        self.total = 0.0
+        self.longest = 0.0
+
+    def add(self, seconds):
+        """Record a duration of <seconds>.
+        @type self: Histogram
+        @type seconds: float
+        @rtype: None
+        """
+        index = min(int(seconds * 1e6).bit_length(), BUCKET_COUNT - 1)
+        self.counts[index] += 1
+        self.total += seconds
+        self.longest = max(self.longest, seconds)
+
+    def __len__(self):
+        """Return the number of durations recorded.
+        @type self: Histogram
+        @rtype: int
+        """
+        return sum(self.counts)
+
+    def percentile(self, fraction):
+        """Return an upper bound, in seconds, on the duration that a
+        <fraction> of the durations recorded do not exceed: the upper
+        bound of its bucket, or the longest duration if that is smaller.
+        @type self: Histogram
+        @type fraction: float
+        @rtype: float
+        """
+        rank = fraction * len(self)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** index / 1e6, self.longest)
+        return self.longest
+
+    def to_dict(self):
+        """Return this histogram as a dict that can be saved as JSON.
+        Times are in seconds, and the buckets are listed as pairs of their
+        upper bound and their count, leaving out empty buckets.
+        @type self: Histogram
+        @rtype: dict
+        """
+        count = len(self)
+        result = {'count': count, 'total': self.total,
+                  'mean': self.total / count if count else 0.0,
+                  'max': self.longest}
+        for fraction in PERCENTILES:
+            result['p{:g}'.format(fraction * 100)] = \
+                self.percentile(fraction)
+        result['buckets'] = [[2 ** index / 1e6, count]
+                             for index, count in enumerate(self.counts)
+                             if count]
+        return result
+
+
+class Profiler:
+    """Counters and latency histograms of the stages of the treemap
+    program.
+    === Public Attributes ===
+    @type counters: dict[str, int]
+        The counters, by name, such as 'scan.entries'.
+    @type histograms: dict[str, Histogram]
+        The durations of the calls of each stage, by name, such as
+        'layout'.
+    === Private Attributes ===
+    @type _lock: threading.Lock
+        Guards counters and histograms, since directories are scanned by
+        several threads.
+    @type _originals: list[(object, str, object)]
+        The owner, name and original value of everything replaced by
+        install.
+    """
+    def __init__(self):
+        """Initialize a new Profiler, which has measured nothing yet and is
+        not installed.
+        @type self: Profiler
+        @rtype: None
+        """
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._originals = []
+
+    def count(self, name, number=1):
+        """Add <number> to the counter <name>.
+        @type self: Profiler
+        @type name: str
+        @type number: int
+        @rtype: None
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + number
+
+    def record(self, name, seconds):
+        """Record that a call of stage <name> took <seconds>.
+        @type self: Profiler
+        @type name: str
+        @type seconds: float
+        @rtype: None
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = Histogram()
+                self.histograms[name] = histogram
+            histogram.add(seconds)
+
+    def install(self):
+        """Start measuring, by replacing everything in INSTRUMENTED with
+        wrappers that report to this profiler. Does nothing if this
+        profiler is already installed.
+        @type self: Profiler
+        @rtype: None
+        """
+        if self._originals:
+            return
+        for owner, name, stage, counter in INSTRUMENTED:
+            function = owner.__dict__[name]
+            self._originals.append((owner, name, function))
+            setattr(owner, name, self._wrap(function, stage, counter))
+
+    def uninstall(self):
+        """Stop measuring, putting back everything install replaced. The
+        measurements so far are kept.
+        @type self: Profiler
+        @rtype: None
+        """
+        while self._originals:
+            owner, name, function = self._originals.pop()
+            setattr(owner, name, function)
+
+    def rates(self):
+        """Return the derived rates: the entries scanned per second of
+        scanning.
+        @type self: Profiler
+        @rtype: dict[str, float]
+        """
+        result = {}
+        scan = self.histograms.get('scan')
+        if scan is not None and scan.total > 0:
+            result['scan.entries_per_second'] = \
+                self.counters.get('scan.entries', 0) / scan.total
+        return result
+
+    def summary(self):
+        """Return a short summary of the measurements, one line per stage,
+        counter and rate, as shown by the visualiser's overlay.
+        @type self: Profiler
+        @rtype: list[str]
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        for name, histogram in histograms:
+            count = len(histogram)
+            lines.append('{:<16} {:7} calls  mean {:8.3f}ms  p99 {:8.3f}ms'
+                         .format(name, count,
+                                 histogram.total / count * 1000,
+                                 histogram.percentile(0.99) * 1000))
+        for name, value in counters:
+            lines.append('{:<16} {:7}'.format(name, value))
+        for name, value in sorted(self.rates().items()):
+            lines.append('{:<16} {:10.0f}'.format(name, value))
+        return lines
+
+    def to_dict(self):
+        """Return the measurements as a dict that can be saved as JSON.
+        @type self: Profiler
+        @rtype: dict
+        """
+        with self._lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {name: histogram.to_dict()
+                                   for name, histogram in
+                                   self.histograms.items()},
+                    'rates': self.rates()}
+
+    def dump(self, filename):
+        """Save the measurements to the JSON file <filename>.
+        @type self: Profiler
+        @type filename: str
+        @rtype: None
+        """
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2, sort_keys=True)
+            file.write('\n')
+
+    def _wrap(self, function, stage, counter):
+        """Return a wrapper of <function> that records the duration of
+        each call as stage <stage>, then adds the counts returned by
+        <counter>, if it is not None, called with the result and the
+        arguments of the call.
+        @type self: Profiler
+        @type function: callable
+        @type stage: str
+        @type counter: callable | None
+        @rtype: callable
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            """Call the wrapped function, measuring the call."""
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.record(stage, time.perf_counter() - start)
+            if counter is not None:
+                for name, number in counter(result, *args, **kwargs):
+                    self.count(name, number)
+            return result
+        return wrapper
+
+
+def _count_listing(entries, path, policy, stamps=None, pruning=None):
+    """Return the counts of a call of fs_scanner._list_directory that
+    returned <entries>: one directory, its entries, and the system calls
+    made to list it, take its stamp and stat its entries.
+    @type entries: list[(str, bool, int)]
+    @type path: str
+    @type policy: ScanPolicy
+    @type stamps: dict[str, (int, int)] | None
+    @type pruning: (int | None, int | None, dict[str, int]) | None
+    @rtype: list[(str, int)]
+    """
+    count = 0
+    syscalls = 1 if stamps is None else 2
+    for sub_path, is_dir, _ in entries:
+        if is_dir:
+            count += 1
+            # Folders are only stat'ed if their file system matters.
+            syscalls += 1 if policy.one_file_system else 0
+        else:
+            # Pruned files were stat'ed too.
+            number = 1 if pruning is None else pruning[2].get(sub_path, 1)
+            count += number
+            syscalls += number
+    return [('scan.directories', 1), ('scan.entries', count),
+            ('scan.syscalls', syscalls)]
+
+
+def _count_subtrees(subtrees, tree, path, policy):
+    """Return the counts of a call of FileSystemTree._scan_subtrees that
+    returned <subtrees>: the entries below the folder, each of which was
+    stat'ed once.
+    @type subtrees: list[FileSystemTree]
+    @type tree: FileSystemTree
+    @type path: str
+    @type policy: ScanPolicy
+    @rtype: list[(str, int)]
+    """
+    count = 0
+    stack = list(subtrees)
+    while stack:
+        count += 1
+        stack.extend(stack.pop().get_subtrees())
+    return [('scan.entries', count), ('scan.syscalls', count)]
+
+
+def _count_rectangles(items, tree, rect, layout=None, min_area=0):
+    """Return the counts of a call of AbstractTree.generate_treemap that
+    returned <items>: the rectangles laid out.
+    @type items: list[((int, int, int, int), (int, int, int))]
+    @type tree: AbstractTree
+    @type rect: (int, int, int, int)
+    @type layout: callable | None
+    @type min_area: int
+    @rtype: list[(str, int)]
+    """
+    return [('layout.rectangles', len(items))]
+
+
+def _count_full_redraw(dirty, renderer, items):
+    """Return the counts of a call of TreemapRenderer._draw_all: a clear
+    and a draw call per rectangle drawn.
+    @type dirty: list[pygame.Rect]
+    @type renderer: TreemapRenderer
+    @type items: list[((int, int, int, int), (int, int, int))]
+    @rtype: list[(str, int)]
+    """
+    return [('render.draw_calls', 1 + len(renderer._drawn))]
+
+
+def _count_changes(dirty, renderer, items):
+    """Return the counts of a call of TreemapRenderer._draw_changes that
+    returned the regions <dirty>: a draw call per region.
+    @type dirty: list[pygame.Rect]
+    @type renderer: TreemapRenderer
+    @type items: list[((int, int, int, int), (int, int, int))]
+    @rtype: list[(str, int)]
+    """
+    return [('render.draw_calls', len(dirty))]
+
+
+# What Profiler.install replaces: the module or class, the name of the
+# function or method, the stage its calls are timed as, and the function
+# returning the counts of a call, or None.
+INSTRUMENTED = (
+    (fs_scanner, '_list_all', 'scan', None),
+    (fs_scanner, '_list_directory', 'scan.directory', _count_listing),
+    (fs_scanner, '_build_tree', 'scan.build', None),
+    (FileSystemTree, '_scan_subtrees', 'scan', _count_subtrees),
+    (AbstractTree, 'generate_treemap', 'layout', _count_rectangles),
+    (AbstractTree, 'cordinate', 'hit_test', None),
+    (AbstractTree, 'get_leaf', 'get_leaf', None),
+    (TreemapRenderer, 'render', 'frame', None),
+    (TreemapRenderer, '_draw_all', 'render.draw', _count_full_redraw),
+    (TreemapRenderer, '_draw_changes', 'render.draw', _count_changes),
+)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
@@ -0,0 +1,322 @@
+"""Treemap Visualiser: Retained-Mode Rendering
+=== Module Description ===
+This module draws a treemap and its text line to a pygame screen, redrawing
+only what changed since the previous frame.
+
+A TreemapRenderer keeps the whole frame on an offscreen surface, together
+with the rectangles it last drew there. Each frame, the tree's rectangles
+are compared with those: only rectangles that appeared or changed colour
+are drawn, and the area of rectangles that disappeared is cleared. Thanks
+to the layout cache of AbstractTree.generate_treemap, only subtrees that
+changed since the last frame are laid out again. The text line is only
+rendered again when its text changes, and only the regions that changed
+are copied to the screen, with pygame.display.update.
+
+FrameTimes collects how long each frame took, as a histogram.
+
+A renderer can also draw an overlay of text lines in the top left corner,
+such as the summary of a profiling.Profiler. The overlay is drawn on the
+screen only, never on the offscreen frame, so the area it covered is
+restored from the frame before it is drawn again.
+"""
+import time
+from collections import OrderedDict
+
+import pygame
+
+
+# The upper bounds, in milliseconds, of the buckets of a FrameTimes
+# histogram; the last bucket holds every longer frame.
+FRAME_BUCKETS = (1, 2, 4, 8, 16, 33, 66, 133, 266)
+# Above this many changed rectangles, the screen is updated in one region
+# covering all of them rather than one region each.
+MAX_DIRTY_RECTS = 64
+# How many rendered text lines a TreemapRenderer keeps.
+TEXT_CACHE_SIZE = 64
+# The font size of the overlay, and the opacity of its background, from 0
+# to 255.
+OVERLAY_FONT_SIZE = 14
+OVERLAY_ALPHA = 200
+
+# Fonts already loaded, by (family, size).
+_FONTS = {}
+
+
+def get_font(family, size):
+    """Return the pygame font <family> at <size>, loading it only the
+    first time it is asked for.
+    pygame.font must have been initialized.
+    @type family: str
+    @type size: int
+    @rtype: pygame.font.Font
+    """
+    font = _FONTS.get((family, size))
+    if font is None:
+        font = pygame.font.SysFont(family, size)
+        _FONTS[(family, size)] = font
+    return font
+
+
+class FrameTimes:
+    """A histogram of how long frames took to render.
+    === Public Attributes ===
+    @type counts: list[int]
+        The number of frames in each bucket: counts[i] frames took at most
+        FRAME_BUCKETS[i] milliseconds (and more than the bucket before),
+        and counts[-1] frames took longer than FRAME_BUCKETS[-1].
+    @type total: float
+        The total time taken by all frames, in seconds.
+    """
+    def __init__(self):
+        """Initialize a new, empty FrameTimes.
+        @type self: FrameTimes
+        @rtype: None
+        """
+        self.counts = [0] * (len(FRAME_BUCKETS) + 1)
+        self.total = 0.0
+
+    def add(self, seconds):
+        """Record a frame that took <seconds> to render.
+        @type self: FrameTimes
+        @type seconds: float
+        @rtype: None
+        """
+        milliseconds = seconds * 1000
+        index = 0
+        while index < len(FRAME_BUCKETS) and \
+                milliseconds > FRAME_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += seconds
+
+    def __len__(self):
+        """Return the number of frames recorded.
+        @type self: FrameTimes
+        @rtype: int
+        """
+        return sum(self.counts)
+
+    def __str__(self):
+        """Return the histogram as text, one line per bucket, ending with
+        the number of frames and their mean time.
+        @type self: FrameTimes
+        @rtype: str
+        """
+        lines = []
+        largest = max(self.counts) or 1
+        lower = 0
+        for index, count in enumerate(self.counts):
+            if index < len(FRAME_BUCKETS):
+                label = '{:>4}-{:<4}ms'.format(lower, FRAME_BUCKETS[index])
+                lower = FRAME_BUCKETS[index]
+            else:
+                label = '{:>4}+    ms'.format(lower)
+            lines.append('{} {:6} {}'.format(label, count,
+                                            '#' * (40 * count // largest)))
+        frames = len(self)
+        mean = self.total / frames * 1000 if frames else 0.0
+        lines.append('{} frames, mean {:.2f}ms'.format(frames, mean))
+        return '\n'.join(lines)
+
+
+class TreemapRenderer:
+    """Draws a tree's treemap and a line of text to a pygame screen,
+    redrawing only what changed since the previous frame.
+    === Public Attributes ===
+    @type frame_times: FrameTimes
+        How long each call to render took.
+    @type overlay: object | None
+        An object whose summary method returns the lines of text to show
+        over the treemap, such as a profiling.Profiler, or None for no
+        overlay.
+    === Private Attributes ===
+    @type _screen: pygame.Surface
+        The screen drawn to.
+    @type _surface: pygame.Surface
+        The offscreen copy of the whole frame.
+    @type _map_rect: (int, int, int, int)
+        The rectangle the treemap is laid out in.
+    @type _text_rect: (int, int, int, int)
+        The rectangle of the text line, drawn over the treemap.
+    @type _layout: callable | None
+        The treemap layout algorithm; see layouts.
+    @type _min_area: int
+        The min_area passed to AbstractTree.generate_treemap.
+    @type _font: (str, int)
+        The font family and size of the text line.
+    @type _drawn: dict[(int, int, int, int), (int, int, int)] | None
+        The colour of every rectangle on _surface, or None if nothing has
+        been drawn yet.
+    @type _text: str | None
+        The text on _surface, or None if there is none yet.
+    @type _text_cache: OrderedDict[str, pygame.Surface]
+        Recently rendered text lines, least recently used first.
+    @type _overlay_rect: pygame.Rect | None
+        The area of the screen the overlay was last drawn on, or None if
+        it is not on the screen.
+    """
+    def __init__(self, screen, map_rect, text_rect, layout=None, min_area=0,
+                 font=('Consolas', 22)):
+        """Initialize a new TreemapRenderer for <screen>.
+        @type self: TreemapRenderer
+        @type screen: pygame.Surface
+        @type map_rect: (int, int, int, int)
+        @type text_rect: (int, int, int, int)
+        @type layout: callable | None
+        @type min_area: int
+        @type font: (str, int)
+        @rtype: None
+        """
+        self.frame_times = FrameTimes()
+        self.overlay = None
+        self._screen = screen
+        self._surface = pygame.Surface(screen.get_size())
+        self._map_rect = tuple(map_rect)
+        self._text_rect = tuple(text_rect)
+        self._layout = layout
+        self._min_area = min_area
+        self._font = font
+        self._drawn = None
+        self._text = None
+        self._text_cache = OrderedDict()
+        self._overlay_rect = None
+
+    def render(self, tree, text, items=None):
+        """Bring the screen up to date with the treemap of <tree> and the
+        text line <text>.
+        <items> are the rectangles of the treemap, if they are already
+        known; otherwise they are computed with generate_treemap.
+        @type self: TreemapRenderer
+        @type tree: AbstractTree
+        @type text: str
+        @type items: list[((int, int, int, int), (int, int, int))] | None
+        @rtype: None
+        """
+        start = time.perf_counter()
+        if items is None:
+            items = tree.generate_treemap(self._map_rect, self._layout,
+                                          self._min_area)
+        if self._drawn is None:
+            dirty = self._draw_all(items)
+        else:
+            dirty = self._draw_changes(items)
+        text_rect = pygame.Rect(self._text_rect)
+        if text != self._text or text_rect.collidelist(dirty) >= 0:
+            self._draw_text(text)
+            dirty.append(text_rect)
+        if self._overlay_rect is not None:
+            # Restore what the overlay covered.
+            dirty.append(self._overlay_rect)
+            self._overlay_rect = None
+        if len(dirty) > MAX_DIRTY_RECTS:
+            dirty = [dirty[0].unionall(dirty)]
+        for rect in dirty:
+            self._screen.blit(self._surface, rect, rect)
+        if self.overlay is not None:
+            self._overlay_rect = self._draw_overlay()
+            dirty.append(self._overlay_rect)
+        pygame.display.update(dirty)
+        self.frame_times.add(time.perf_counter() - start)
+
+    def refresh(self):
+        """Copy the whole frame to the screen again, e.g. after the window
+        was uncovered.
+        @type self: TreemapRenderer
+        @rtype: None
+        """
+        self._screen.blit(self._surface, (0, 0))
+        if self.overlay is not None:
+            self._overlay_rect = self._draw_overlay()
+        pygame.display.flip()
+
+    def _draw_all(self, items):
+        """Draw every rectangle in <items> on a cleared _surface. Return
+        the regions changed.
+        @type self: TreemapRenderer
+        @type items: list[((int, int, int, int), (int, int, int))]
+        @rtype: list[pygame.Rect]
+        """
+        self._surface.fill(pygame.color.THECOLORS['black'])
+        self._drawn = {}
+        for rect, colour in items:
+            if rect[2] >= 1 and rect[3] >= 1:
+                pygame.draw.rect(self._surface, colour, rect)
+                self._drawn[rect] = colour
+        return [self._surface.get_rect()]
+
+    def _draw_changes(self, items):
+        """Update _surface from the rectangles last drawn to <items>:
+        clear the rectangles that are gone and draw the ones that are new
+        or changed colour. Return the regions changed.
+        @type self: TreemapRenderer
+        @type items: list[((int, int, int, int), (int, int, int))]
+        @rtype: list[pygame.Rect]
+        """
+        drawn = {}
+        for rect, colour in items:
+            if rect[2] >= 1 and rect[3] >= 1:
+                drawn[rect] = colour
+        dirty = []
+        black = pygame.color.THECOLORS['black']
+        for rect in self._drawn:
+            if rect not in drawn:
+                dirty.append(self._surface.fill(black, rect))
+        for rect, colour in drawn.items():
+            if self._drawn.get(rect) != colour:
+                dirty.append(pygame.draw.rect(self._surface, colour, rect))
+        self._drawn = drawn
+        return dirty
+
+    def _draw_overlay(self):
+        """Draw the lines of the overlay on the screen, over a dark
+        background, and return the area covered.
+        @type self: TreemapRenderer
+        @rtype: pygame.Rect
+        """
+        font = get_font(self._font[0], OVERLAY_FONT_SIZE)
+        lines = [font.render(line, 1, pygame.color.THECOLORS['white'])
+                 for line in self.overlay.summary()]
+        width = max([line.get_width() for line in lines] + [0]) + 8
+        height = sum(line.get_height() for line in lines) + 8
+        background = pygame.Surface((width, height))
+        background.set_alpha(OVERLAY_ALPHA)
+        background.fill(pygame.color.THECOLORS['black'])
+        rect = self._screen.blit(background, (0, 0))
+        y = 4
+        for line in lines:
+            self._screen.blit(line, (4, y))
+            y += line.get_height()
+        return rect
+
+    def _draw_text(self, text):
+        """Draw the text line <text> on _surface.
+        @type self: TreemapRenderer
+        @type text: str
+        @rtype: None
+        """
+        pygame.draw.rect(self._surface, pygame.color.THECOLORS['black'],
+                         self._text_rect)
+        self._surface.blit(self._render_text(text),
+                           (self._text_rect[0], self._text_rect[1] + 4))
+        self._text = text
+
+    def _render_text(self, text):
+        """Return <text> rendered in the text line's font, rendering it only
+        if it is not among the recently rendered lines.
+        @type self: TreemapRenderer
+        @type text: str
+        @rtype: pygame.Surface
+        """
+        surface = self._text_cache.pop(text, None)
+        if surface is None:
+            surface = get_font(*self._font).render(
+                text, 1, pygame.color.THECOLORS['white'])
+            if len(self._text_cache) >= TEXT_CACHE_SIZE:
+                self._text_cache.popitem(last=False)
+        self._text_cache[text] = surface
+        return surface
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
@@ -0,0 +1,147 @@
+"""Treemap Visualiser: Incremental Rescans
+=== Module Description ===
+This module brings a saved scan snapshot up to date with the file system
+without rescanning everything.
+
+Every directory in the snapshot is checked against the stamp it was saved
+with (see fs_scanner.get_stamp). A directory whose stamp is unchanged has
+the same entries as before, so it is not listed again and the sizes of its
+files are taken from the snapshot; only its subdirectories are checked in
+turn. A directory whose stamp changed is listed again: entries that
+disappeared are removed, new entries are scanned, and files whose size
+changed are resized. Every change is applied with the AbstractTree methods
+that patch data_size up the ancestor chain.
+
+Files are sized, and links handled, by the ScanPolicy passed in, which
+should match the one the snapshot was scanned with. Hard links are only
+recognised among the entries listed again, since unchanged directories are
+not listed. Snapshots do not record which file a link belongs to, so when
+the link a file was counted at is removed, the file is counted at the next
+of its links listed again only if the policy has not counted it already;
+a new ScanPolicy, the default, has not.
+
+Note that rewriting a file in place does not change its directory's stamp,
+so such a change is only picked up once something else in the directory
+changes.
+"""
+import os
+
+from tree_data import FileSystemTree
+from fs_scanner import scan_tree, get_stamp, DEFAULT_WORKERS
+from scan_policy import ScanPolicy
+from snapshot import load_snapshot, save_snapshot
+
+
+def refresh_snapshot(filename, workers=DEFAULT_WORKERS, policy=None):
+    """Bring the snapshot file <filename> up to date with the file system,
+    save it, and return the refreshed tree.
+    New directories are scanned by <workers> threads, and entries are sized
+    by <policy>, or by a new ScanPolicy if it is None.
+    @type filename: str
+    @type workers: int
+    @type policy: ScanPolicy | None
+    @rtype: SnapshotTree
+    """
+    tree = load_snapshot(filename)
+    stamps = refresh_tree(tree, workers, policy)
+    save_snapshot(tree, filename, stamps)
+    return tree
+
+
+def refresh_tree(tree, workers=DEFAULT_WORKERS, policy=None):
+    """Update <tree>, a tree loaded from a snapshot, to match the file
+    system. Return the stamps of the directories in the updated tree, to be
+    passed to save_snapshot.
+    Entries are sized by <policy>, or by a new ScanPolicy if it is None.
+    Precondition: the path <tree> was scanned from is a directory.
+    @type tree: SnapshotTree
+    @type workers: int
+    @type policy: ScanPolicy | None
+    @rtype: dict[str, (int, int)]
+    """
+    if policy is None:
+        policy = ScanPolicy()
+    policy.start(tree.path)
+    stamps = {}
+    stack = [(tree, tree.path)]
+    while stack:
+        node, path = stack.pop()
+        try:
+            stamp = get_stamp(path)
+        except FileNotFoundError:
+            # Removed since its parent was checked.
+            if node is tree:
+                raise
+            tree.remove_node(node)
+            continue
+        stamps[path] = stamp
+        if stamp != node.get_stamp()[1]:
+            _relist(tree, node, path, workers, stamps, stack, policy)
+        else:
+            for subtree in node.get_subtrees():
+                if subtree.get_stamp()[0]:
+                    stack.append((subtree, os.path.join(path,
+                                                        subtree.get_root())))
+    return stamps
+
+
+def _relist(tree, node, path, workers, stamps, stack, policy):
+    """List the changed directory <path> again and patch <node>, its
+    subtree in <tree>, to match it, sizing entries by <policy>.
+    Subdirectories that already existed are pushed onto <stack> to be
+    checked in turn; new ones are scanned, adding their stamps to <stamps>.
+    @type tree: SnapshotTree
+    @type node: SnapshotTree
+    @type path: str
+    @type workers: int
+    @type stamps: dict[str, (int, int)]
+    @type stack: list[(SnapshotTree, str)]
+    @type policy: ScanPolicy
+    @rtype: None
+    """
+    with os.scandir(path) as iterator:
+        entries = {entry.name: entry for entry in iterator}
+    for subtree in list(node.get_subtrees()):
+        entry = entries.get(subtree.get_root())
+        was_dir = subtree.get_stamp()[0]
+        if entry is None:
+            tree.remove_node(subtree)
+        elif was_dir == _is_entered(entry, policy):
+            del entries[entry.name]
+            if was_dir:
+                stack.append((subtree, entry.path))
+                continue
+            # A file counted here before stays counted here.
+            change = policy.size(entry.stat(follow_symlinks=False),
+                                 entry.path, subtree.data_size > 0) - \
+                subtree.data_size
+            if change:
+                # size_up also accepts negative changes, whereas size_down
+                # never shrinks a node below 1.
+                tree.size_up(subtree, change)
+        else:
+            # Changed between a file and a directory; added again below.
+            tree.remove_node(subtree)
+    for entry in entries.values():
+        if _is_entered(entry, policy):
+            subtree = scan_tree(entry.path, workers, stamps, policy=policy)
+        else:
+            subtree = FileSystemTree(entry.path, [], policy.size(
+                entry.stat(follow_symlinks=False), entry.path))
+        tree.add_node(node, subtree)
+
+
+def _is_entered(entry, policy):
+    """Return whether the directory entry <entry> is a directory that
+    <policy> enters, rather than a leaf.
+    @type entry: os.DirEntry
+    @type policy: ScanPolicy
+    @rtype: bool
+    """
+    return entry.is_dir(follow_symlinks=False) and \
+        policy.enters(entry.stat(follow_symlinks=False))
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
@@ -0,0 +1,196 @@
+"""Treemap Visualiser: Scan Policies
+=== Module Description ===
+This module decides how the file system scanners size files and which
+folders they enter.
+
+Symbolic links are never followed: a link is a leaf sized like the link
+itself, so a link loop or a link to / cannot make a scan run forever or
+rescan the whole disk. On top of that, a ScanPolicy can
+- count a file with several hard links only once, at the first link seen,
+  as du does; backup volumes made with hard links would otherwise be
+  counted many times over;
+- size files by the disk blocks allocated to them rather than by their
+  apparent size, so that sparse files count only the space they use;
+- stay on one file system, leaving the folders other file systems are
+  mounted on empty.
+
+Hard links are recognised by their (st_dev, st_ino) pair. Only files with
+more than one link are remembered, each as one int in a set, so the set
+stays small even for large scans. When the link a file is counted at is
+removed, forget lets the next link seen take over. Scans split across
+processes merge the links each process has seen; see merge_hard_links.
+"""
+import os
+import stat
+import threading
+
+
+class ScanPolicy:
+    """How a scan sizes files and which folders it enters.
+    A ScanPolicy remembers the hard links and the file system it has seen,
+    so the same policy should be used for every scan of a tree, e.g. by
+    the scanner, the watcher and incremental rescans, and a new one for
+    every other tree.
+    === Public Attributes ===
+    @type disk_usage: bool
+        If True, files are sized by the disk blocks allocated to them
+        (st_blocks * 512); otherwise by their apparent size (st_size).
+    @type count_links_once: bool
+        If True, a file with several hard links is only counted at the
+        first of its links that is seen; the others have size 0.
+    @type one_file_system: bool
+        If True, folders on a different file system than the first path
+        scanned are not entered.
+    === Private Attributes ===
+    @type _device: int | None
+        The device of the first path scanned, or None if it is not needed
+        or not known yet.
+    @type _counted: set[int]
+        The files with several hard links counted so far, each identified
+        by its device and inode packed into one int; see hard_link_key.
+    @type _lock: threading.Lock
+        Guards _counted, so that only one link of a file is counted when
+        several threads scan at once.
+    """
+    def __init__(self, disk_usage=False, count_links_once=True,
+                 one_file_system=False):
+        """Initialize a new ScanPolicy, which has not seen anything yet.
+        @type self: ScanPolicy
+        @type disk_usage: bool
+        @type count_links_once: bool
+        @type one_file_system: bool
+        @rtype: None
+        """
+        self.disk_usage = disk_usage
+        self.count_links_once = count_links_once
+        self.one_file_system = one_file_system
+        self._device = None
+        self._counted = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """Return the state of this policy to be pickled, e.g. to be sent
+        to a worker process, leaving out its lock.
+        @type self: ScanPolicy
+        @rtype: dict
+        """
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        """Restore this policy from the pickled <state>.
+        @type self: ScanPolicy
+        @type state: dict
+        @rtype: None
+        """
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def start(self, path):
+        """Note that a scan of <path> is starting. The first path scanned
+        decides which file system one_file_system stays on.
+        @type self: ScanPolicy
+        @type path: str
+        @rtype: None
+        """
+        if self.one_file_system and self._device is None:
+            self._device = os.stat(path).st_dev
+
+    def enters(self, info):
+        """Return whether a scan enters the folder whose lstat result is
+        <info>.
+        @type self: ScanPolicy
+        @type info: os.stat_result
+        @rtype: bool
+        """
+        return self._device is None or info.st_dev == self._device
+
+    def file_key(self, info):
+        """Return the int identifying the file whose lstat result is <info>
+        if it is a regular file and hard links are only counted once, or
+        None otherwise. Unlike hard_link_key, the file may have one link.
+        @type self: ScanPolicy
+        @type info: os.stat_result
+        @rtype: int | None
+        """
+        if self.count_links_once and stat.S_ISREG(info.st_mode) and \
+                info.st_ino:
+            return (info.st_dev << 64) | info.st_ino
+        return None
+
+    def hard_link_key(self, info):
+        """Return the int identifying the file whose lstat result is <info>
+        if it is a file with several hard links that is only counted once,
+        or None otherwise.
+        @type self: ScanPolicy
+        @type info: os.stat_result
+        @rtype: int | None
+        """
+        if info.st_nlink > 1:
+            return self.file_key(info)
+        return None
+
+    def size(self, info, path, counted=False):
+        """Return the size of the entry <path>, which is not a folder,
+        from its lstat result <info>.
+        Regular files and symbolic links are sized by disk_usage; a file
+        that is counted at another of its hard links has size 0, and so
+        do other kinds of entry, such as sockets. If <counted> is True,
+        <path> is known to be the link its file is counted at, e.g. when a
+        folder is listed again, and it keeps being counted.
+        Safe to call from several threads at once.
+        @type self: ScanPolicy
+        @type info: os.stat_result
+        @type path: str
+        @type counted: bool
+        @rtype: int
+        """
+        if stat.S_ISREG(info.st_mode):
+            key = self.hard_link_key(info)
+            if key is not None:
+                with self._lock:
+                    if key in self._counted and not counted:
+                        return 0
+                    self._counted.add(key)
+        elif not stat.S_ISLNK(info.st_mode):
+            return 0
+        if self.disk_usage:
+            # st_blocks is not available on every platform.
+            blocks = getattr(info, 'st_blocks', None)
+            if blocks is not None:
+                return blocks * 512
+        return info.st_size
+
+    def forget(self, key):
+        """Forget that the file identified by <key> (see hard_link_key) is
+        counted, because the link it was counted at was removed, so that
+        the next of its links to be sized is counted instead.
+        @type self: ScanPolicy
+        @type key: int
+        @rtype: None
+        """
+        with self._lock:
+            self._counted.discard(key)
+
+    def merge_hard_links(self, hard_links):
+        """Add <hard_links>, the files with several hard links counted by
+        another ScanPolicy, identified as by hard_link_key, to those counted
+        by this one.
+        Return those of <hard_links> that this policy had already counted,
+        and which the other policy's scan must therefore not count.
+        @type self: ScanPolicy
+        @type hard_links: set[int]
+        @rtype: set[int]
+        """
+        if not self.count_links_once:
+            return set()
+        with self._lock:
+            already = hard_links & self._counted
+            self._counted |= hard_links
+        return already
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
@@ -0,0 +1,280 @@
+"""Treemap Visualiser: Scan Snapshots
+=== Module Description ===
+This module saves a FileSystemTree to a compact binary snapshot file, and
+loads it back without touching the scanned file system again.
+
+A snapshot file consists of:
+  - a header: the magic bytes MAGIC, the format version, the number of
+    nodes and the offset of the string pool;
+  - a node table with one fixed-size record per node, in breadth-first
+    order so that the subtrees of each node are consecutive records. Each
+    record holds the index of the node's first subtree, its number of
+    subtrees, the offset and length of its name in the string pool, flags
+    (FLAG_DIRECTORY), its data_size, and for a directory its stamp (see
+    fs_scanner.get_stamp), or zeros if the stamp is unknown;
+  - a string pool holding every name, encoded with os.fsencode. The name
+    of the first node is the full path that was scanned.
+
+Loading memory-maps the file and only reads the records of nodes when they
+are first needed, so even very large snapshots open almost instantly.
+The directory stamps let rescan bring a snapshot up to date without
+listing unchanged directories again.
+
+The same format, held in memory with dump_snapshot and read_snapshot, is
+how the processes of a sharded scan hand their subtrees back; see
+fs_scanner.scan_tree_sharded.
+"""
+import mmap
+import os
+import stat
+import struct
+
+from tree_data import AbstractTree, FileSystemTree
+
+
+MAGIC = b'TMSNAP\x00\x00'
+VERSION = 2
+# magic, version, node count, string pool offset
+HEADER = struct.Struct('<8sHxxxxxxQQ')
+# first subtree, subtree count, name offset, name length, flags, data_size,
+# modification time in nanoseconds, inode
+NODE = struct.Struct('<IIQIIQqQ')
+# The node is a directory.
+FLAG_DIRECTORY = 1
+
+
+def save_snapshot(tree, filename, stamps=None):
+    """Save the FileSystemTree <tree> to the snapshot file <filename>.
+    <stamps> maps directory paths to their stamps, as filled in by
+    fs_scanner.scan_tree. Nodes loaded from a snapshot keep the stamps
+    they were loaded with. Other directories are saved with unknown stamps.
+    The file is replaced atomically, so <filename> may be the snapshot
+    <tree> was loaded from.
+    @type tree: FileSystemTree
+    @type filename: str
+    @type stamps: dict[str, (int, int)] | None
+    @rtype: None
+    """
+    data = dump_snapshot(tree, stamps)
+    with open(filename + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(filename + '.tmp', filename)
+
+
+def dump_snapshot(tree, stamps=None):
+    """Return the contents of a snapshot file of the FileSystemTree
+    <tree>; <stamps> is as for save_snapshot.
+    @type tree: FileSystemTree
+    @type stamps: dict[str, (int, int)] | None
+    @rtype: bytes
+    """
+    if stamps is None:
+        stamps = {}
+    records = []
+    pool = []
+    pool_size = 0
+    nodes = [tree]
+    paths = [tree.path]
+    for index, node in enumerate(nodes):
+        name = os.fsencode(paths[index] if index == 0 else node.get_root())
+        subtrees = node.get_subtrees()
+        if paths[index] in stamps:
+            is_dir, stamp = True, stamps[paths[index]]
+        elif isinstance(node, SnapshotTree):
+            is_dir, stamp = node.get_stamp()
+        else:
+            # An empty folder is a leaf of size 0, like an empty file.
+            is_dir = len(subtrees) > 0 or (node.data_size == 0 and
+                                           _is_directory(paths[index]))
+            stamp = (0, 0)
+        records.append(NODE.pack(len(nodes), len(subtrees), pool_size,
+                                 len(name), FLAG_DIRECTORY if is_dir else 0,
+                                 node.data_size, stamp[0], stamp[1]))
+        pool.append(name)
+        pool_size += len(name)
+        nodes.extend(subtrees)
+        paths.extend(os.path.join(paths[index], subtree.get_root())
+                     for subtree in subtrees)
+    return b''.join([HEADER.pack(MAGIC, VERSION, len(nodes),
+                                 HEADER.size + NODE.size * len(nodes))] +
+                    records + pool)
+
+
+def _is_directory(path):
+    """Return whether <path> is a folder, and not a link to one.
+    @type path: str
+    @rtype: bool
+    """
+    try:
+        return stat.S_ISDIR(os.lstat(path).st_mode)
+    except OSError:
+        return False
+
+
+def load_snapshot(filename):
+    """Return the tree saved in the snapshot file <filename>.
+    The returned tree behaves like the FileSystemTree that was saved, but
+    the subtrees of each node are only read from the file when they are
+    first accessed.
+    Raise ValueError if <filename> is not a snapshot of a supported
+    version.
+    @type filename: str
+    @rtype: SnapshotTree
+    """
+    with open(filename, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_snapshot(data, filename)
+
+
+def read_snapshot(data, filename='snapshot'):
+    """Return the tree saved in <data>, the contents of a snapshot file
+    such as those returned by dump_snapshot. Subtrees are read from <data>
+    when they are first accessed, as for load_snapshot.
+    Raise ValueError, naming <filename>, if <data> is not a snapshot of a
+    supported version.
+    @type data: bytes | mmap.mmap
+    @type filename: str
+    @rtype: SnapshotTree
+    """
+    if len(data) < HEADER.size:
+        raise ValueError('{} is not a treemap snapshot'.format(filename))
+    magic, version, count, pool_offset = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('{} is not a treemap snapshot'.format(filename))
+    if version != VERSION:
+        raise ValueError('{} has unsupported snapshot version {}'.format(
+            filename, version))
+    if count == 0:
+        raise ValueError('{} contains no nodes'.format(filename))
+    return SnapshotTree(_Snapshot(data, pool_offset), 0)
+
+
+class _Snapshot:
+    """A memory-mapped snapshot file.
+    === Public Attributes ===
+    @type data: bytes | mmap.mmap
+        The contents of the file.
+    @type pool_offset: int
+        The offset of the string pool in the file.
+    """
+    __slots__ = ('data', 'pool_offset')
+
+    def __init__(self, data, pool_offset):
+        """Initialize a new _Snapshot.
+        @type self: _Snapshot
+        @type data: bytes | mmap.mmap
+        @type pool_offset: int
+        @rtype: None
+        """
+        self.data = data
+        self.pool_offset = pool_offset
+
+    def read_node(self, index):
+        """Return the record of node <index>, with its name decoded:
+        (first subtree, subtree count, name, data_size).
+        @type self: _Snapshot
+        @type index: int
+        @rtype: (int, int, str, int)
+        """
+        first, count, name_offset, name_length, _, data_size, _, _ = \
+            NODE.unpack_from(self.data, HEADER.size + NODE.size * index)
+        start = self.pool_offset + name_offset
+        name = os.fsdecode(self.data[start:start + name_length])
+        return first, count, name, data_size
+
+    def read_stamp(self, index):
+        """Return whether node <index> is a directory, and its stamp.
+        @type self: _Snapshot
+        @type index: int
+        @rtype: (bool, (int, int))
+        """
+        record = NODE.unpack_from(self.data, HEADER.size + NODE.size * index)
+        return bool(record[4] & FLAG_DIRECTORY), (record[6], record[7])
+
+
+# The storage of AbstractTree's _subtrees slot, which SnapshotTree fills in
+# lazily through its _subtrees property.
+_SUBTREES_SLOT = AbstractTree.__dict__['_subtrees']
+
+
+class SnapshotTree(FileSystemTree):
+    """A FileSystemTree loaded from a snapshot file.
+    The subtrees of a node are created from the snapshot the first time
+    they are accessed.
+    === Private Attributes ===
+    @type _snapshot: _Snapshot
+        The snapshot this tree was loaded from.
+    @type _index: int
+        The index of this node in the snapshot.
+    @type _first: int
+        The index of this node's first subtree in the snapshot.
+    @type _count: int
+        The number of subtrees of this node in the snapshot.
+    """
+    __slots__ = ('_snapshot', '_index', '_first', '_count')
+
+    def __init__(self, snapshot, index):
+        """Initialize node <index> of <snapshot>.
+        The first node's name is the full path that was scanned.
+        @type self: SnapshotTree
+        @type snapshot: _Snapshot
+        @type index: int
+        @rtype: None
+        """
+        self._snapshot = snapshot
+        self._index = index
+        self._first, self._count, name, data_size = snapshot.read_node(index)
+        self._path = name
+        if index == 0:
+            name = self.separate(name)[-1]
+        AbstractTree.__init__(self, name, [], data_size)
+        if self._count:
+            _SUBTREES_SLOT.__set__(self, None)
+
+    def get_stamp(self):
+        """Return whether this node was a directory when it was saved, and
+        its stamp at the time; (0, 0) if the stamp is unknown.
+        @type self: SnapshotTree
+        @rtype: (bool, (int, int))
+        """
+        return self._snapshot.read_stamp(self._index)
+
+    def _get_subtrees(self):
+        """Return the subtrees of this tree, loading them from the
+        snapshot if this is the first time they are needed.
+        @type self: SnapshotTree
+        @rtype: list[SnapshotTree]
+        """
+        subtrees = _SUBTREES_SLOT.__get__(self)
+        if subtrees is None:
+            subtrees = [SnapshotTree(self._snapshot, index)
+                        for index in range(self._first,
+                                           self._first + self._count)]
+            for subtree in subtrees:
+                subtree._parent_tree = self
+                subtree._path = None
+            _SUBTREES_SLOT.__set__(self, subtrees)
+        return subtrees
+
+    def _loaded_subtrees(self):
+        """Return the subtrees of this tree if they were already loaded
+        from the snapshot, or an empty list if they were not.
+        @type self: SnapshotTree
+        @rtype: list[SnapshotTree]
+        """
+        return _SUBTREES_SLOT.__get__(self) or []
+
+    def _set_subtrees(self, subtrees):
+        """Replace the subtrees of this tree.
+        @type self: SnapshotTree
+        @type subtrees: list[SnapshotTree]
+        @rtype: None
+        """
+        _SUBTREES_SLOT.__set__(self, subtrees)
+
+    _subtrees = property(_get_subtrees, _set_subtrees)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
@@ -0,0 +1,253 @@
+"""Treemap Visualiser: Tabular Data
+=== Module Description ===
+This module builds trees from tables, so that exports such as cost
+reports, database table sizes or du output can be shown as treemaps:
+    python treemap_visualiser.py --table costs.csv \
+        --hierarchy region/country/city --size cost
+
+Each row of a CSV or JSON lines file is a leaf. Its place in the tree is
+given by the values of the hierarchy columns, from the top level down,
+and its size by the size column. Rows with the same place are added
+together, and a row with an empty hierarchy value stops at the level
+above it. A single column can also hold whole paths, such as the file
+names in du output, which are split into levels (see load_table's split
+parameter).
+
+The file is read in a single pass, one row at a time. Rows are added into
+a nested dict of children, so memory depends on the number of distinct
+nodes rather than the number of rows; the TableTree is then built from
+the dicts bottom-up.
+"""
+import csv
+import json
+import os
+import sys
+
+from tree_data import AbstractTree
+
+
+# The file extensions read as JSON lines; any other file is read as CSV,
+# with tabs as delimiters for the TSV_EXTENSIONS.
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson', '.json')
+TSV_EXTENSIONS = ('.tsv', '.tab')
+# The name of the leaf holding the size of rows that end at a node which
+# also has children.
+OWN_SIZE_NAME = '(self)'
+
+
+class TableTree(AbstractTree):
+    """A tree representation of rows of a table, grouped by the values of
+    hierarchy columns.
+    The leaves represent rows, or several rows with the same values, and
+    the data_size of a leaf is the sum of their sizes.
+    === Private Attributes ===
+    @type _separator: str
+        The string returned by get_separator.
+    """
+    __slots__ = ('_separator',)
+
+    def __init__(self, root, subtrees, data_size=0, separator='/'):
+        """Initialize a new TableTree; the parameters other than
+        <separator> are as for AbstractTree.
+        @type self: TableTree
+        @type root: object
+        @type subtrees: list[TableTree]
+        @type data_size: int
+        @type separator: str
+        @rtype: None
+        """
+        AbstractTree.__init__(self, root, subtrees, data_size)
+        self._separator = separator
+
+    def get_separator(self):
+        """Return the string used to separate nodes in the string
+        representation of a path from the tree root to a leaf.
+        @type self: TableTree
+        @rtype: str
+        """
+        return self._separator
+
+
+def load_table(filename, hierarchy, size, separator='/', split=None,
+               root=None, header=True, file_format=None):
+    """Return a TableTree of the rows of the CSV or JSON lines file
+    <filename>, or of standard input if <filename> is '-'.
+    <hierarchy> lists the columns giving each row's place in the tree,
+    from the top level down, either as a list or as a string of names
+    joined by '/', such as 'region/country/city'. <size> is the column
+    giving each row's size. If <split> is not None, the values of the
+    hierarchy columns are split on it into several levels. <separator> is
+    returned by the tree's get_separator, and <root> is the name of the
+    root, by default the name of the file.
+    CSV files have a header row naming the columns unless <header> is
+    False, in which case columns are given by their 0-based numbers.
+    <file_format> is 'csv' or 'jsonl'; if it is None, it is chosen from
+    the extension of <filename> (see JSON_LINES_EXTENSIONS).
+    Rows whose size cannot be read as a non-negative number are ignored.
+    Raise ValueError if a column is not in the file.
+    @type filename: str
+    @type hierarchy: str | list[str]
+    @type size: str
+    @type separator: str
+    @type split: str | None
+    @type root: str | None
+    @type header: bool
+    @type file_format: str | None
+    @rtype: TableTree
+    """
+    if isinstance(hierarchy, str):
+        hierarchy = hierarchy.split('/')
+    extension = os.path.splitext(filename)[1].lower()
+    if file_format is None:
+        file_format = 'jsonl' if extension in JSON_LINES_EXTENSIONS \
+            else 'csv'
+    if root is None:
+        root = os.path.basename(filename) if filename != '-' else 'stdin'
+    if filename == '-':
+        return _load_rows(sys.stdin, hierarchy, size, separator, split, root,
+                          header, file_format, extension)
+    with open(filename, newline='', encoding='utf-8') as file:
+        return _load_rows(file, hierarchy, size, separator, split, root,
+                          header, file_format, extension)
+
+
+def _load_rows(file, hierarchy, size, separator, split, root, header,
+               file_format, extension):
+    """Return the TableTree of the rows of the open file <file>; the
+    other parameters are as for load_table.
+    @type file: io.TextIOBase
+    @type hierarchy: list[str]
+    @type size: str
+    @type separator: str
+    @type split: str | None
+    @type root: str
+    @type header: bool
+    @type file_format: str
+    @type extension: str
+    @rtype: TableTree
+    """
+    if file_format == 'jsonl':
+        rows = _json_rows(file, hierarchy, size)
+    else:
+        delimiter = '\t' if extension in TSV_EXTENSIONS else ','
+        rows = _csv_rows(file, hierarchy, size, header, delimiter)
+    # Each node is a list [size of rows ending at it, dict of children by
+    # name, or None].
+    top = [0, None]
+    for names, value in rows:
+        try:
+            value = int(round(float(value)))
+        except (TypeError, ValueError):
+            continue
+        if value < 0:
+            continue
+        node = top
+        for name in names:
+            if name is None or name == '':
+                break
+            if split is not None:
+                parts = str(name).split(split)
+            else:
+                parts = (str(name),)
+            for part in parts:
+                if part == '':
+                    continue
+                if node[1] is None:
+                    node[1] = {}
+                child = node[1].get(part)
+                if child is None:
+                    child = [0, None]
+                    node[1][part] = child
+                node = child
+        node[0] += value
+    return _build_tree(root, top, separator)
+
+
+def _csv_rows(file, hierarchy, size, header, delimiter):
+    """Yield the hierarchy values and the size of each row of the CSV file
+    <file>; the other parameters are as for load_table.
+    Raise ValueError if a column is not in the file.
+    @type file: io.TextIOBase
+    @type hierarchy: list[str]
+    @type size: str
+    @type header: bool
+    @type delimiter: str
+    @rtype: iterator[(list[str], str)]
+    """
+    reader = csv.reader(file, delimiter=delimiter)
+    if header:
+        names = next(reader, [])
+        columns = {name: index for index, name in enumerate(names)}
+        missing = [name for name in hierarchy + [size] if name not in columns]
+        if missing:
+            raise ValueError('no column {} in the table'.format(
+                ', '.join(missing)))
+        indices = [columns[name] for name in hierarchy]
+        size_index = columns[size]
+    else:
+        try:
+            indices = [int(name) for name in hierarchy]
+            size_index = int(size)
+        except ValueError:
+            raise ValueError('columns of a table without a header must be '
+                             'given by number')
+    for row in reader:
+        if len(row) <= size_index:
+            continue
+        yield [row[index] if index < len(row) else None
+               for index in indices], row[size_index]
+
+
+def _json_rows(file, hierarchy, size):
+    """Yield the hierarchy values and the size of each object in the JSON
+    lines file <file>; the other parameters are as for load_table.
+    Blank lines are skipped, and fields missing from an object are None.
+    @type file: io.TextIOBase
+    @type hierarchy: list[str]
+    @type size: str
+    @rtype: iterator[(list[object], object)]
+    """
+    for line in file:
+        if line.strip():
+            row = json.loads(line)
+            yield [row.get(name) for name in hierarchy], row.get(size)
+
+
+def _build_tree(root, top, separator):
+    """Return the TableTree named <root> of the nested nodes <top>; see
+    _load_rows.
+    The tree is built bottom-up with an explicit stack, so that a node is
+    only created once all of its subtrees exist, and the nested nodes are
+    released as they are used.
+    @type root: str
+    @type top: list
+    @type separator: str
+    @rtype: TableTree
+    """
+    built = []
+    stack = [(root, top, False)]
+    while stack:
+        name, node, expanded = stack.pop()
+        if node[1] is None:
+            built.append(TableTree(name, [], node[0], separator))
+        elif not expanded:
+            stack.append((name, node, True))
+            # Pushed in reverse so that children are built, and popped
+            # from built, in the order they were first seen.
+            for item in reversed(list(node[1].items())):
+                stack.append(item + (False,))
+        else:
+            count = len(node[1])
+            subtrees = built[len(built) - count:]
+            del built[len(built) - count:]
+            if node[0]:
+                subtrees.append(TableTree(OWN_SIZE_NAME, [], node[0],
+                                          separator))
+            node[1] = None
+            built.append(TableTree(name, subtrees, 0, separator))
+    return built[0]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
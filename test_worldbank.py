@@ -0,0 +1,266 @@
+"""Treemap Visualiser: World Bank Client Tests
+=== Module Description ===
+Tests of worldbank.WorldBankClient and PopulationTree against a local
+stand-in for the World Bank API, served by http.server on a free port, so
+that pagination, retries, timeouts and error responses can be tested
+without the network. Run with:
+    python -m unittest test_worldbank
+"""
+import json
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import worldbank
+from worldbank import WorldBankClient
+from population import PopulationTree, WORLD_BANK_INDICATOR, \
+    WORLD_BANK_COUNTRIES
+
+
+# The countries served by the fake API: (iso3, iso2, name, region).
+COUNTRIES = [('C{:02}'.format(i), 'K{:02}'.format(i), 'Country {}'.format(i),
+              'Region {}'.format(i % 3)) for i in range(23)]
+# The population of each country, by iso3 code.
+POPULATIONS = {iso3: 1000 * (i + 1)
+               for i, (iso3, _, _, _) in enumerate(COUNTRIES)}
+# An error response, as the API sends for an unknown indicator.
+ERROR_RESPONSE = [{'message': [{'id': '120', 'key': 'Invalid value',
+                                'value': 'The provided parameter value is '
+                                         'not valid'}]}]
+
+
+def _country_records():
+    """Return the records of the fake countries response, including an
+    aggregate, which is not a country.
+    @rtype: list[dict]
+    """
+    records = [{'id': iso3, 'iso2Code': iso2, 'name': name,
+                'region': {'id': region[-1], 'value': region + ' '}}
+               for iso3, iso2, name, region in COUNTRIES]
+    records.append({'id': 'WLD', 'iso2Code': '1W', 'name': 'World',
+                    'region': {'id': 'NA', 'value': 'Aggregates'}})
+    return records
+
+
+def _indicator_records():
+    """Return the records of the fake population response: one per
+    country, the first without an iso3 code, and one with no value.
+    @rtype: list[dict]
+    """
+    records = []
+    for index, (iso3, iso2, name, _) in enumerate(COUNTRIES):
+        records.append({'countryiso3code': iso3 if index else '',
+                        'country': {'id': iso2, 'value': name},
+                        'date': '2014', 'value': POPULATIONS[iso3]})
+    records.append({'countryiso3code': 'WLD', 'country': {'id': '1W'},
+                    'date': '2014', 'value': None})
+    return records
+
+
+class FakeWorldBank(BaseHTTPRequestHandler):
+    """Answers requests like the World Bank API, from the fake records,
+    recording them in the FakeServer's requests. /slow answers after a
+    second, and /flaky fails with status 500 while the FakeServer's
+    fail_first is positive.
+    """
+    def do_GET(self):
+        """Answer a GET request.
+        @type self: FakeWorldBank
+        @rtype: None
+        """
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        self.server.requests.append(self.path)
+        if url.path == '/slow':
+            time.sleep(1.0)
+            self._send(200, [{'page': 1, 'pages': 1}, []])
+        elif url.path == '/flaky':
+            if self.server.fail_first > 0:
+                self.server.fail_first -= 1
+                self._send(500, {'error': 'try again'})
+            else:
+                self._send(200, {'ok': True})
+        elif url.path == '/v2/country':
+            self._send_page(_country_records(), query)
+        elif url.path == '/v2/country/all/indicator/SP.POP.TOTL':
+            self._send_page(_indicator_records(), query)
+        else:
+            self._send(200, ERROR_RESPONSE)
+
+    def _send_page(self, records, query):
+        """Send the page of <records> asked for by <query>, with the
+        metadata the API puts first.
+        @type self: FakeWorldBank
+        @type records: list[dict]
+        @type query: dict[str, str]
+        @rtype: None
+        """
+        page = int(query.get('page', 1))
+        per_page = int(query.get('per_page', 50))
+        pages = max(1, -(-len(records) // per_page))
+        start = (page - 1) * per_page
+        chunk = records[start:start + per_page]
+        self._send(200, [{'page': page, 'pages': pages,
+                          'per_page': per_page, 'total': len(records)},
+                         chunk or None])
+
+    def _send(self, status, data):
+        """Send <data> as JSON with the HTTP status <status>.
+        @type self: FakeWorldBank
+        @type status: int
+        @type data: object
+        @rtype: None
+        """
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keep the test output quiet."""
+
+
+class FakeServer(ThreadingHTTPServer):
+    """A server of FakeWorldBank, ignoring clients that gave up waiting.
+    === Public Attributes ===
+    @type requests: list[str]
+        The paths requested so far.
+    @type fail_first: int
+        The number of requests to /flaky still to fail.
+    """
+    def __init__(self):
+        """Start serving on a free port of the local host.
+        @type self: FakeServer
+        @rtype: None
+        """
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), FakeWorldBank)
+        self.requests = []
+        self.fail_first = 0
+
+    def handle_error(self, request, client_address):
+        """Ignore the broken connections of timed out clients."""
+
+
+class WorldBankTest(unittest.TestCase):
+    """Tests against a FakeWorldBank server, with a fresh cache folder."""
+    def setUp(self):
+        """Start the server and create the cache folder."""
+        self.server = FakeServer()
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.cache = tempfile.TemporaryDirectory()
+        self.retry_delay = worldbank.RETRY_DELAY
+        worldbank.RETRY_DELAY = 0.01
+
+    def tearDown(self):
+        """Stop the server and remove the cache folder."""
+        worldbank.RETRY_DELAY = self.retry_delay
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache.cleanup()
+
+    def client(self, **kwargs):
+        """Return a client of the server, caching in the test's folder.
+        @rtype: WorldBankClient
+        """
+        kwargs.setdefault('cache_dir', self.cache.name)
+        return WorldBankClient(self.base_url, **kwargs)
+
+    def test_pages(self):
+        """Every record is returned once, whatever the page size."""
+        path = WORLD_BANK_INDICATOR.format('SP.POP.TOTL', '2014')
+        expected = _indicator_records()
+        for per_page in (1, 7, 50, 1000):
+            records = list(self.client(cache_dir=None).iter_records(
+                path, per_page))
+            self.assertEqual(records, expected, per_page)
+        pages = [request for request in self.server.requests
+                 if 'per_page=7&' in request or request.endswith(
+                     'per_page=7')]
+        self.assertEqual(len(pages), -(-len(expected) // 7))
+
+    def test_population_tree(self):
+        """Countries are joined to regions by code, aggregates and
+        countries without data are left out."""
+        tree = PopulationTree(True, client=self.client())
+        self.assertEqual(tree.data_size, sum(POPULATIONS.values()))
+        regions = {region.get_root(): region
+                   for region in tree.get_subtrees()}
+        self.assertEqual(sorted(regions), ['Region 0', 'Region 1',
+                                           'Region 2'])
+        self.assertEqual(len(regions['Region 0'].get_subtrees()), 8)
+
+    def test_cache(self):
+        """A cached response is used without asking the server again, and
+        in offline mode whatever its age."""
+        client = self.client()
+        first = list(client.iter_records(WORLD_BANK_COUNTRIES, 10))
+        count = len(self.server.requests)
+        self.assertEqual(list(client.iter_records(WORLD_BANK_COUNTRIES, 10)),
+                         first)
+        self.assertEqual(len(self.server.requests), count)
+        offline = self.client(offline=True, ttl=0)
+        self.assertEqual(list(offline.iter_records(WORLD_BANK_COUNTRIES,
+                                                   10)), first)
+        self.assertEqual(len(self.server.requests), count)
+        with self.assertRaises(FileNotFoundError):
+            offline.get_json('/v2/never/asked')
+
+    def test_fixtures(self):
+        """In offline mode, responses come from fixture folders."""
+        self.client().get_json('/flaky')
+        offline = WorldBankClient(self.base_url, cache_dir=None,
+                                  offline=True,
+                                  fixture_dirs=[self.cache.name])
+        self.assertEqual(offline.get_json('/flaky'), {'ok': True})
+
+    def test_retries(self):
+        """Server errors are retried, up to the client's retries."""
+        self.server.fail_first = 2
+        self.assertEqual(self.client(retries=2).get_json('/flaky'),
+                         {'ok': True})
+        self.assertEqual(len(self.server.requests), 3)
+        self.server.fail_first = 2
+        with self.assertRaises(urllib.error.HTTPError):
+            self.client(cache_dir=None, retries=1).get_json('/flaky')
+
+    def test_timeout(self):
+        """A slow server times out, and a stale cached response is used
+        instead if there is one."""
+        with self.assertRaises(OSError):
+            self.client(timeout=0.2, retries=0).get_json('/slow')
+        stale = self.client(timeout=5)
+        stale.get_json('/slow')
+        quick = self.client(timeout=0.2, retries=0, ttl=0)
+        self.assertEqual(quick.get_json('/slow'),
+                         [{'page': 1, 'pages': 1}, []])
+
+    def test_error_response(self):
+        """An error message from the API is raised as a ValueError."""
+        client = self.client()
+        with self.assertRaises(ValueError):
+            list(client.iter_records('/v2/country/all/indicator/NOPE'
+                                     '?format=json&date=2014'))
+
+    def test_error_not_cached(self):
+        """An error message is not cached, so the API is asked again."""
+        client = self.client()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                list(client.iter_records('/v2/nope'))
+        self.assertEqual(len(self.server.requests), 2)
+        offline = self.client(offline=True)
+        with self.assertRaises(FileNotFoundError):
+            list(offline.iter_records('/v2/nope'))
+
+
+if __name__ == '__main__':
+    unittest.main()
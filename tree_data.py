@@ -10,16 +10,17 @@ concrete implementation of a subclass to represent files and folders on your
 computer's file system.
 """
 import os
-from random import randint
 import math
+import stat
+
+from ancestry import AncestryIndex
+from colours import path_colour, SIZE_POLICIES
+from scan_policy import ScanPolicy
 
 
 class AbstractTree:
     """A tree that is compatible with the treemap visualiser.
     This is an abstract class that should not be instantiated directly.
-    You may NOT add any attributes, public or private, to this class.
-    However, part of this assignment will involve you adding and implementing
-    new public *methods* for this interface.
     === Public Attributes ===
     @type data_size: int
         The total size of all leaves of this tree.
@@ -34,6 +35,28 @@ class AbstractTree:
     @type _parent_tree: AbstractTree | None
         The parent tree of this tree; i.e., the tree that contains this tree
         as a subtree, or None if this tree is not part of a larger tree.
+    @type _layout_rect: (int, int, int, int) | None
+        The rectangle this tree was last laid out in by generate_treemap,
+        or None if there is no valid cached layout.
+    @type _layout_algorithm: callable | None
+        The layout algorithm used for the cached layout; see
+        generate_treemap.
+    @type _layout_min_area: int
+        The min_area used for the cached layout; see generate_treemap.
+    @type _layout_split: list[(AbstractTree, (int, int, int, int))] | None
+        The subtrees of this tree paired with their rectangles in the
+        cached layout, an empty list if nothing of this tree is drawn, or
+        None if it is drawn as one rectangle: it is a leaf, or smaller than
+        _layout_min_area.
+    @type _colour: int
+        The colour of this tree packed into one int, as 0xRRGGBB, or -1 if
+        it has not been chosen yet. Nodes use __slots__ and store no tuple,
+        to keep large trees compact.
+    @type _ancestry: AncestryIndex | None
+        If this tree has no parent, the index of its nodes' ancestry once
+        it has been built; see get_ancestry. Otherwise None.
+    @type _ancestry_id: int
+        The number of this tree in the AncestryIndex of its root, or -1.
     === Representation Invariants ===
     - data_size >= 0
     - If _subtrees is not empty, then data_size is equal to the sum of the
@@ -46,6 +69,10 @@ class AbstractTree:
       a bit easier).
     - if _parent_tree is not empty, then self is in _parent_tree._subtrees
     """
+    __slots__ = ('_root', '_subtrees', '_parent_tree', '_layout_rect',
+                 '_layout_algorithm', '_layout_min_area', '_layout_split',
+                 '_colour', '_ancestry', '_ancestry_id', 'data_size')
+
     def __init__(self, root, subtrees, data_size=0):
         """Initialize a new AbstractTree.
         If <subtrees> is empty, <data_size> is used to initialize this tree's
@@ -54,7 +81,8 @@ class AbstractTree:
         subtrees.
         If <subtrees> is not empty, <data_size> should not be specified.
         This method sets the _parent_tree attribute for each subtree to self.
-        A random colour is chosen for this tree.
+        This tree's colour is only chosen when it is first asked for; see
+        set_colour_policy.
         Precondition: if <root> is None, then <subtrees> is empty.
         @type self: AbstractTree
         @type root: object
@@ -65,11 +93,14 @@ class AbstractTree:
         self._root = root
         self._subtrees = subtrees
         self._parent_tree = None
+        self._layout_rect = None
+        self._layout_algorithm = None
+        self._layout_min_area = 0
+        self._layout_split = None
+        self._ancestry = None
+        self._ancestry_id = -1
         self.data_size = data_size
-        first_color_int = randint(0, 255)
-        second_color_int = randint(0, 255)
-        third_color_int = randint(0, 255)
-        self.colour = (first_color_int, second_color_int, third_color_int)
+        self._colour = -1
         for i in self._subtrees:
             if i.get_subtrees():
                 i._parent_tree = self
@@ -78,6 +109,50 @@ class AbstractTree:
                 i._parent_tree = self
                 self.data_size += i.data_size
 
+    # The colour policy of this class; see set_colour_policy.
+    _colour_policy = staticmethod(path_colour)
+
+    @classmethod
+    def set_colour_policy(cls, policy):
+        """Colour the nodes of trees of this class, and of its subclasses
+        that do not set their own policy, with <policy>: a function that
+        takes a node and returns its colour (see colours).
+        The policy is called once per node, the first time its colour is
+        asked for; nodes that already have a colour keep it.
+        @type cls: type
+        @type policy: callable
+        @rtype: None
+        """
+        cls._colour_policy = staticmethod(policy)
+
+    @property
+    def colour(self):
+        """The RGB colour value of the root of this tree, chosen by the
+        colour policy of its class when it is first asked for.
+        @type self: AbstractTree
+        @rtype: (int, int, int)
+        """
+        if self._colour < 0:
+            self.colour = self._colour_policy(self)
+        return (self._colour >> 16, (self._colour >> 8) & 255,
+                self._colour & 255)
+
+    @colour.setter
+    def colour(self, value):
+        """Set the RGB colour value of the root of this tree.
+        @type self: AbstractTree
+        @type value: (int, int, int)
+        @rtype: None
+        """
+        self._colour = (value[0] << 16) | (value[1] << 8) | value[2]
+
+    def has_colour(self):
+        """Return whether the colour of this tree has been chosen or set.
+        @type self: AbstractTree
+        @rtype: bool
+        """
+        return self._colour >= 0
+
     def is_empty(self):
         """Return True if this tree is empty.
         @type self: AbstractTree
@@ -85,50 +160,184 @@ class AbstractTree:
         """
         return self._root is None
 
-    def generate_treemap(self, rect):
+    def generate_treemap(self, rect, layout=None, min_area=0):
         """Run the treemap algorithm on this tree and return the rectangles.
         Each returned tuple contains a pygame rectangle and a colour:
         ((x, y, width, height), (r, g, b)).
         One tuple should be returned per non-empty leaf in this tree.
+        If <min_area> is positive, the algorithm does not descend into
+        subtrees whose rectangle covers fewer than <min_area> pixels;
+        instead, one tuple with the subtree's own colour stands for all of
+        its leaves. This caps the number of rectangles at about the number
+        of pixels in <rect>, however large the tree.
+        <layout> is the algorithm that divides a rectangle between the
+        subtrees of a node: a function taking the node and its rectangle and
+        returning its subtrees paired with their rectangles, like
+        _split_rect. If it is None, the slice-and-dice algorithm of
+        _split_rect is used; layouts has the alternatives.
+        The tree is walked with an explicit stack rather than recursion, so
+        trees of any depth can be laid out.
+        Every node caches its own rectangle and how it was divided between
+        its subtrees, together with the algorithm and min_area they were
+        computed for. A subtree whose rectangle is unchanged and which has
+        not been invalidated (see _invalidate_layout) reuses its cached
+        division instead of being laid out again, so the rectangles are
+        collected in one walk of the tree.
         @type self: AbstractTree
         @type rect: (int, int, int, int)
             Input is in the pygame format: (x, y, width, height)
+        @type layout: callable | None
+        @type min_area: int
         @rtype: list[((int, int, int, int), (int, int, int))]
         """
+        items = []
+        stack = [(self, tuple(rect))]
+        while stack:
+            tree, rect = stack.pop()
+            if not tree._has_layout(rect, layout, min_area):
+                tree._layout_split = tree._divide(rect, layout, min_area)
+                tree._layout_rect = rect
+                tree._layout_algorithm = layout
+                tree._layout_min_area = min_area
+            if tree._layout_split is None:
+                items.append((rect, tree.colour))
+            else:
+                stack.extend(reversed(tree._layout_split))
+        return items
+
+    def iter_treemap(self, rect, skip_subpixel=False, layout=None,
+                     min_area=0):
+        """Run the treemap algorithm on this tree, yielding the rectangles
+        one at a time as they are computed.
+        The rectangles and their order are those of generate_treemap, but
+        no list is built, so a caller can start drawing straight away and
+        memory use does not grow with the size of the tree. Subtrees with
+        an up-to-date cached layout (see generate_treemap) are divided as
+        cached; no new layouts are cached.
+        If <skip_subpixel> is True, the algorithm does not descend into
+        subtrees whose rectangle is less than one pixel wide or high, and
+        such rectangles are not yielded, since they cannot be seen.
+        <layout> is the layout algorithm and <min_area> the smallest area
+        a subtree is divided at, as for generate_treemap.
+        The tree must not be modified while the rectangles are consumed.
+        @type self: AbstractTree
+        @type rect: (int, int, int, int)
+            Input is in the pygame format: (x, y, width, height)
+        @type skip_subpixel: bool
+        @type layout: callable | None
+        @type min_area: int
+        @rtype: iterator[((int, int, int, int), (int, int, int))]
+        """
+        stack = [(self, tuple(rect))]
+        while stack:
+            tree, rect = stack.pop()
+            if skip_subpixel and (rect[2] < 1 or rect[3] < 1):
+                continue
+            elif tree._has_layout(rect, layout, min_area):
+                split = tree._layout_split
+            else:
+                split = tree._divide(rect, layout, min_area)
+            if split is None:
+                yield (rect, tree.colour)
+            else:
+                stack.extend(reversed(split))
+
+    def _divide(self, rect, layout, min_area):
+        """Return how this tree is laid out in <rect> with <layout> and
+        <min_area>, in the format of _layout_split.
+        @type self: AbstractTree
+        @type rect: (int, int, int, int)
+        @type layout: callable | None
+        @type min_area: int
+        @rtype: list[(AbstractTree, (int, int, int, int))] | None
+        """
+        if self.is_empty() or self.data_size == 0:
+            return []
+        elif len(self._subtrees) == 0 or (
+                min_area > 0 and rect[2] * rect[3] < min_area):
+            return None
+        elif layout is None:
+            return self._split_rect(rect)
+        return layout(self, rect)
+
+    def _has_layout(self, rect, layout, min_area):
+        """Return whether this tree has a valid cached layout for <rect>,
+        <layout> and <min_area>; see generate_treemap.
+        @type self: AbstractTree
+        @type rect: (int, int, int, int)
+        @type layout: callable | None
+        @type min_area: int
+        @rtype: bool
+        """
+        return (self._layout_rect == rect and
+                self._layout_algorithm is layout and
+                self._layout_min_area == min_area)
+
+    def is_aggregate(self):
+        """Return whether this tree has subtrees but was drawn as a single
+        rectangle in its latest layout, because its rectangle was smaller
+        than the min_area passed to generate_treemap.
+        @type self: AbstractTree
+        @rtype: bool
+        """
+        return (self._layout_rect is not None and len(self._subtrees) > 0 and
+                self._layout_min_area > 0 and
+                self._layout_rect[2] * self._layout_rect[3] <
+                self._layout_min_area)
+
+    def _invalidate_layout(self, node):
+        """Discard the cached layouts of <node> and all of its ancestors,
+        after <node>'s size has changed, and their colours too if the
+        colour policy depends on size (see colours.SIZE_POLICIES).
+        The siblings of changed nodes keep their caches: they are only
+        laid out again if the rectangle they are given changes.
+        @type self: AbstractTree
+        @type node: AbstractTree
+        @rtype: None
+        """
+        curr = node
+        while curr is not None:
+            curr._layout_rect = None
+            if curr._colour_policy in SIZE_POLICIES:
+                curr._colour = -1
+            curr = curr.get_parent()
+
+    def _split_rect(self, rect):
+        """Divide <rect> between the subtrees of this tree.
+        The rectangle is split along its longer side, each subtree getting
+        a share proportional to its data_size; the last subtree takes
+        whatever is left. Return the subtrees paired with their rectangles,
+        in order.
+        Precondition: self._subtrees is not empty and self.data_size > 0.
+        @type self: AbstractTree
+        @type rect: (int, int, int, int)
+        @rtype: list[(AbstractTree, (int, int, int, int))]
+        """
         x, y, width, height = rect
         width += x
         result = []
-        if self.is_empty() or self.data_size == 0:
-            return []
-        elif len(self._subtrees) == 0:
-            return [(rect, self.colour)]
-        else:
-            # is width is greater than height
-            if rect[2] > rect[3]:
-                for subtree in self._subtrees:
-                    if not self._subtrees[-1] == subtree:
-                        ratio_prop = (subtree.data_size /
-                                      self.data_size) * 100
-                        width_rect = int((ratio_prop * rect[2]) // 100)
-                        result += subtree.generate_treemap(
-                            (x, y, width_rect, rect[3]))
-                        x += width_rect
-                    else:
-                        result += subtree.generate_treemap(
-                            (x, y, width - x, rect[3]))
-            else:  # if height is greater than the width
-                for subtree in self._subtrees:
-                    if not self._subtrees[-1] == subtree:
-                        ratio_prop = (subtree.data_size /
-                                      self.data_size) * 100
-                        height_rect = int((ratio_prop * rect[3]) // 100)
-                        result += subtree.generate_treemap(
-                            (x, y, rect[2], height_rect))
-                        y += height_rect
-                    else:
-                        result += subtree.generate_treemap(
-                            (x, y, rect[2], height - y))
-            return result
+        # is width is greater than height
+        if rect[2] > rect[3]:
+            for subtree in self._subtrees:
+                if not self._subtrees[-1] == subtree:
+                    ratio_prop = (subtree.data_size /
+                                  self.data_size) * 100
+                    width_rect = int((ratio_prop * rect[2]) // 100)
+                    result.append((subtree, (x, y, width_rect, rect[3])))
+                    x += width_rect
+                else:
+                    result.append((subtree, (x, y, width - x, rect[3])))
+        else:  # if height is greater than the width
+            for subtree in self._subtrees:
+                if not self._subtrees[-1] == subtree:
+                    ratio_prop = (subtree.data_size /
+                                  self.data_size) * 100
+                    height_rect = int((ratio_prop * rect[3]) // 100)
+                    result.append((subtree, (x, y, rect[2], height_rect)))
+                    y += height_rect
+                else:
+                    result.append((subtree, (x, y, rect[2], height - y)))
+        return result
 
     def get_root(self):
         """Provides acccess to protected member of
@@ -150,19 +359,23 @@ class AbstractTree:
     def get_leaf(self):
         """
         Returns the list of leafs of the tree objects in the tree.
+        Leaves are listed in preorder, with empty subtrees left out. That is
+        not the order of the rectangles of generate_treemap in general:
+        layouts may reorder subtrees, and subtrees smaller than min_area are
+        drawn as one rectangle. The tree is walked with an explicit stack.
         @type self: AbstractTree
         @rtype: list[AbstractTree]
         """
         lst = []
-        if self.is_empty() or self.data_size == 0:
-            return []
-        else:
-            if self._subtrees:
-                for i in self._subtrees:
-                    if i.data_size != 0:
-                        lst += i.get_leaf()
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            if tree.is_empty() or tree.data_size == 0:
+                continue
+            elif tree._subtrees:
+                stack.extend(reversed(tree._subtrees))
             else:
-                lst.append(self)
+                lst.append(tree)
         return lst
 
     def get_separator(self):
@@ -203,6 +416,15 @@ class AbstractTree:
         """
         return self._subtrees
 
+    def _loaded_subtrees(self):
+        """Return the subtrees of this tree that exist in memory, without
+        creating any; subclasses that create their subtrees lazily (see
+        snapshot.SnapshotTree) return an empty list until they have.
+        @type self: AbstractTree
+        @rtype: list[AbstractTree]
+        """
+        return self._subtrees
+
     def remove_node(self, node):
         """
         Removes node from the tree and updates the tree
@@ -210,10 +432,29 @@ class AbstractTree:
         @type node: AbstractTree
         @rtype: None
         """
+        root = node
+        while root.get_parent() is not None:
+            root = root.get_parent()
+        if root._ancestry is not None:
+            root._ancestry.forget(node)
         node.get_parent().get_subtrees().remove(node)
         self.size_change(node)
+        self._invalidate_layout(node)
         node._parent_tree = None
 
+    def add_node(self, parent, node):
+        """Adds node as the last subtree of parent and updates the tree
+        @type self: AbstractTree
+        @type parent: AbstractTree
+        @type node: AbstractTree
+        @rtype: None
+        """
+        parent.get_subtrees().append(node)
+        node._parent_tree = parent
+        # Only a root keeps an ancestry index.
+        node._ancestry = None
+        self.size_up(parent, node.data_size)
+
     def size_up(self, node, number):
         """Raises the size of the node by given number and updates the tree
         @type self: AbstractTree
@@ -226,6 +467,7 @@ class AbstractTree:
         while curr.get_parent() is not None:
             curr = curr.get_parent()
             curr.data_size += number
+        self._invalidate_layout(node)
 
     def size_down(self, node, number):
         """Decreases the size of the node by given number and updates the tree
@@ -240,6 +482,7 @@ class AbstractTree:
             while curr.get_parent() is not None:
                 curr = curr.get_parent()
                 curr.data_size -= number
+            self._invalidate_layout(node)
 
     def size_change(self, node):
         """Helper for remove_node function. Subtracts the
@@ -256,36 +499,132 @@ class AbstractTree:
 
     def cordinate(self, x, y, lst):
         """Gets the node which cursor points
+        This is a leaf, or a subtree drawn as a single rectangle because it
+        was smaller than the min_area given to generate_treemap (see
+        is_aggregate).
+        <lst> is the result of the latest call to generate_treemap on this
+        tree. Rather than scanning <lst>, the leaf is found by descending
+        the layouts cached by generate_treemap, so the tree must be laid out
+        again after it changes: until then, None is returned. With the default
+        slice-and-dice layout, the subtree under the cursor is found at each
+        level by binary search, since the subtrees' rectangles are laid out
+        in order along one axis; other layouts check each subtree in turn.
+        Rectangles are half-open, as in pygame: a point on the left or top
+        edge of a rectangle is inside it, and a point on its right or bottom
+        edge belongs to the next rectangle.
         @type self: AbstractTree
         @type x: int
         @type y: int
         @type lst: list[tuple]
-        @rtype: AbstractTree
+        @rtype: AbstractTree | None
         """
-        a = self.get_leaf()
-        if a != []:
-            for i in lst:
-                if i[0][0] + i[0][2] > x > i[0][0]:
-                    if i[0][1] + i[0][3] > y > i[0][1]:
-                        return a[lst.index(i)]
-            return None
-        else:
-            return None
+        curr = self
+        while curr._layout_rect is not None and \
+                _contains(curr._layout_rect, x, y):
+            if curr.is_empty() or curr.data_size == 0:
+                return None
+            elif not curr._subtrees or curr.is_aggregate():
+                return curr
+            elif curr._layout_algorithm is not None:
+                curr = _search_subtrees(curr._subtrees, x, y)
+            elif curr._layout_rect[2] > curr._layout_rect[3]:
+                curr = _find_subtree(curr._subtrees, 0, x)
+            else:
+                curr = _find_subtree(curr._subtrees, 1, y)
+        return None
 
     def get_path(self, separator, node):
         """ Returns the path from root to the node
-        @type self: FileSystemTree
+        The path is looked up in the ancestry index of this tree (see
+        get_ancestry), so repeated queries take constant time.
+        @type self: AbstractTree
         @type separator: str
-        @type node: FileSystemTree
+        @type node: AbstractTree
         @rtype: str
         """
-        result_str = ""
-        curr = node
-        while curr.get_parent() is not None:
-            result_str = separator + str(curr.get_root()) + result_str
-            curr = curr.get_parent()
-        result_str = str(curr.get_root()) + result_str
-        return result_str
+        return self.get_ancestry().path(node, separator)
+
+    def get_depth(self, node):
+        """Return the depth of <node> in this tree; the root has depth 0.
+        @type self: AbstractTree
+        @type node: AbstractTree
+        @rtype: int
+        """
+        return self.get_ancestry().depth(node)
+
+    def is_ancestor(self, ancestor, node):
+        """Return whether <ancestor> is <node> or one of its ancestors.
+        @type self: AbstractTree
+        @type ancestor: AbstractTree
+        @type node: AbstractTree
+        @rtype: bool
+        """
+        return self.get_ancestry().is_ancestor(ancestor, node)
+
+    def get_ancestry(self):
+        """Return the ancestry index of the tree this tree belongs to,
+        building it the first time it is needed.
+        The index is kept on the root of the tree. It follows nodes being
+        removed with remove_node and added with add_node, so it never has
+        to be built again.
+        @type self: AbstractTree
+        @rtype: AncestryIndex
+        """
+        root = self
+        while root.get_parent() is not None:
+            root = root.get_parent()
+        if root._ancestry is None:
+            root._ancestry = AncestryIndex(root)
+        return root._ancestry
+
+
+def _contains(rect, x, y):
+    """Return whether the point (<x>, <y>) lies inside <rect>.
+    The rectangle includes its left and top edges but not its right and
+    bottom edges.
+    @type rect: (int, int, int, int)
+    @type x: int
+    @type y: int
+    @rtype: bool
+    """
+    return (rect[0] <= x < rect[0] + rect[2] and
+            rect[1] <= y < rect[1] + rect[3])
+
+
+def _find_subtree(subtrees, axis, position):
+    """Return the last of <subtrees> whose laid out rectangle starts at or
+    before <position> along <axis> (0 for x, 1 for y).
+    Precondition: subtrees is not empty, every subtree has a cached layout,
+    and their rectangles are in increasing order along <axis>.
+    @type subtrees: list[AbstractTree]
+    @type axis: int
+    @type position: int
+    @rtype: AbstractTree
+    """
+    low, high = 0, len(subtrees)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if subtrees[middle]._layout_rect[axis] <= position:
+            low = middle
+        else:
+            high = middle
+    return subtrees[low]
+
+
+def _search_subtrees(subtrees, x, y):
+    """Return the first of <subtrees> whose laid out rectangle contains
+    the point (<x>, <y>), or the first subtree if none does.
+    Precondition: subtrees is not empty and every subtree has a cached
+    layout.
+    @type subtrees: list[AbstractTree]
+    @type x: int
+    @type y: int
+    @rtype: AbstractTree
+    """
+    for subtree in subtrees:
+        if _contains(subtree._layout_rect, x, y):
+            return subtree
+    return subtrees[0]
 
 
 class FileSystemTree(AbstractTree):
@@ -295,26 +634,110 @@ class FileSystemTree(AbstractTree):
     The _root attribute stores the *name* of the folder or file, not its full
     path. E.g., store 'assignments', not '/Users/David/csc148/assignments'
     The data_size attribute for regular files as simply the size of the file,
-    as reported by os.path.getsize.
+    as decided by a ScanPolicy: by default its apparent size, counting
+    files with several hard links once. Symbolic links are not followed.
+    === Public Attributes ===
+    @type path: str
+        The full path of this file or folder. It is rebuilt on demand from
+        the names of this tree's ancestors, rather than stored in each node.
+    === Private Attributes ===
+    @type _path: str | None
+        The full path of this file or folder if it has no parent, else None.
     """
-    def __init__(self, path):
+    __slots__ = ('_path',)
+
+    def __init__(self, path, subtrees=None, data_size=0, policy=None):
         """Store the file tree structure contained in the given file or folder.
+        If <subtrees> is not None, the file system is not accessed at all:
+        <subtrees> and <data_size> are passed directly to the AbstractTree
+        constructor. This lets scanners (see fs_scanner) build the tree from
+        directory listings they have already made.
+        Otherwise files are sized by <policy>, or by a new ScanPolicy if it
+        is None.
         Precondition: <path> is a valid path for this computer.
         @type self: FileSystemTree
         @type path: str
+        @type subtrees: list[FileSystemTree] | None
+        @type data_size: int
+        @type policy: ScanPolicy | None
         @rtype: None
         """
         self._subtrees = []
-        self.path = path
+        self._path = path
         get_name = self.separate(path)  # getname[-1]  is main root
-        if os.path.isfile(path):
-            AbstractTree.__init__(self, get_name[-1], [], os.path.getsize(path))
+        if policy is None and subtrees is None:
+            policy = ScanPolicy()
+        if subtrees is not None:
+            AbstractTree.__init__(self, get_name[-1], subtrees, data_size)
+        elif os.path.isfile(path):
+            AbstractTree.__init__(self, get_name[-1], [],
+                                  policy.size(os.stat(path), path))
         else:
-            lst = os.listdir(path)
-            for filename in lst:
-                subitem = os.path.join(path, filename)
-                self._subtrees.append(FileSystemTree(subitem))
+            policy.start(path)
+            self._subtrees = self._scan_subtrees(path, policy)
             AbstractTree.__init__(self, get_name[-1], self._subtrees, 0)
+        for subtree in self._subtrees:
+            # Subtrees rebuild their paths from this tree's.
+            subtree._path = None
+
+    @property
+    def path(self):
+        """The full path of this file or folder.
+        @type self: FileSystemTree
+        @rtype: str
+        """
+        names = []
+        curr = self
+        while curr._path is None and curr.get_parent() is not None:
+            names.append(curr.get_root())
+            curr = curr.get_parent()
+        if curr._path is None:
+            # A node removed from its tree only knows its own name.
+            names.append(curr.get_root())
+        else:
+            names.append(curr._path)
+        names.reverse()
+        return os.path.join(*names)
+
+    def _scan_subtrees(self, path, policy):
+        """Return the subtrees of the folder at <path>, sized by <policy>.
+        Folders are listed with an explicit stack instead of recursion, so
+        arbitrarily deep folders can be scanned. Every folder below <path> is
+        listed first, then the nodes are built bottom-up (in reverse listing
+        order), so each folder's subtrees exist before the folder does.
+        @type self: FileSystemTree
+        @type path: str
+        @type policy: ScanPolicy
+        @rtype: list[FileSystemTree]
+        """
+        listings = {}
+        order = []
+        stack = [path]
+        while stack:
+            dir_path = stack.pop()
+            order.append(dir_path)
+            entries = []
+            for filename in os.listdir(dir_path):
+                subitem = os.path.join(dir_path, filename)
+                # lstat does not follow symbolic links.
+                info = os.lstat(subitem)
+                if stat.S_ISDIR(info.st_mode) and policy.enters(info):
+                    entries.append((subitem, None))
+                    stack.append(subitem)
+                else:
+                    entries.append((subitem, policy.size(info, subitem)))
+            listings[dir_path] = entries
+        built = {}
+        for dir_path in reversed(order):
+            subtrees = []
+            for subitem, size in listings.pop(dir_path):
+                if size is not None:
+                    subtrees.append(FileSystemTree(subitem, [], size))
+                else:
+                    subtrees.append(FileSystemTree(subitem,
+                                                   built.pop(subitem)))
+            built[dir_path] = subtrees
+        return built[path]
 
     def separate(self, path):
         """
@@ -10,9 +10,22 @@ concrete subclass, of course), rendering it to the user using pygame,
 and detecting user events like mouse clicks and key presses and responding
 to them.
 """
+import argparse
 import pygame
-from tree_data import FileSystemTree
-from population import PopulationTree
+from fs_scanner import scan_tree, scan_tree_sharded, DEFAULT_WORKERS
+from scan_policy import ScanPolicy
+from snapshot import save_snapshot, load_snapshot
+from rescan import refresh_snapshot
+from watch import TreeWatcher
+from layouts import LAYOUTS
+from renderer import TreemapRenderer, get_font
+from zoom import ZoomView
+from population import PopulationTree, POPULATION_INDICATOR, DEFAULT_YEAR
+from tabular import load_table
+from tree_data import AbstractTree
+from colours import COLOUR_POLICIES
+from worldbank import WorldBankClient, WORLD_BANK_BASE
+from profiling import Profiler
 # Screen dimensions and coordinates
 ORIGIN = (0, 0)
 WIDTH = 768
@@ -21,37 +34,84 @@ FONT_HEIGHT = 30                       # The height of the text display.
 TREEMAP_HEIGHT = HEIGHT - FONT_HEIGHT  # The height of the treemap display.
 # Font to use for the treemap program.
 FONT_FAMILY = 'Consolas'
+# How many times per second the event loop checks for file system changes.
+FRAME_RATE = 30
+# Subtrees whose rectangle covers fewer pixels than this are drawn as one
+# rectangle instead of being divided; see AbstractTree.generate_treemap.
+MIN_AREA = 4
 
 
-def run_visualisation(tree):
+def run_visualisation(tree, watcher=None, layout=None, min_area=MIN_AREA,
+                      overlay=None):
     """Display an interactive graphical display of the given tree's treemap.
+    If <watcher> is given, it is started on <tree> and the display follows
+    changes to the file system; see watch.
+    <layout> is the treemap layout algorithm; see layouts. None selects
+    the default slice-and-dice layout.
+    Subtrees smaller than <min_area> pixels are drawn as one rectangle.
+    If <overlay> is given, the lines of its summary are shown over the
+    treemap; see TreemapRenderer.overlay.
+    Return how long each frame took to draw.
     @type tree: AbstractTree
-    @rtype: None
+    @type watcher: TreeWatcher | None
+    @type layout: callable | None
+    @type min_area: int
+    @type overlay: Profiler | None
+    @rtype: FrameTimes
     """
     # Setup pygame
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    renderer = make_renderer(screen, layout, min_area)
+    renderer.overlay = overlay
     # Render the initial display of the static treemap.
-    render_display(screen, tree, '')
+    renderer.render(tree, '')
     # Start an event loop to respond to events.
-    event_loop(screen, tree)
+    if watcher is None:
+        event_loop(screen, tree, None, layout, min_area, renderer)
+    else:
+        watcher.start(tree)
+        try:
+            event_loop(screen, tree, watcher, layout, min_area, renderer)
+        finally:
+            watcher.stop()
+    return renderer.frame_times
+
 
+def make_renderer(screen, layout=None, min_area=MIN_AREA):
+    """Return a TreemapRenderer that draws to <screen> like
+    render_display, but only redraws what changed between frames.
+    @type screen: pygame.Surface
+    @type layout: callable | None
+    @type min_area: int
+    @rtype: TreemapRenderer
+    """
+    return TreemapRenderer(screen, (0, 0, WIDTH, HEIGHT),
+                           (0, TREEMAP_HEIGHT, WIDTH, FONT_HEIGHT), layout,
+                           min_area, (FONT_FAMILY, FONT_HEIGHT - 8))
 
-def render_display(screen, tree, text):
+
+def render_display(screen, tree, text, layout=None, min_area=MIN_AREA):
     """Render a treemap and text display to the given screen.
     Use the constants TREEMAP_HEIGHT and FONT_HEIGHT to divide the
     screen vertically into the treemap and text comments.
+    Everything is drawn again; the event loop instead uses a renderer
+    from make_renderer, which only redraws what changed.
     @type screen: pygame.Surface
     @type tree: AbstractTree
     @type text: str
         The text to render.
+    @type layout: callable | None
+        The treemap layout algorithm; see layouts.
+    @type min_area: int
+        Subtrees covering fewer pixels than this are drawn as one rectangle.
     @rtype: None
     """
     # First, clear the screen
     pygame.draw.rect(screen, pygame.color.THECOLORS['black'],
                      (0, 0, WIDTH, HEIGHT))
-    lst = tree.generate_treemap((0, 0, WIDTH, HEIGHT))
-    for item in lst:
+    for item in tree.iter_treemap((0, 0, WIDTH, HEIGHT), True, layout,
+                                  min_area):
         pygame.draw.rect(screen, item[-1], item[0])
     pygame.draw.rect(screen, pygame.color.THECOLORS['black'],
                      (0, TREEMAP_HEIGHT, WIDTH, FONT_HEIGHT))
@@ -66,114 +126,408 @@ def _render_text(screen, text):
     @rtype: None
     """
     # The font we want to use
-    font = pygame.font.SysFont(FONT_FAMILY, FONT_HEIGHT - 8)
+    font = get_font(FONT_FAMILY, FONT_HEIGHT - 8)
     text_surface = font.render(text, 1, pygame.color.THECOLORS['white'])
     # Where to render the text_surface
     text_pos = (0, HEIGHT - FONT_HEIGHT + 4)
     screen.blit(text_surface, text_pos)
 
 
-def event_loop(screen, tree):
+def event_loop(screen, tree, watcher=None, layout=None, min_area=MIN_AREA,
+               renderer=None):
     """Respond to events (mouse clicks, key presses) and update the display.
     Note that the event loop is an *infinite loop*: it continually waits for
     the next event, determines the event's type, and then updates the state
     of the visualisation or the tree itself, updating the display if necessary.
     This loop ends when the user closes the window.
+    When there are no events, the changes found by <watcher>, if given, are
+    applied to the tree, redrawing at most once per frame.
+    The treemap is laid out with <layout>; see layouts. Subtrees smaller
+    than <min_area> pixels are drawn, selected and deleted as a whole, but
+    cannot be resized.
+    A middle click zooms in on the subtree under the cursor, and Backspace
+    or Escape zooms back out; only the subtree in view is laid out and
+    drawn. See zoom.
+    The display is updated by <renderer>, or by a new renderer from
+    make_renderer if it is None.
     @type screen: pygame.Surface
     @type tree: AbstractTree
+    @type watcher: TreeWatcher | None
+    @type layout: callable | None
+    @type min_area: int
+    @type renderer: TreemapRenderer | None
     @rtype: None
     """
+    if renderer is None:
+        renderer = make_renderer(screen, layout, min_area)
+    zoom = ZoomView(tree, (0, 0, WIDTH, HEIGHT), layout, min_area)
     # We strongly recommend using a variable to keep track of the currently-
     # selected leaf (type AbstractTree | None).
     # But feel free to remove it, and/or add new variables, to help keep
     # track of the state of the program.
     selected_leaf = None
+    clock = pygame.time.Clock()
     while True:
         # Wait for an event
         event = pygame.event.poll()
-        if event.type == pygame.QUIT:
+        if event.type == pygame.NOEVENT:
+            if watcher is not None and watcher.apply_changes(tree):
+                zoom.tree_changed()
+                if selected_leaf is not None and \
+                        not tree.is_ancestor(tree, selected_leaf):
+                    selected_leaf = None
+                renderer.render(zoom.view,
+                                _status_text(tree, zoom.view, selected_leaf),
+                                zoom.treemap())
+            clock.tick(FRAME_RATE)
+        elif event.type == pygame.QUIT:
             return
+        elif event.type == pygame.VIDEOEXPOSE:
+            renderer.refresh()
         elif event.type == pygame.MOUSEBUTTONUP:
             x, y = event.pos
 
             if event.button:
-                a = tree.generate_treemap((0, 0, WIDTH, HEIGHT))
                 if event.button == 1:
 
                     # Left click
-                    if selected_leaf is None:
-                        selected_leaf = tree.cordinate(x, y, a)
-                        if selected_leaf is not None:
-                            a = tree.get_separator()
-                            render_display(screen, tree,
-                                           tree.get_path(a, selected_leaf) +
-                                           "   " + "(" +
-                                           str(selected_leaf.data_size) + ")")
-                    elif selected_leaf == tree.cordinate(x, y, a):
+                    node = zoom.node_at(x, y)
+                    if selected_leaf is not None and selected_leaf == node:
                         selected_leaf = None
-                        render_display(screen, tree, "")
+                    elif node is not None:
+                        selected_leaf = node
                     else:
-                        selected_leaf = tree.cordinate(x, y, a)
-                        if selected_leaf is not None:
-                            a = tree.get_separator()
-                            render_display(screen, tree,
-                                           tree.get_path(a, selected_leaf) +
-                                           "   " + "(" +
-                                           str(selected_leaf.data_size) + ")")
+                        continue
+                elif event.button == 2:   # Middle click: zoom in
+                    if not zoom.zoom_in(x, y):
+                        continue
+                    selected_leaf = None
                 elif event.button == 3:   # Right click
-                    selected_leaf = tree.cordinate(x, y, a)
-                    if selected_leaf is not None:
-                        tree.remove_node(selected_leaf)
-                        render_display(screen, tree, "")
-                        selected_leaf = None
+                    selected_leaf = zoom.node_at(x, y)
+                    if selected_leaf is None:
+                        continue
+                    tree.remove_node(selected_leaf)
+                    zoom.tree_changed()
+                    selected_leaf = None
+                else:
+                    continue
+                renderer.render(zoom.view,
+                                _status_text(tree, zoom.view, selected_leaf),
+                                zoom.treemap())
         elif event.type == pygame.KEYUP:
-            if selected_leaf is None:
-                pass
+            if event.key in (pygame.K_BACKSPACE, pygame.K_ESCAPE):
+                # Zoom out to the parent of the view.
+                if not zoom.zoom_out():
+                    continue
+                selected_leaf = None
+            elif selected_leaf is None or selected_leaf.get_subtrees():
+                # Nothing selected, or a subtree drawn as one rectangle.
+                continue
+            elif event.key == pygame.K_UP:
+                number_up = tree.ceiling_(selected_leaf)
+                tree.size_up(selected_leaf, number_up)
+                zoom.tree_changed()
+            elif event.key == pygame.K_DOWN:
+                number_down = tree.ceiling_(selected_leaf)
+                tree.size_down(selected_leaf, number_down)
+                zoom.tree_changed()
             else:
-                if event.key == pygame.K_UP:
-                    number_up = tree.ceiling_(selected_leaf)
-                    tree.size_up(selected_leaf, number_up)
-                    a = tree.get_separator()
-                    render_display(screen, tree,
-                                   tree.get_path(a, selected_leaf) +
-                                   "   " + "(" +
-                                   str(selected_leaf.data_size) + ")")
-                elif event.key == pygame.K_DOWN:
-                    number_down = tree.ceiling_(selected_leaf)
-                    tree.size_down(selected_leaf, number_down)
-                    a = tree.get_separator()
-                    render_display(screen, tree,
-                                   tree.get_path(a, selected_leaf) +
-                                   "   " + "(" +
-                                   str(selected_leaf.data_size) + ")")
-
-
-def run_treemap_file_system(path):
+                continue
+            renderer.render(zoom.view,
+                            _status_text(tree, zoom.view, selected_leaf),
+                            zoom.treemap())
+
+
+def _status_text(tree, view, node):
+    """Return the text line to show for the selected <node> of <tree>,
+    while <view> is in view: the path and size of <node>, or the path of
+    <view> if nothing is selected and the view is zoomed in.
+    @type tree: AbstractTree
+    @type view: AbstractTree
+    @type node: AbstractTree | None
+    @rtype: str
+    """
+    a = tree.get_separator()
+    if node is not None:
+        return (tree.get_path(a, node) + "   " + "(" + str(node.data_size) +
+                ")")
+    elif view is tree:
+        return ""
+    else:
+        return tree.get_path(a, view)
+
+
+def run_treemap_file_system(path, workers=DEFAULT_WORKERS, snapshot=None,
+                            watch=False, layout=None, min_area=MIN_AREA,
+                            policy=None, top=None, min_size=None,
+                            processes=1, overlay=None):
     """Run a treemap visualisation for the given path's file structure.
+    The folder is scanned by <workers> threads in each of <processes>
+    processes; see fs_scanner.
+    If <snapshot> is given, the scan is also saved to that snapshot file.
+    If <watch> is True, the treemap is kept up to date as files are created,
+    deleted and resized.
+    <layout>, <min_area> and <overlay> are as for run_visualisation.
+    Files are sized by <policy>, or by a new ScanPolicy if it is None; see
+    scan_policy. If <top> or <min_size> is given, only the largest entries
+    of each folder are kept; see fs_scanner.scan_tree. A pruned tree
+    cannot be watched, nor scanned by several processes.
     Precondition: <path> is a valid path to a file or folder.
     @type path: str
-    @rtype: None
+    @type workers: int
+    @type snapshot: str | None
+    @type watch: bool
+    @type layout: callable | None
+    @type min_area: int
+    @type policy: ScanPolicy | None
+    @type top: int | None
+    @type min_size: int | None
+    @type processes: int
+    @type overlay: Profiler | None
+    @rtype: FrameTimes
+    """
+    if policy is None:
+        policy = ScanPolicy()
+    stamps = None if snapshot is None else {}
+    if processes > 1:
+        file_tree = scan_tree_sharded(path, processes, workers, stamps,
+                                      policy)
+    else:
+        file_tree = scan_tree(path, workers, stamps, policy=policy, top=top,
+                              min_size=min_size)
+    if snapshot is not None:
+        save_snapshot(file_tree, snapshot, stamps)
+    watcher = TreeWatcher(policy=policy) if watch else None
+    return run_visualisation(file_tree, watcher, layout, min_area, overlay)
+
+
+def run_treemap_snapshot(snapshot, refresh=False, workers=DEFAULT_WORKERS,
+                         layout=None, min_area=MIN_AREA, policy=None,
+                         overlay=None):
+    """Run a treemap visualisation for a file structure saved earlier in
+    a snapshot file; see snapshot.
+    If <refresh> is True, the snapshot is first brought up to date with
+    the file system and saved again, sizing files by <policy>; see rescan.
+    <layout>, <min_area> and <overlay> are as for run_visualisation.
+    @type snapshot: str
+    @type refresh: bool
+    @type workers: int
+    @type layout: callable | None
+    @type min_area: int
+    @type policy: ScanPolicy | None
+    @type overlay: Profiler | None
+    @rtype: FrameTimes
+    """
+    if refresh:
+        tree = refresh_snapshot(snapshot, workers, policy)
+    else:
+        tree = load_snapshot(snapshot)
+    return run_visualisation(tree, None, layout, min_area, overlay)
+
+
+def run_treemap_population(layout=None, min_area=MIN_AREA, offline=False,
+                           base_url=WORLD_BANK_BASE,
+                           indicator=POPULATION_INDICATOR, year=DEFAULT_YEAR,
+                           overlay=None):
+    """Run a treemap visualisation for World Bank population data, or the
+    data of another World Bank indicator <indicator> in <year>.
+    <layout>, <min_area> and <overlay> are as for run_visualisation. The
+    data is fetched from <base_url>, or only read from the cache if
+    <offline> is True; see worldbank.
+    @type layout: callable | None
+    @type min_area: int
+    @type offline: bool
+    @type base_url: str
+    @type indicator: str
+    @type year: str
+    @type overlay: Profiler | None
+    @rtype: FrameTimes
     """
-    file_tree = FileSystemTree(path)
-    run_visualisation(file_tree)
+    client = WorldBankClient(base_url, offline=offline)
+    pop_tree = PopulationTree(True, client=client, indicator=indicator,
+                              year=year)
+    return run_visualisation(pop_tree, None, layout, min_area, overlay)
 
 
-def run_treemap_population():
-    """Run a treemap visualisation for World Bank population data.
+def run_treemap_table(filename, hierarchy, size, separator='/', split=None,
+                      header=True, layout=None, min_area=MIN_AREA,
+                      overlay=None):
+    """Run a treemap visualisation for the rows of the CSV or JSON lines
+    file <filename>. <hierarchy>, <size>, <separator>, <split> and
+    <header> are as for tabular.load_table, and <layout>, <min_area> and
+    <overlay> as for run_visualisation.
+    @type filename: str
+    @type hierarchy: str
+    @type size: str
+    @type separator: str
+    @type split: str | None
+    @type header: bool
+    @type layout: callable | None
+    @type min_area: int
+    @type overlay: Profiler | None
+    @rtype: FrameTimes
+    """
+    tree = load_table(filename, hierarchy, size, separator, split,
+                      header=header)
+    return run_visualisation(tree, None, layout, min_area, overlay)
+
+
+def main(argv=None):
+    """Parse the command line and run the requested visualisation.
+    @type argv: list[str] | None
     @rtype: None
     """
-    pop_tree = PopulationTree(True)
-    run_visualisation(pop_tree)
+    parser = argparse.ArgumentParser(
+        description='Show an interactive treemap of a folder, a saved scan '
+                    'snapshot, a table or World Bank population data.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('path', nargs='?',
+                        help='the file or folder to scan')
+    source.add_argument('--snapshot', metavar='FILE',
+                        help='visualise a saved snapshot instead of a '
+                             'live path')
+    source.add_argument('--population', action='store_true',
+                        help='visualise World Bank population data')
+    source.add_argument('--table', metavar='FILE',
+                        help='visualise the rows of a CSV or JSON lines file '
+                             '(- for standard input)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='threads used to scan <path>, in each process')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='split the scan of <path> across this many '
+                             'processes')
+    parser.add_argument('--save-snapshot', metavar='FILE',
+                        help='also save the scan of <path> to FILE')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep the treemap of <path> up to date as files '
+                             'change')
+    parser.add_argument('--refresh', action='store_true',
+                        help='bring the --snapshot up to date with the file '
+                             'system, rescanning only changed directories')
+    parser.add_argument('--disk-usage', action='store_true',
+                        help='size files by the disk blocks they use rather '
+                             'than their apparent size')
+    parser.add_argument('--count-links', action='store_true',
+                        help='count a file with several hard links at every '
+                             'link, not just the first')
+    parser.add_argument('--one-file-system', action='store_true',
+                        help='do not enter folders on other file systems')
+    parser.add_argument('--top', type=int, metavar='N',
+                        help='keep only the N largest entries of each folder, '
+                             'folding the rest into one "other" rectangle')
+    parser.add_argument('--min-size', type=int, metavar='BYTES',
+                        help='keep entries of at least BYTES even if they are '
+                             'not among the --top largest')
+    parser.add_argument('--offline', action='store_true',
+                        help='read --population data only from the cache, '
+                             'without contacting the World Bank')
+    parser.add_argument('--world-bank-url', default=WORLD_BANK_BASE,
+                        help='the World Bank API to fetch --population data '
+                             'from')
+    parser.add_argument('--indicator', default=POPULATION_INDICATOR,
+                        help='the World Bank indicator shown by --population')
+    parser.add_argument('--year', default=DEFAULT_YEAR,
+                        help='the year, or range of years such as 2010:2014, '
+                             'of the --population data')
+    parser.add_argument('--hierarchy', metavar='SPEC',
+                        help='the --table columns giving the levels of the '
+                             'tree, joined by /, e.g. region/country/city')
+    parser.add_argument('--size', metavar='COLUMN',
+                        help='the --table column giving the size of a row')
+    parser.add_argument('--separator', default='/',
+                        help='the separator shown between levels of a '
+                             '--table path')
+    parser.add_argument('--split', metavar='STRING',
+                        help='also split --table hierarchy values on STRING, '
+                             'e.g. / for file paths')
+    parser.add_argument('--no-header', action='store_true',
+                        help='the --table has no header row; columns are '
+                             'given by number, from 0')
+    parser.add_argument('--colours', choices=sorted(COLOUR_POLICIES),
+                        default='path',
+                        help='how rectangles are coloured: by a hash of '
+                             'their path, by extension, by size or at random')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS),
+                        default='slice-and-dice',
+                        help='the treemap layout algorithm')
+    parser.add_argument('--min-area', type=int, default=MIN_AREA,
+                        help='draw subtrees covering fewer pixels than this '
+                             'as a single rectangle (0 draws every file)')
+    parser.add_argument('--frame-times', action='store_true',
+                        help='print a histogram of frame times on exit')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='measure scanning, layout, hit-testing and '
+                             'rendering, and save the results to FILE as '
+                             'JSON on exit')
+    parser.add_argument('--overlay', action='store_true',
+                        help='measure as for --profile and show the results '
+                             'over the treemap')
+    args = parser.parse_args(argv)
+    layout = LAYOUTS[args.layout]
+    AbstractTree.set_colour_policy(COLOUR_POLICIES[args.colours])
+    policy = ScanPolicy(args.disk_usage, not args.count_links,
+                        args.one_file_system)
+    profiler = None
+    if args.profile is not None or args.overlay:
+        profiler = Profiler()
+        profiler.install()
+    try:
+        frame_times = _run(parser, args, layout, policy,
+                           profiler if args.overlay else None)
+    finally:
+        if profiler is not None:
+            profiler.uninstall()
+            if args.profile is not None:
+                profiler.dump(args.profile)
+    if args.frame_times:
+        print(frame_times)
+
+
+def _run(parser, args, layout, policy, overlay):
+    """Run the treemap visualisation chosen by the command line
+    arguments <args>, parsed by <parser>, and return how long each frame
+    took to draw. <layout> and <policy> are those chosen by <args>, and
+    <overlay> is as for run_visualisation.
+    @type parser: argparse.ArgumentParser
+    @type args: argparse.Namespace
+    @type layout: callable | None
+    @type policy: ScanPolicy
+    @type overlay: Profiler | None
+    @rtype: FrameTimes
+    """
+    if args.snapshot is not None:
+        frame_times = run_treemap_snapshot(args.snapshot, args.refresh,
+                                           args.workers, layout,
+                                           args.min_area, policy, overlay)
+    elif args.table is not None:
+        if args.hierarchy is None or args.size is None:
+            parser.error('--table needs --hierarchy and --size')
+        frame_times = run_treemap_table(args.table, args.hierarchy,
+                                        args.size, args.separator,
+                                        args.split, not args.no_header,
+                                        layout, args.min_area, overlay)
+    elif args.population:
+        frame_times = run_treemap_population(layout, args.min_area,
+                                             args.offline,
+                                             args.world_bank_url,
+                                             args.indicator, args.year,
+                                             overlay)
+    else:
+        if args.watch and (args.top is not None or
+                           args.min_size is not None):
+            parser.error('--watch cannot follow a tree pruned by --top or '
+                         '--min-size')
+        if args.processes > 1 and (args.top is not None or
+                                   args.min_size is not None):
+            parser.error('--processes cannot be combined with --top or '
+                         '--min-size')
+        frame_times = run_treemap_file_system(args.path, args.workers,
+                                              args.save_snapshot, args.watch,
+                                              layout, args.min_area, policy,
+                                              args.top, args.min_size,
+                                              args.processes, overlay)
+    return frame_times
 
 
 if __name__ == '__main__':
-    import python_ta
-    # Remember to change this to check_all when cleaning up your code.
-    python_ta.check_all(config='pylintrc.txt')
-    # To check your work for Tasks 1-4, try uncommenting the following function
-    # call, with the '' replaced by a path like
-    # 'C:\\Users\\David\\Documents\\csc148\\assignments' (Windows) or
-    # '/Users/dianeh/Documents/courses/csc148/assignments' (OSX)
-    run_treemap_file_system('/Users/jafarlielvin/Desktop/Elvin')
-    # To check your work for Task 5, uncomment the following function call.
-    # run_treemap_population()
+    main()
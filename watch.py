@@ -0,0 +1,563 @@
+"""Treemap Visualiser: Watching the File System
+=== Module Description ===
+This module keeps a FileSystemTree up to date while it is being shown.
+
+A TreeWatcher runs a background thread that notices files and folders
+being created, deleted or changing size under the tree's path. On Linux it
+is woken up by inotify, which is called through ctypes; elsewhere, or if
+inotify cannot watch every folder, it lists every folder again at a fixed
+interval. A folder created later that inotify cannot watch is polled at
+that interval on its own. Either way, a changed folder is listed and
+compared with what the watcher saw last time, and the differences are
+queued.
+
+The thread never touches the tree itself. The visualiser calls
+apply_changes once per frame, which applies every queued change with the
+AbstractTree methods that keep data_size up to date along the ancestor
+chain, so a burst of changes costs one redraw.
+
+Entries are sized, and links handled, by the watcher's ScanPolicy (see
+scan_policy), which should be the one the tree was scanned with. When the
+link a file with several hard links is counted at is removed, the policy
+forgets the file, so that the next of its links to be listed is counted.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+
+from tree_data import FileSystemTree
+from fs_scanner import scan_tree
+from scan_policy import ScanPolicy
+
+
+# How often, in seconds, the polling backend lists every folder again.
+POLL_INTERVAL = 1.0
+
+# inotify event masks, from <sys/inotify.h>.
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_ONLYDIR = 0x1000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+               _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR)
+# wd, mask, cookie, name length
+_EVENT = struct.Struct('iIII')
+
+
+class TreeWatcher:
+    """Watches the file system under a FileSystemTree for changes.
+    === Private Attributes ===
+    @type _listings: dict[str, dict[str, (bool, int, int | None)]]
+        For every folder under _root, the entries it had when last listed,
+        mapping each name to (is_directory, size, key), where key is the
+        ScanPolicy.file_key of a regular file, or None if it is not one or
+        has not been listed by the watcher yet. Only used by the thread.
+    @type _changes: queue.Queue
+        Changes noticed by the thread and not yet applied to the tree.
+    @type _stop: threading.Event
+        Set to make the thread exit.
+    @type _thread: threading.Thread | None
+        The background thread, or None if it is not running.
+    @type _interval: float
+        How often the polling backend lists every folder, in seconds.
+    @type _policy: ScanPolicy
+        How entries are sized.
+    @type _unwatched: set[str]
+        Folders inotify could not watch, e.g. because the limit on the
+        number of watches was reached; they are polled every _interval
+        seconds instead. Only used by the thread.
+    @type _owners: dict[int, str]
+        The path every regular file listed by the watcher is counted at,
+        by key. A file that gains a hard link keeps being counted there,
+        even if it had one link when it was first counted. Only used by
+        the thread.
+    @type _links: dict[int, set[str]]
+        The other links of the files in _owners that have several, which
+        have size 0, by key. When the link a file is counted at is removed,
+        their folders are listed again so one of them takes over. Only used
+        by the thread.
+    @type _stale: set[str]
+        Folders to list again once the current ones are listed, because a
+        file with a link in them lost the link it was counted at. Only used
+        by the thread.
+    """
+    def __init__(self, interval=POLL_INTERVAL, policy=None):
+        """Initialize a new TreeWatcher, which is not watching anything yet.
+        Entries are sized by <policy>, or by a new ScanPolicy if it is None.
+        @type self: TreeWatcher
+        @type interval: float
+        @type policy: ScanPolicy | None
+        @rtype: None
+        """
+        self._listings = {}
+        self._changes = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._interval = interval
+        self._policy = policy if policy is not None else ScanPolicy()
+        self._unwatched = set()
+        self._owners = {}
+        self._links = {}
+        self._stale = set()
+
+    def start(self, tree):
+        """Start watching the file system under <tree> in the background.
+        The watcher's starting point is <tree> itself, so anything that
+        changed since <tree> was scanned is reported on the first pass.
+        @type self: TreeWatcher
+        @type tree: FileSystemTree
+        @rtype: None
+        """
+        self._policy.start(tree.path)
+        self._listings = _listings_of(tree, self._policy)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching, waiting for the background thread to exit.
+        @type self: TreeWatcher
+        @rtype: None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def apply_changes(self, tree):
+        """Apply every change noticed so far to <tree>, the tree that was
+        passed to start. Return the number of changes applied.
+        Must be called from the thread that owns <tree>.
+        @type self: TreeWatcher
+        @type tree: FileSystemTree
+        @rtype: int
+        """
+        count = 0
+        while True:
+            try:
+                change = self._changes.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+            kind, path, value = change
+            node = _find_node(tree, path)
+            if node is None:
+                continue
+            if kind == 'create':
+                tree.add_node(node, value)
+            elif kind == 'delete' and node is not tree:
+                tree.remove_node(node)
+            elif kind == 'resize' and value > node.data_size:
+                tree.size_up(node, value - node.data_size)
+            elif kind == 'resize' and value < node.data_size:
+                if value >= 1:
+                    tree.size_down(node, node.data_size - value)
+                else:
+                    # size_down never shrinks a node below 1.
+                    tree.size_up(node, value - node.data_size)
+
+    def _run(self):
+        """Watch for changes until stop is called, using inotify if it is
+        available and polling otherwise.
+        @type self: TreeWatcher
+        @rtype: None
+        """
+        inotify = _Inotify.create()
+        if inotify is not None:
+            try:
+                for dir_path in list(self._listings):
+                    inotify.add_watch(dir_path)
+            except OSError:
+                # Usually the limit on the number of watches.
+                inotify.close()
+                inotify = None
+        # Catch up on anything that changed before the watches existed.
+        self._rescan_all(inotify)
+        if inotify is None:
+            while not self._stop.wait(self._interval):
+                self._rescan_all()
+        else:
+            polled = time.monotonic()
+            try:
+                while not self._stop.is_set():
+                    dirs = inotify.read_changed(0.5)
+                    if dirs is None:
+                        self._rescan_all(inotify)
+                    for dir_path in dirs or ():
+                        self._rescan(dir_path, inotify)
+                    self._rescan_stale(inotify)
+                    if self._unwatched and \
+                            time.monotonic() - polled >= self._interval:
+                        polled = time.monotonic()
+                        self._unwatched.intersection_update(self._listings)
+                        for dir_path in list(self._unwatched):
+                            self._rescan(dir_path, inotify)
+            finally:
+                inotify.close()
+
+    def _rescan_all(self, inotify=None):
+        """List every watched folder again.
+        @type self: TreeWatcher
+        @type inotify: _Inotify | None
+        @rtype: None
+        """
+        for dir_path in list(self._listings):
+            self._rescan(dir_path, inotify)
+        self._rescan_stale(inotify)
+
+    def _rescan_stale(self, inotify=None):
+        """List the folders in _stale again.
+        @type self: TreeWatcher
+        @type inotify: _Inotify | None
+        @rtype: None
+        """
+        while self._stale:
+            self._rescan(self._stale.pop(), inotify)
+
+    def _rescan(self, dir_path, inotify=None):
+        """List the folder <dir_path> again and queue its changes since it
+        was last listed. New folders are scanned in full, and watched with
+        <inotify> if it is given.
+        @type self: TreeWatcher
+        @type dir_path: str
+        @type inotify: _Inotify | None
+        @rtype: None
+        """
+        old = self._listings.get(dir_path)
+        if old is None:
+            return
+        try:
+            current = self._list(dir_path, old)
+        except (FileNotFoundError, NotADirectoryError):
+            # Its parent's listing reports the deletion.
+            return
+        self._listings[dir_path] = current
+        for name, (is_dir, size, _) in current.items():
+            path = os.path.join(dir_path, name)
+            if name in old and old[name][0] == is_dir:
+                if not is_dir and old[name][1] != size:
+                    self._changes.put(('resize', path, size))
+                continue
+            if name in old:
+                self._forget(path, old[name])
+                self._changes.put(('delete', path, None))
+            if is_dir:
+                listings = {}
+                try:
+                    subtree = scan_tree(path, 1, None, listings,
+                                        self._policy)
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                for sub_path, entries in listings.items():
+                    self._listings[sub_path] = {
+                        os.path.basename(entry[0]): entry[1:] + (None,)
+                        for entry in entries}
+                    if inotify is not None:
+                        self._watch(inotify, sub_path)
+            else:
+                subtree = FileSystemTree(path, [], size)
+            self._changes.put(('create', dir_path, subtree))
+            if is_dir and inotify is not None:
+                # Catch anything created before the watches were added.
+                for sub_path in listings:
+                    self._rescan(sub_path, inotify)
+        for name in old:
+            if name not in current:
+                path = os.path.join(dir_path, name)
+                self._forget(path, old[name])
+                self._changes.put(('delete', path, None))
+
+    def _watch(self, inotify, dir_path):
+        """Watch the folder <dir_path> with <inotify>, or poll it if it
+        cannot be watched.
+        @type self: TreeWatcher
+        @type inotify: _Inotify
+        @type dir_path: str
+        @rtype: None
+        """
+        try:
+            inotify.add_watch(dir_path)
+        except OSError:
+            # The folder may be gone already, in which case its parent's
+            # listing reports the deletion and it is not polled for long.
+            self._unwatched.add(dir_path)
+
+    def _forget(self, path, entry):
+        """Stop tracking the removed entry <path>, whose listing was
+        <entry>, and, if it is a folder, every entry inside it.
+        @type self: TreeWatcher
+        @type path: str
+        @type entry: (bool, int, int | None)
+        @rtype: None
+        """
+        if not entry[0]:
+            self._drop_link(path, entry[2])
+            return
+        prefix = os.path.join(path, '')
+        for dir_path in list(self._listings):
+            if dir_path == path or dir_path.startswith(prefix):
+                entries = self._listings.pop(dir_path)
+                for name, (is_dir, _, key) in entries.items():
+                    if not is_dir:
+                        self._drop_link(os.path.join(dir_path, name), key)
+
+    def _drop_link(self, path, key):
+        """Stop tracking <path> as a link of the file identified by <key>.
+        If the file was counted at <path>, the policy forgets it and the
+        folders of its other links are listed again, so that one of them
+        is counted instead.
+        @type self: TreeWatcher
+        @type path: str
+        @type key: int | None
+        @rtype: None
+        """
+        if key is None:
+            return
+        if self._owners.get(key) == path:
+            del self._owners[key]
+            self._policy.forget(key)
+            for link_path in self._links.pop(key, ()):
+                self._stale.add(os.path.dirname(link_path))
+        elif key in self._links:
+            self._links[key].discard(path)
+            if not self._links[key]:
+                del self._links[key]
+
+    def _list(self, dir_path, old):
+        """Return the entries of the folder <dir_path>, in the format of
+        _listings. Folders have size 0; other entries, including folders
+        the policy does not enter, are sized by the policy.
+        <old> is the folder's previous listing. A file keeps being counted
+        at the link it is counted at in _owners, or else at a link <old>
+        gave a size; its other links have size 0.
+        @type self: TreeWatcher
+        @type dir_path: str
+        @type old: dict[str, (bool, int, int | None)]
+        @rtype: dict[str, (bool, int, int | None)]
+        """
+        policy = self._policy
+        entries = {}
+        with os.scandir(dir_path) as iterator:
+            for entry in iterator:
+                try:
+                    info = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    # Deleted while being listed.
+                    continue
+                if entry.is_dir(follow_symlinks=False) and \
+                        policy.enters(info):
+                    entries[entry.name] = (True, 0, None)
+                    continue
+                key = policy.file_key(info)
+                was_dir, old_size, old_key = old.get(entry.name,
+                                                     (True, 0, None))
+                if old_key is not None and old_key != key:
+                    # Replaced by another file.
+                    self._drop_link(entry.path, old_key)
+                if key is None:
+                    size = policy.size(info, entry.path)
+                elif self._counts(entry.path, key, info,
+                                  not was_dir and old_size > 0):
+                    size = policy.size(info, entry.path, True)
+                else:
+                    size = 0
+                entries[entry.name] = (False, size, key)
+        return entries
+
+    def _counts(self, path, key, info, counted):
+        """Return whether the file identified by <key>, whose lstat result
+        is <info>, is counted at its link <path>, recording the answer in
+        _owners or _links. If <counted> is True, <path> had a size when
+        last listed, and it is counted there unless another link is known
+        to be.
+        @type self: TreeWatcher
+        @type path: str
+        @type key: int
+        @type info: os.stat_result
+        @type counted: bool
+        @rtype: bool
+        """
+        owner = self._owners.get(key)
+        if owner is None and not counted and info.st_nlink > 1:
+            # The policy may have counted it at a link not listed yet.
+            counted = key not in self._policy.merge_hard_links({key})
+        if owner == path or owner is None and (counted or
+                                               info.st_nlink == 1):
+            self._owners[key] = path
+            return True
+        self._links.setdefault(key, set()).add(path)
+        if info.st_nlink > 1:
+            # So that scans of new folders do not count it again.
+            self._policy.merge_hard_links({key})
+        return False
+
+
+def _listings_of(tree, policy):
+    """Return the folder listings described by <tree>, in the format of
+    TreeWatcher._listings, with no keys.
+    A leaf of size 0 may be an empty folder or an empty file; only those
+    leaves are checked on disk, for being folders that <policy> enters.
+    @type tree: FileSystemTree
+    @type policy: ScanPolicy
+    @rtype: dict[str, dict[str, (bool, int, None)]]
+    """
+    listings = {}
+    stack = [(tree, tree.path)]
+    while stack:
+        node, path = stack.pop()
+        subtrees = node.get_subtrees()
+        if not subtrees and (node.data_size > 0 or
+                             not _is_folder(path, policy)):
+            continue
+        entries = {}
+        for subtree in subtrees:
+            sub_path = os.path.join(path, subtree.get_root())
+            if subtree.get_subtrees() or (subtree.data_size == 0 and
+                                          _is_folder(sub_path, policy)):
+                entries[subtree.get_root()] = (True, 0, None)
+                stack.append((subtree, sub_path))
+            else:
+                entries[subtree.get_root()] = (False, subtree.data_size,
+                                               None)
+        listings[path] = entries
+    return listings
+
+
+def _is_folder(path, policy):
+    """Return whether <path> is a folder that <policy> enters, and not a
+    link to one.
+    @type path: str
+    @type policy: ScanPolicy
+    @rtype: bool
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and policy.enters(info)
+
+
+def _find_node(tree, path):
+    """Return the node of <tree> for <path>, or None if there is none.
+    @type tree: FileSystemTree
+    @type path: str
+    @rtype: FileSystemTree | None
+    """
+    relative = os.path.relpath(path, tree.path)
+    node = tree
+    if relative == os.curdir:
+        return node
+    for name in relative.split(os.sep):
+        for subtree in node.get_subtrees():
+            if subtree.get_root() == name:
+                node = subtree
+                break
+        else:
+            return None
+    return node
+
+
+class _Inotify:
+    """A Linux inotify instance, used through ctypes.
+    === Private Attributes ===
+    @type _libc: ctypes.CDLL
+        The C library.
+    @type _fd: int
+        The inotify file descriptor.
+    @type _paths: dict[int, str]
+        The folder watched by each watch descriptor.
+    """
+    def __init__(self, libc, fd):
+        """Initialize a new _Inotify. Use _Inotify.create instead.
+        @type self: _Inotify
+        @type libc: ctypes.CDLL
+        @type fd: int
+        @rtype: None
+        """
+        self._libc = libc
+        self._fd = fd
+        self._paths = {}
+
+    @staticmethod
+    def create():
+        """Return a new _Inotify, or None if inotify is not available.
+        @rtype: _Inotify | None
+        """
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init = libc.inotify_init1
+        except (OSError, AttributeError):
+            return None
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+        fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+        return _Inotify(libc, fd)
+
+    def add_watch(self, path):
+        """Watch the folder <path>.
+        Raise OSError if it cannot be watched.
+        @type self: _Inotify
+        @type path: str
+        @rtype: None
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path),
+                                          _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        self._paths[wd] = path
+
+    def read_changed(self, timeout):
+        """Wait up to <timeout> seconds for events, and return the set of
+        folders they happened in, or None if events were lost and every
+        folder must be checked.
+        @type self: _Inotify
+        @type timeout: float
+        @rtype: set[str] | None
+        """
+        changed = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return changed
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            if wd in self._paths:
+                changed.add(self._paths[wd])
+        return changed
+
+    def close(self):
+        """Release the inotify file descriptor.
+        @type self: _Inotify
+        @rtype: None
+        """
+        os.close(self._fd)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
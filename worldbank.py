@@ -0,0 +1,258 @@
+"""Treemap Visualiser: World Bank API Client
+=== Module Description ===
+This module fetches JSON responses from the World Bank API for
+PopulationTree, without making startup depend on the network.
+
+Every response other than an error message is saved in an on-disk cache,
+one file per URL. A cached response younger than the client's TTL is used
+without contacting the API at all, so repeat runs start in milliseconds.
+Otherwise the API is asked, with a timeout and a few retries; if it still
+cannot be reached, an older cached response is used rather than failing.
+
+Most API responses are paginated: the first element of the JSON is
+metadata saying how many pages there are, and the second holds one page of
+records. iter_records follows the pages, fetching and caching each one
+separately, so that a response is never decoded whole and no records are
+lost whatever the page size.
+
+In offline mode the API is never contacted: responses come from the cache,
+whatever their age, or from the fixture folders given to the client. A
+fixture folder holds responses recorded in the cache format, so a cache
+folder can be copied and used as fixtures. The base URL can be pointed at
+a local stand-in server for testing; see test_worldbank.
+"""
+import hashlib
+import json
+import os
+import time
+import urllib.error
+import urllib.request as request
+from concurrent.futures import ThreadPoolExecutor
+
+
+WORLD_BANK_BASE = 'http://api.worldbank.org'
+# Where responses are cached unless a client is given another folder.
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME',
+                   os.path.join(os.path.expanduser('~'), '.cache')),
+    'treemap', 'worldbank')
+# How long, in seconds, a cached response is used without asking the API.
+CACHE_TTL = 24 * 60 * 60
+# How long, in seconds, to wait for the API before giving up on a request.
+TIMEOUT = 10.0
+# How many times a failed request is tried again, and how long to wait
+# before the first retry; the wait doubles after each retry.
+RETRIES = 2
+RETRY_DELAY = 0.5
+# The number of records asked for per page, and the number of pages fetched
+# at the same time, by iter_records.
+PAGE_SIZE = 500
+PAGE_WORKERS = 4
+
+
+class WorldBankClient:
+    """Fetches JSON responses from the World Bank API through a cache.
+    === Public Attributes ===
+    @type base_url: str
+        The URL that request paths are relative to.
+    @type offline: bool
+        If True, the API is never contacted.
+    === Private Attributes ===
+    @type _cache_dir: str | None
+        The folder responses are cached in, or None for no cache.
+    @type _fixture_dirs: list[str]
+        Folders of recorded responses, used in offline mode.
+    @type _ttl: float
+        How long a cached response is used without asking the API.
+    @type _timeout: float
+        The timeout of each request, in seconds.
+    @type _retries: int
+        How many times a failed request is tried again.
+    """
+    def __init__(self, base_url=WORLD_BANK_BASE, cache_dir=DEFAULT_CACHE_DIR,
+                 offline=False, fixture_dirs=(), ttl=CACHE_TTL,
+                 timeout=TIMEOUT, retries=RETRIES):
+        """Initialize a new WorldBankClient.
+        @type self: WorldBankClient
+        @type base_url: str
+        @type cache_dir: str | None
+        @type offline: bool
+        @type fixture_dirs: iterable[str]
+        @type ttl: float
+        @type timeout: float
+        @type retries: int
+        @rtype: None
+        """
+        self.base_url = base_url.rstrip('/')
+        self.offline = offline
+        self._cache_dir = cache_dir
+        self._fixture_dirs = list(fixture_dirs)
+        self._ttl = ttl
+        self._timeout = timeout
+        self._retries = retries
+
+    def get_json(self, path):
+        """Return the decoded JSON response for <path>, relative to
+        base_url.
+        Raise FileNotFoundError in offline mode if no response for <path>
+        was cached or recorded, and urllib.error.URLError or OSError if the
+        API cannot be reached and nothing was cached.
+        @type self: WorldBankClient
+        @type path: str
+        @rtype: object
+        """
+        url = self.base_url + path
+        cached = self._cache_file(url)
+        if cached is not None and os.path.isfile(cached):
+            age = time.time() - os.path.getmtime(cached)
+            if self.offline or age < self._ttl:
+                return _read_json(cached)
+        if self.offline:
+            for directory in self._fixture_dirs:
+                fixture = os.path.join(directory, _cache_name(url))
+                if os.path.isfile(fixture):
+                    return _read_json(fixture)
+            raise FileNotFoundError(
+                'no cached or recorded response for {}'.format(url))
+        try:
+            data = self._download(url)
+        except OSError:
+            # urllib.error.URLError and timeouts are both OSErrors.
+            if cached is not None and os.path.isfile(cached):
+                return _read_json(cached)
+            raise
+        result = json.loads(data.decode())
+        # An error message is not cached, so that asking again once the
+        # API recovers, or after a fix, does not keep returning it.
+        if cached is not None and not _is_error(result):
+            try:
+                _write_file(cached, data)
+            except OSError:
+                # The cache only saves time; a read-only disk is no error.
+                pass
+        return result
+
+    def iter_records(self, path, per_page=PAGE_SIZE):
+        """Yield the records of the paginated response to <path>, relative
+        to base_url, page by page.
+        Up to PAGE_WORKERS pages are fetched at a time, and only their
+        records are held in memory.
+        Raise ValueError if the API answers with an error message.
+        @type self: WorldBankClient
+        @type path: str
+        @type per_page: int
+        @rtype: iterator[dict]
+        """
+        metadata, records = self._get_page(path, 1, per_page)
+        yield from records
+        pages = int(metadata.get('pages') or 1)
+        if pages <= 1:
+            return
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as pool:
+            for start in range(2, pages + 1, PAGE_WORKERS):
+                numbers = range(start, min(start + PAGE_WORKERS, pages + 1))
+                for _, records in pool.map(
+                        lambda number: self._get_page(path, number, per_page),
+                        numbers):
+                    yield from records
+
+    def _get_page(self, path, number, per_page):
+        """Return the metadata and the records of page <number> of the
+        paginated response to <path>, with <per_page> records per page.
+        Raise ValueError if the API answers with an error message.
+        @type self: WorldBankClient
+        @type path: str
+        @type number: int
+        @type per_page: int
+        @rtype: (dict, list[dict])
+        """
+        separator = '&' if '?' in path else '?'
+        response = self.get_json('{}{}page={}&per_page={}'.format(
+            path, separator, number, per_page))
+        if not isinstance(response, list) or not response or \
+                not isinstance(response[0], dict):
+            raise ValueError('unexpected response to {}'.format(path))
+        if _is_error(response):
+            raise ValueError('{}: {}'.format(path, response[0]['message']))
+        records = response[1] if len(response) > 1 else None
+        # A page past the last, or a query with no data, has null records.
+        return response[0], records or []
+
+    def _download(self, url):
+        """Return the body of the response to <url>, trying again after a
+        delay if the request fails.
+        @type self: WorldBankClient
+        @type url: str
+        @rtype: bytes
+        """
+        delay = RETRY_DELAY
+        for attempt in range(self._retries + 1):
+            try:
+                with request.urlopen(url, timeout=self._timeout) as response:
+                    return response.read()
+            except urllib.error.HTTPError as error:
+                # Client errors will not go away by asking again.
+                if error.code < 500 or attempt == self._retries:
+                    raise
+            except OSError:
+                if attempt == self._retries:
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    def _cache_file(self, url):
+        """Return the file the response to <url> is cached in, or None if
+        this client has no cache.
+        @type self: WorldBankClient
+        @type url: str
+        @rtype: str | None
+        """
+        if self._cache_dir is None:
+            return None
+        return os.path.join(self._cache_dir, _cache_name(url))
+
+
+def _cache_name(url):
+    """Return the name of the file the response to <url> is saved in, in a
+    cache or fixture folder.
+    @type url: str
+    @rtype: str
+    """
+    return hashlib.sha1(url.encode()).hexdigest() + '.json'
+
+
+def _is_error(response):
+    """Return whether the decoded JSON <response> is an error message
+    from the API, such as [{"message": [...]}].
+    @type response: object
+    @rtype: bool
+    """
+    return isinstance(response, list) and len(response) > 0 and \
+        isinstance(response[0], dict) and 'message' in response[0]
+
+
+def _read_json(filename):
+    """Return the decoded contents of the JSON file <filename>.
+    @type filename: str
+    @rtype: object
+    """
+    with open(filename, 'rb') as file:
+        return json.loads(file.read().decode())
+
+
+def _write_file(filename, data):
+    """Replace the file <filename> with <data>, atomically, creating its
+    folder if needed.
+    @type filename: str
+    @type data: bytes
+    @rtype: None
+    """
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(filename + '.tmp', filename)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')
@@ -0,0 +1,150 @@
+"""Treemap Visualiser: Zooming
+=== Module Description ===
+This module keeps track of which part of a tree the visualiser shows.
+
+The user can zoom in on a folder to fill the window with it, and zoom back
+out to its parent. Only the subtree in view is laid out, hit-tested and
+drawn, so the work per frame depends on what is on screen rather than on
+the size of the whole tree.
+
+Zooming in on a subtree lays it out in a new rectangle, which replaces the
+layouts it cached as part of its parent (see AbstractTree.generate_treemap).
+The rectangles of recently visited views are therefore kept, so going back
+to one is instant; its node caches are only rebuilt if the user clicks on
+it. The kept rectangles are dropped whenever the tree changes.
+"""
+from collections import OrderedDict
+
+
+# The number of views whose rectangles a ZoomView keeps.
+RECENT_VIEWS = 8
+
+
+class ZoomView:
+    """The subtree of a tree that is shown in the visualiser.
+    === Public Attributes ===
+    @type view: AbstractTree
+        The subtree in view: the whole tree, or a subtree of it.
+    === Private Attributes ===
+    @type _tree: AbstractTree
+        The whole tree.
+    @type _rect: (int, int, int, int)
+        The rectangle the view is laid out in.
+    @type _layout: callable | None
+        The treemap layout algorithm; see layouts.
+    @type _min_area: int
+        The min_area passed to AbstractTree.generate_treemap.
+    @type _recent: OrderedDict[AbstractTree, list]
+        The rectangles of recently visited views, least recently used
+        first.
+    """
+    def __init__(self, tree, rect, layout=None, min_area=0):
+        """Initialize a new ZoomView showing the whole of <tree>.
+        @type self: ZoomView
+        @type tree: AbstractTree
+        @type rect: (int, int, int, int)
+        @type layout: callable | None
+        @type min_area: int
+        @rtype: None
+        """
+        self.view = tree
+        self._tree = tree
+        self._rect = tuple(rect)
+        self._layout = layout
+        self._min_area = min_area
+        self._recent = OrderedDict()
+
+    def treemap(self):
+        """Return the rectangles of the treemap of the view, as returned by
+        AbstractTree.generate_treemap.
+        @type self: ZoomView
+        @rtype: list[((int, int, int, int), (int, int, int))]
+        """
+        items = self._recent.pop(self.view, None)
+        if items is None:
+            items = self._lay_out()
+        self._remember(items)
+        return items
+
+    def node_at(self, x, y):
+        """Return the leaf, or the subtree drawn as a single rectangle,
+        under the point (<x>, <y>), or None if there is none.
+        @type self: ZoomView
+        @type x: int
+        @type y: int
+        @rtype: AbstractTree | None
+        """
+        items = self._lay_out()
+        self._recent.pop(self.view, None)
+        self._remember(items)
+        return self.view.cordinate(x, y, items)
+
+    def zoom_in(self, x, y):
+        """Zoom in on the subtree of the view under the point (<x>, <y>).
+        Return whether the view changed; it does not if that subtree is a
+        leaf or there is none.
+        @type self: ZoomView
+        @type x: int
+        @type y: int
+        @rtype: bool
+        """
+        node = self.node_at(x, y)
+        if node is None or node is self.view:
+            return False
+        while node.get_parent() is not self.view:
+            node = node.get_parent()
+        if not node.get_subtrees():
+            return False
+        self.view = node
+        return True
+
+    def zoom_out(self):
+        """Zoom out to the parent of the view. Return whether the view
+        changed; it does not if the whole tree is in view.
+        @type self: ZoomView
+        @rtype: bool
+        """
+        if self.view.get_parent() is None:
+            return False
+        self.view = self.view.get_parent()
+        return True
+
+    def tree_changed(self):
+        """Drop the kept rectangles after the tree changed, and show the
+        whole tree if the view was removed from it.
+        @type self: ZoomView
+        @rtype: None
+        """
+        self._recent.clear()
+        if not self._tree.is_ancestor(self._tree, self.view):
+            self.view = self._tree
+
+    def _lay_out(self):
+        """Lay out the view, reusing its node caches if they are valid, and
+        return its rectangles.
+        The view's ancestors are invalidated, since their cached layouts
+        no longer match those of the view's subtrees.
+        @type self: ZoomView
+        @rtype: list[((int, int, int, int), (int, int, int))]
+        """
+        parent = self.view.get_parent()
+        if parent is not None:
+            self._tree._invalidate_layout(parent)
+        return self.view.generate_treemap(self._rect, self._layout,
+                                          self._min_area)
+
+    def _remember(self, items):
+        """Keep <items> as the rectangles of the view, forgetting the least
+        recently used view if too many are kept.
+        @type self: ZoomView
+        @type items: list[((int, int, int, int), (int, int, int))]
+        @rtype: None
+        """
+        self._recent[self.view] = items
+        if len(self._recent) > RECENT_VIEWS:
+            self._recent.popitem(last=False)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config='pylintrc.txt')